@@ -0,0 +1,140 @@
+import sys
+import time
+import random
+import argparse
+import tempfile
+from pathlib import Path
+
+# Scheduler overhead at large chunk counts: how long a runner spends picking and releasing chunks,
+# independent of the work done on them. Builds a synthetic plan, then times claim + release cycles.
+#   python benchmarks/bench_scheduler.py --chunks 10000 --cycles 500
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+try:
+    from planner.state import ChunkIndex, claimable_statuses, create_state_store
+except ImportError as e:
+    print(f"Error importing modules: {e}")
+    print("Run this from the skills/catalog-extractor directory.")
+    sys.exit(1)
+
+# Linear-scan baseline: what the runner did per claim and per report before `ChunkIndex`
+def find_next_chunk(state, synthesis_mode, target_section_idx=None, largest_first=False):
+    """Linear scan for the chunk `ChunkIndex.next_chunk` picks (how runners chose before the index)."""
+    sections = state.get("sections", [])
+    for status in claimable_statuses(synthesis_mode):
+        best = None
+        for i, section in enumerate(sections):
+            if target_section_idx is not None and i != target_section_idx:
+                continue
+            for chunk in section.get("chunks", []):
+                if chunk.get("status") != status:
+                    continue
+                if best is None or (largest_first and chunk.get("cost", 0) > best.get("cost", 0)):
+                    best = chunk
+        if best:
+            return best
+    return None
+
+def find_chunk(state, start, end):
+    for section in state.get("sections", []):
+        for chunk in section.get("chunks", []):
+            if chunk["start"] == start and chunk["end"] == end:
+                return chunk
+    return None
+
+def summarize_sections(state):
+    """Per-section status counts: [(section_idx, name, {status: count})]."""
+    rows = []
+    for i, section in enumerate(state.get("sections", [])):
+        status_counts = {}
+        for chunk in section.get("chunks", []):
+            status = chunk.get("status", "UNKNOWN")
+            status_counts[status] = status_counts.get(status, 0) + 1
+        rows.append((i, section.get("name", section.get("title", f"Section {i}")), status_counts))
+    return rows
+
+def make_state(num_chunks, sections=10, seed=0):
+    rng = random.Random(seed)
+    per_section = max(1, num_chunks // sections)
+    state = {"pdf_path": "synthetic.pdf", "sections": []}
+    page = 1
+    for s in range(sections):
+        chunks = []
+        for _ in range(per_section):
+            start, end = page, page + 4
+            chunks.append({
+                "id": f"{start}_{end}",
+                "start": start,
+                "end": end,
+                "status": "PENDING",
+                "cost": round(rng.uniform(5, 15), 3),
+                "working_dir": f"/tmp/runs/{start}_{end}",
+            })
+            page = end + 1
+        state["sections"].append({"name": f"Section {s}", "chunks": chunks})
+    return state
+
+def bench_in_memory(state, cycles):
+    """Old linear scans vs the ChunkIndex on the same state; each cycle claims one chunk and completes it."""
+    results = {}
+
+    started = time.perf_counter()
+    for _ in range(cycles):
+        chunk = find_next_chunk(state, "skip")
+        find_chunk(state, chunk["start"], chunk["end"])["status"] = "DONE"
+    summarize_sections(state)
+    results["linear"] = time.perf_counter() - started
+
+    for section in state["sections"]:
+        for chunk in section["chunks"]:
+            chunk["status"] = "PENDING"
+
+    started = time.perf_counter()
+    index = ChunkIndex(state)
+    results["index_build"] = time.perf_counter() - started
+    started = time.perf_counter()
+    for _ in range(cycles):
+        chunk = index.next_chunk("skip")
+        index.set_status(index.by_id[chunk["id"]], "DONE")
+    index.summary(state)
+    results["indexed"] = time.perf_counter() - started
+    return results
+
+def bench_store(state, backend, cycles):
+    with tempfile.TemporaryDirectory() as tmp:
+        store = create_state_store(tmp, backend)
+        store.initialize(state)
+        started = time.perf_counter()
+        for _ in range(cycles):
+            chunk, _, _ = store.claim_next("skip", None, "bench:1", 600)
+            store.release(chunk, "bench:1", "DONE")
+        store.report()
+        elapsed = time.perf_counter() - started
+        if hasattr(store, "close"):
+            store.close()
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark chunk claiming and reporting overhead")
+    parser.add_argument("--chunks", type=int, default=10000, help="Number of chunks in the synthetic plan")
+    parser.add_argument("--cycles", type=int, default=500, help="Claim + release cycles to time")
+    parser.add_argument("--backend", choices=["json", "sqlite", "all"], default="all", help="State backends to time")
+    args = parser.parse_args()
+
+    state = make_state(args.chunks)
+    total = sum(len(s["chunks"]) for s in state["sections"])
+    print(f"[*] {total} chunks, {args.cycles} claim + release cycles")
+
+    mem = bench_in_memory(state, args.cycles)
+    print(f"    in-memory linear scan : {mem['linear'] * 1e6 / args.cycles:9.1f} us/cycle")
+    print(f"    in-memory ChunkIndex  : {mem['indexed'] * 1e6 / args.cycles:9.1f} us/cycle "
+          f"(index build {mem['index_build'] * 1e3:.1f} ms)")
+
+    backends = ["json", "sqlite"] if args.backend == "all" else [args.backend]
+    for backend in backends:
+        elapsed = bench_store(make_state(args.chunks), backend, args.cycles)
+        print(f"    {backend:6} store          : {elapsed * 1e3 / args.cycles:9.2f} ms/cycle")
+
+if __name__ == "__main__":
+    main()
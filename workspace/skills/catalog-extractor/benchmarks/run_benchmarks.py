@@ -0,0 +1,274 @@
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import datetime
+import resource
+import tempfile
+import subprocess
+import multiprocessing
+from pathlib import Path
+
+# End-to-end pipeline benchmark on a synthetic catalog, fully offline.
+# Each stage (plan, export, skus, synthesize) runs in its own spawned process, so wall time, CPU time and
+# peak RSS are measured per stage from a cold interpreter; synthesis uses the offline stub LLM backend.
+# Results are written as JSON (with the git commit) and can be compared against an earlier run:
+#   python benchmarks/run_benchmarks.py --pages 60 --output before.json
+#   python benchmarks/run_benchmarks.py --pages 60 --output after.json --compare before.json
+
+SKILL_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(SKILL_DIR))
+sys.path.append(str(SKILL_DIR / "benchmarks"))
+
+STAGES = ["plan", "export", "skus", "synthesize"]
+
+class StageSkipped(Exception):
+    """Raised inside a stage when it can't run in this environment (e.g. Docling is not installed)."""
+
+def _chunks(job_dir):
+    from planner.state import open_state_store
+    state = open_state_store(job_dir).load()
+    return [chunk for section in state["sections"] for chunk in section["chunks"]]
+
+def stage_plan(pdf_path, job_dir, chunk_size, jobs):
+    from planner.plan import initialize_job
+    initialize_job(pdf_path, job_dir, chunk_size=chunk_size, jobs=jobs)
+    chunks = _chunks(job_dir)
+    return {"chunks": len(chunks), "pages": sum(c["end"] - c["start"] + 1 for c in chunks)}
+
+def stage_export(job_dir, window_pages=None):
+    try:
+        from extract.export_assets import export_assets
+    except ImportError as e:
+        raise StageSkipped(f"Docling not available ({e})")
+    pages = 0
+    chunk_rss = []
+    for chunk in _chunks(job_dir):
+        if chunk.get("page_range"):
+            export_assets(chunk["input_file"], chunk["working_dir"], 0, chunk["page_range"], window_pages=window_pages)
+        else:
+            export_assets(chunk["input_file"], chunk["working_dir"], chunk["start"] - 1, window_pages=window_pages)
+        with open(Path(chunk["working_dir"]) / "export_stats.json", "r") as f:
+            stats = json.load(f)
+        pages += stats["pages"]
+        chunk_rss.append(stats.get("peak_rss_mb") or 0)
+    return {"pages": pages, "max_chunk_rss_mb": max(chunk_rss, default=None)}
+
+def stage_skus(job_dir):
+    from extract.skus import process_skus, metadata_input
+    chunks = [c for c in _chunks(job_dir) if metadata_input(c["working_dir"]).exists()]
+    if not chunks:
+        raise StageSkipped("no Docling metadata.json to parse (export stage skipped)")
+    skus = 0
+    for chunk in chunks:
+        chunk_dir = Path(chunk["working_dir"])
+        skus += process_skus(str(metadata_input(chunk_dir)), str(chunk_dir / "sku_intermediate.jsonl"),
+                             page_offset=0 if chunk.get("page_range") else chunk["start"] - 1) or 0
+    return {"chunks": len(chunks), "skus": skus}
+
+def stage_synthesize(job_dir, latency, jitter, concurrency, batch_pages):
+    from extract.synthesize import synthesize_catalog
+    from extract.llm import configure_backend
+    backend = configure_backend("stub", latency=latency, jitter=jitter)
+    totals = {"pages": 0, "synthesized": 0, "failed": 0, "requests": 0, "input_tokens": 0, "output_tokens": 0}
+    for chunk in _chunks(job_dir):
+        summary = synthesize_catalog(chunk["working_dir"], concurrency=concurrency, cache_mode="off",
+                                     batch_pages=batch_pages, force=True, backend=backend)
+        for key in totals:
+            totals[key] += len(summary[key]) if key == "failed" else summary[key]
+    totals["api_calls"] = backend.calls
+    return totals
+
+STAGE_FUNCTIONS = {"plan": stage_plan, "export": stage_export, "skus": stage_skus, "synthesize": stage_synthesize}
+
+def _cpu_seconds():
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+def _stage_child(name, kwargs, log_path, conn):
+    """Runs one stage with its output sent to `log_path`; reports measurements through `conn`."""
+    with open(log_path, "w") as log:
+        sys.stdout = sys.stderr = log
+        result = {"stage": name, "log": str(log_path)}
+        try:
+            cpu_start = _cpu_seconds()
+            wall_start = time.perf_counter()
+            result["result"] = STAGE_FUNCTIONS[name](**kwargs)
+            result["wall_seconds"] = round(time.perf_counter() - wall_start, 3)
+            result["cpu_seconds"] = round(_cpu_seconds() - cpu_start, 3)
+            result["status"] = "ok"
+        except StageSkipped as e:
+            result["status"] = "skipped"
+            result["reason"] = str(e)
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            result["status"] = "failed"
+            result["reason"] = f"{type(e).__name__}: {e}"
+        own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        # ru_maxrss is KB on Linux; includes interpreter start-up and imports
+        result["peak_rss_mb"] = round(max(own, children) / 1024, 1)
+    conn.send(result)
+    conn.close()
+
+def run_stage(name, kwargs, work_dir):
+    ctx = multiprocessing.get_context("spawn")
+    parent_conn, child_conn = ctx.Pipe(duplex=False)
+    proc = ctx.Process(target=_stage_child, args=(name, kwargs, work_dir / f"{name}.log", child_conn))
+    proc.start()
+    child_conn.close()
+    try:
+        result = parent_conn.recv()
+    except EOFError:
+        result = {"stage": name, "status": "failed", "reason": f"stage process died (see {work_dir / f'{name}.log'})"}
+    proc.join()
+    return result
+
+def write_placeholder_export(job_dir):
+    """
+    Stands in for the Docling export when it can't run: renders each page's text (from extract.md) into
+    `images/page<N>.png` at scale 1.0 with an empty provenance map, so synthesis can still be measured.
+    """
+    import PIL.Image
+    import PIL.ImageDraw
+    from extract.page_text import open_page_text
+    for chunk in _chunks(job_dir):
+        chunk_dir = Path(chunk["working_dir"])
+        images_dir = chunk_dir / "images"
+        images_dir.mkdir(parents=True, exist_ok=True)
+        text_map = open_page_text(chunk_dir / "extract.md") or {}
+        for page in range(chunk["start"], chunk["end"] + 1):
+            img = PIL.Image.new("RGB", (612, 792), "white")
+            draw = PIL.ImageDraw.Draw(img)
+            for i, line in enumerate((text_map.get(page, "") or "").splitlines()[:55]):
+                draw.text((36, 24 + i * 13), line[:110], fill="black")
+            img.save(images_dir / f"page{page}.png")
+        if hasattr(text_map, "close"):
+            text_map.close()
+        with open(images_dir / "render.json", "w") as f:
+            json.dump({"images_scale": 1.0, "archive_scale": None}, f)
+        with open(chunk_dir / "image_provenance_map.json", "w") as f:
+            json.dump([], f)
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=SKILL_DIR, capture_output=True, text=True, check=True)
+        dirty = subprocess.run(["git", "status", "--porcelain", "--", "."], cwd=SKILL_DIR, capture_output=True, text=True).stdout.strip()
+        return out.stdout.strip() + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_results(results, baseline=None):
+    base = {s["stage"]: s for s in (baseline or {}).get("stages", [])}
+
+    def delta(stage, key):
+        old = base.get(stage["stage"], {}).get(key)
+        new = stage.get(key)
+        if not old or new is None:
+            return ""
+        return f" ({(new - old) / old * 100:+.0f}%)"
+
+    print(f"\n=== Benchmark: {results['params']['pages']} pages @ {results['commit'] or 'unknown commit'} ===")
+    if baseline:
+        print(f"    compared with {baseline.get('commit') or 'unknown commit'} ({baseline.get('datetime')})")
+    for stage in results["stages"]:
+        if stage["status"] != "ok":
+            print(f"{stage['stage']:<11} {stage['status']}: {stage.get('reason')}")
+            continue
+        print(f"{stage['stage']:<11} wall {stage['wall_seconds']:8.2f}s{delta(stage, 'wall_seconds'):<8} "
+              f"cpu {stage['cpu_seconds']:8.2f}s{delta(stage, 'cpu_seconds'):<8} "
+              f"peak RSS {stage['peak_rss_mb']:7.1f} MB{delta(stage, 'peak_rss_mb'):<8} {json.dumps(stage['result'])}")
+    print("=" * 40)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the catalog pipeline on a synthetic catalog with a fake LLM")
+    parser.add_argument("--pages", type=int, default=40, help="Pages in the synthetic catalog (default: 40)")
+    parser.add_argument("--sections", type=int, default=4, help="TOC sections (default: 4)")
+    parser.add_argument("--table-rows", type=int, default=18, help="Rows per spec table (default: 18)")
+    parser.add_argument("--image-every", type=int, default=3, help="An image on every Nth page, 0 for none (default: 3)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the synthetic catalog (default: 0)")
+    parser.add_argument("--chunk-size", type=int, default=5, help="Pages per chunk (default: 5)")
+    parser.add_argument("--jobs", type=int, default=1, help="Planner worker processes (default: 1)")
+    parser.add_argument("--export-window", type=int, help="Stream the export N pages at a time (default: whole chunk)")
+    parser.add_argument("--latency", type=float, default=0.5, help="Stub LLM latency per request in seconds (default: 0.5)")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Relative latency jitter, 0-1 (default: 0.2)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Synthesis requests in flight per chunk (default: 4)")
+    parser.add_argument("--batch-pages", type=int, default=1, help="Pages per synthesis request (default: 1)")
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"Comma-separated stages to run (default: {','.join(STAGES)})")
+    parser.add_argument("--work-dir", help="Where the catalog and job are written (default: a temporary directory, removed afterwards)")
+    parser.add_argument("--output", help="Write results JSON here (default: <work-dir>/results.json, or stdout only for a temporary dir)")
+    parser.add_argument("--compare", help="Earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = [s for s in stages if s not in STAGES]
+    if unknown:
+        parser.error(f"Unknown stages: {', '.join(unknown)} (expected {', '.join(STAGES)})")
+    if "plan" not in stages:
+        parser.error("The plan stage is required: every other stage runs on the job it creates")
+
+    temporary = args.work_dir is None
+    work_dir = Path(args.work_dir or tempfile.mkdtemp(prefix="catalog-bench-")).resolve()
+    work_dir.mkdir(parents=True, exist_ok=True)
+    pdf_path = work_dir / "catalog.pdf"
+    job_dir = work_dir / "job"
+    if job_dir.exists():
+        shutil.rmtree(job_dir)
+
+    from synthetic_catalog import make_catalog
+    make_catalog(pdf_path, args.pages, args.sections, args.table_rows, args.image_every, args.seed)
+    print(f"[*] Synthetic catalog: {pdf_path} ({args.pages} pages)")
+
+    results = {
+        "datetime": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "params": {k: v for k, v in vars(args).items() if k not in ("work_dir", "output", "compare")},
+        "stages": [],
+    }
+    stage_kwargs = {
+        "plan": {"pdf_path": str(pdf_path), "job_dir": str(job_dir), "chunk_size": args.chunk_size, "jobs": args.jobs},
+        "export": {"job_dir": str(job_dir), "window_pages": args.export_window},
+        "skus": {"job_dir": str(job_dir)},
+        "synthesize": {"job_dir": str(job_dir), "latency": args.latency, "jitter": args.jitter,
+                       "concurrency": args.concurrency, "batch_pages": args.batch_pages},
+    }
+    exported = False
+    try:
+        for name in stages:
+            if name == "synthesize" and not exported:
+                print("[!] No Docling export: synthesizing from placeholder page images rendered from extract.md")
+                write_placeholder_export(job_dir)
+            print(f"[*] Running stage: {name}...")
+            result = run_stage(name, stage_kwargs[name], work_dir)
+            if name == "export" and result["status"] == "ok":
+                exported = True
+            if name == "synthesize" and not exported:
+                result["inputs"] = "placeholder page images"
+            results["stages"].append(result)
+            if name == "plan" and result["status"] != "ok":
+                break
+
+        baseline = None
+        if args.compare:
+            with open(args.compare, "r") as f:
+                baseline = json.load(f)
+        print_results(results, baseline)
+
+        output = args.output or (None if temporary else work_dir / "results.json")
+        if output:
+            with open(output, "w") as f:
+                json.dump(results, f, indent=2)
+            print(f"[+] Results written to: {output}")
+    finally:
+        if temporary:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
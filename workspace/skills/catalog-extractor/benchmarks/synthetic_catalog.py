@@ -0,0 +1,146 @@
+import zlib
+import random
+import argparse
+from pypdf import PdfWriter
+from pypdf.generic import DecodedStreamObject, DictionaryObject, NameObject, NumberObject, StreamObject
+
+# Synthetic product catalogs for benchmarks: a cover, a table of contents in the layout
+# `map_catalog_structure` parses, then per section a mix of spec-table pages (ruled grid, numeric rows),
+# narrative pages and product images. Deterministic for a given seed, so runs are comparable.
+#   python benchmarks/synthetic_catalog.py /tmp/bench.pdf --pages 60 --sections 4
+
+PAGE_W, PAGE_H = 612, 792
+COLUMNS = ["Part No.", "Conductors", "AWG", "OD (in)", "Weight (lb/kft)", "Ampacity"]
+
+def _escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def _text(x, y, text, size=10, font="/F1"):
+    return f"BT {font} {size} Tf {x} {y} Td ({_escape(text)}) Tj ET"
+
+def _image_xobject(writer, rng, width=240, height=160):
+    """A product 'photo': colour gradient with a few blocks, as a Flate-compressed RGB image XObject."""
+    base = [rng.randrange(40, 200) for _ in range(3)]
+    blocks = [(rng.randrange(width), rng.randrange(height), rng.randrange(20, 80)) for _ in range(4)]
+    rows = bytearray()
+    for y in range(height):
+        for x in range(width):
+            inside = any(abs(x - bx) < s and abs(y - by) < s // 2 for bx, by, s in blocks)
+            rows += bytes(min(255, c + (60 if inside else 0) + (x + y) // 8) for c in base)
+    image = StreamObject()
+    image._data = zlib.compress(bytes(rows))
+    image.update({
+        NameObject("/Type"): NameObject("/XObject"),
+        NameObject("/Subtype"): NameObject("/Image"),
+        NameObject("/Width"): NumberObject(width),
+        NameObject("/Height"): NumberObject(height),
+        NameObject("/ColorSpace"): NameObject("/DeviceRGB"),
+        NameObject("/BitsPerComponent"): NumberObject(8),
+        NameObject("/Filter"): NameObject("/FlateDecode"),
+    })
+    return writer._add_object(image)
+
+def _spec_table(page_no, rows, rng, top=640):
+    """Ruled spec table: header row plus `rows` numeric rows."""
+    ops = []
+    col_w = (PAGE_W - 100) / len(COLUMNS)
+    row_h = 16
+    for c, name in enumerate(COLUMNS):
+        ops.append(_text(52 + c * col_w, top + 4, name, 8, "/F2"))
+    for r in range(rows):
+        y = top - (r + 1) * row_h
+        cells = [
+            f"{page_no:03d}-{r:02d}{rng.randrange(10)}",
+            str(rng.choice([1, 2, 3, 4, 7])),
+            str(rng.choice([4, 6, 8, 10, 12, 14])),
+            f"{rng.uniform(0.2, 1.6):.3f}",
+            f"{rng.uniform(20, 900):.1f}",
+            str(rng.randrange(15, 120)),
+        ]
+        for c, cell in enumerate(cells):
+            ops.append(_text(52 + c * col_w, y + 4, cell, 8))
+    # Grid
+    bottom = top - rows * row_h
+    ops.append("0.5 w")
+    for r in range(rows + 2):
+        y = top + row_h - r * row_h
+        ops.append(f"50 {y} m {PAGE_W - 50} {y} l S")
+    for c in range(len(COLUMNS) + 1):
+        x = 50 + c * col_w
+        ops.append(f"{x:.1f} {top + row_h} m {x:.1f} {bottom} l S")
+    return ops
+
+def _narrative(rng, top, lines):
+    words = ["cable", "jacket", "rated", "conductor", "copper", "insulation", "UL", "listed", "flexible",
+             "outdoor", "sunlight", "resistant", "temperature", "voltage", "application", "installation"]
+    ops = []
+    for i in range(lines):
+        sentence = " ".join(rng.choice(words) for _ in range(rng.randrange(9, 14))).capitalize() + "."
+        ops.append(_text(50, top - i * 13, sentence, 9))
+    return ops
+
+def make_catalog(path, pages=40, sections=4, table_rows=18, image_every=3, seed=0):
+    """
+    Writes a catalog PDF with `pages` pages and `sections` TOC sections. Every section page has a spec
+    table of `table_rows` rows or narrative text (alternating), and every `image_every`-th page an image.
+    Returns the list of (section name, start page).
+    """
+    rng = random.Random(seed)
+    writer = PdfWriter()
+    fonts = DictionaryObject()
+    for key, base in (("/F1", "/Helvetica"), ("/F2", "/Helvetica-Bold")):
+        fonts[NameObject(key)] = writer._add_object(DictionaryObject({
+            NameObject("/Type"): NameObject("/Font"),
+            NameObject("/Subtype"): NameObject("/Type1"),
+            NameObject("/BaseFont"): NameObject(base),
+        }))
+    images = [_image_xobject(writer, random.Random(seed * 100 + i)) for i in range(4)]
+
+    first_content = 5
+    span = max(1, (pages - first_content + 1) // max(1, sections))
+    toc = [(f"Series {chr(65 + i)} Cable", first_content + i * span) for i in range(sections) if first_content + i * span <= pages]
+
+    for page_no in range(1, pages + 1):
+        page = writer.add_blank_page(PAGE_W, PAGE_H)
+        resources = {NameObject("/Font"): fonts}
+        if page_no == 1:
+            ops = [_text(72, 600, "Synthetic Wire & Cable Catalog", 24, "/F2"), _text(72, 570, f"Seed {seed}", 12)]
+        elif page_no == 2:
+            ops = [_text(72, 720, "Contents", 16, "/F2")]
+            ops += [_text(72, 690 - i * 18, f"{name}      {start}", 11) for i, (name, start) in enumerate(toc)]
+        elif page_no < first_content:
+            ops = _narrative(rng, 720, 40)
+        else:
+            section = max(i for i, (_, start) in enumerate(toc) if start <= page_no)
+            ops = [_text(50, 740, f"{toc[section][0]} - Page {page_no}", 14, "/F2")]
+            if page_no % 2:
+                ops += _spec_table(page_no, table_rows, rng)
+                ops += _narrative(rng, 640 - (table_rows + 2) * 16, 4)
+            else:
+                ops += _narrative(rng, 710, 24)
+            if image_every and page_no % image_every == 0:
+                resources[NameObject("/XObject")] = DictionaryObject({NameObject("/Im0"): images[page_no % len(images)]})
+                ops.append("q 240 0 0 160 320 60 cm /Im0 Do Q")
+        stream = DecodedStreamObject()
+        stream.set_data("\n".join(ops).encode("latin-1"))
+        page[NameObject("/Contents")] = writer._add_object(stream)
+        page[NameObject("/Resources")] = DictionaryObject(resources)
+
+    with open(path, "wb") as f:
+        writer.write(f)
+    return toc
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic catalog PDF for benchmarks")
+    parser.add_argument("output", help="Path of the PDF to write")
+    parser.add_argument("--pages", type=int, default=40, help="Total pages (default: 40)")
+    parser.add_argument("--sections", type=int, default=4, help="TOC sections (default: 4)")
+    parser.add_argument("--table-rows", type=int, default=18, help="Rows per spec table (default: 18)")
+    parser.add_argument("--image-every", type=int, default=3, help="Put an image on every Nth page, 0 for none (default: 3)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+    args = parser.parse_args()
+
+    toc = make_catalog(args.output, args.pages, args.sections, args.table_rows, args.image_every, args.seed)
+    print(f"[+] Wrote {args.pages} pages to {args.output}")
+    for name, start in toc:
+        print(f"    {name}: page {start}")
@@ -0,0 +1,127 @@
+import os
+import time
+import threading
+import PIL.Image
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+# Background encoding of export artifacts (page images, archive copies, picture crops).
+# Encoding a page PNG is a large share of the export's artifact time and PIL releases the GIL while it
+# compresses, so images are handed to a small thread pool instead of being saved inline. At most
+# `max_pending` images wait in the pool (`save` blocks beyond that), which bounds the memory they pin.
+# `flush()` waits for every write and raises `ArtifactWriteError` if any failed; the export calls it
+# before writing the provenance map and metadata.json, so those never reference a missing file.
+
+ARTIFACT_FORMATS = {"png": ".png", "webp": ".webp", "jpeg": ".jpg"}
+
+DEFAULT_ARTIFACT_PROFILE = {
+    "format": os.environ.get("EXPORT_IMAGE_FORMAT", "png"),
+    # zlib level 0-9; 6 is PIL's default (same files as before), 1 encodes several times faster for ~20% more disk
+    "compress_level": int(os.environ.get("EXPORT_PNG_COMPRESSION", 6)),
+    # WebP/JPEG only
+    "quality": int(os.environ.get("EXPORT_IMAGE_QUALITY", 90)),
+    "workers": int(os.environ.get("EXPORT_WRITER_THREADS", min(4, os.cpu_count() or 1))),
+}
+
+class ArtifactWriteError(Exception):
+    """Raised by `ArtifactWriter.flush` when one or more images could not be written."""
+
+def make_artifact_profile(fmt=None, compress_level=None, quality=None, workers=None):
+    """Returns the default artifact profile with any given settings overridden, validated."""
+    profile = dict(DEFAULT_ARTIFACT_PROFILE)
+    for key, value in (("format", fmt), ("compress_level", compress_level), ("quality", quality), ("workers", workers)):
+        if value is not None:
+            profile[key] = value
+    profile["format"] = profile["format"].lower().replace("jpg", "jpeg")
+    if profile["format"] not in ARTIFACT_FORMATS:
+        raise ValueError(f"Unsupported artifact format: {profile['format']} (expected one of {', '.join(ARTIFACT_FORMATS)})")
+    if not 0 <= profile["compress_level"] <= 9 or not 1 <= profile["quality"] <= 100:
+        raise ValueError("PNG compression must be 0-9 and quality between 1 and 100")
+    profile["workers"] = max(0, profile["workers"])
+    return profile
+
+class ArtifactWriter:
+    """
+    Writes PIL images with one profile. `save(image, path)` returns immediately (the file gets the profile's
+    suffix); with `workers=0` images are written inline. The image must not be modified after `save`.
+    `stats` counts images, bytes and the seconds spent encoding (summed over threads).
+    """
+
+    def __init__(self, profile=None, max_pending=None):
+        self.profile = profile or make_artifact_profile()
+        self.suffix = ARTIFACT_FORMATS[self.profile["format"]]
+        workers = self.profile["workers"]
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="artifact") if workers else None
+        self.slots = threading.Semaphore(max_pending or max(1, workers) * 4)
+        self.lock = threading.Lock()
+        self.futures = []
+        self.stats = {"images": 0, "bytes": 0, "encode_seconds": 0.0}
+
+    def path_for(self, directory, stem):
+        return Path(directory) / f"{stem}{self.suffix}"
+
+    def _write(self, image, path, resize):
+        started = time.perf_counter()
+        if resize:
+            image = image.resize(resize, PIL.Image.Resampling.LANCZOS)
+        fmt = self.profile["format"]
+        if fmt == "png":
+            image.save(path, format="PNG", compress_level=self.profile["compress_level"])
+        else:
+            if image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+            if fmt == "jpeg":
+                image.save(path, format="JPEG", quality=self.profile["quality"])
+            else:
+                image.save(path, format="WEBP", quality=self.profile["quality"])
+        # A page re-exported in another format must not leave its old image behind
+        for suffix in ARTIFACT_FORMATS.values():
+            if suffix != self.suffix:
+                path.with_suffix(suffix).unlink(missing_ok=True)
+        size = path.stat().st_size
+        with self.lock:
+            self.stats["images"] += 1
+            self.stats["bytes"] += size
+            self.stats["encode_seconds"] += time.perf_counter() - started
+
+    def _run(self, image, path, resize):
+        try:
+            self._write(image, path, resize)
+        finally:
+            self.slots.release()
+
+    def save(self, image, path, resize=None):
+        """Queues `image` (resized to `resize` first, if given) for writing to `path`; returns the path."""
+        path = Path(path).with_suffix(self.suffix)
+        self.slots.acquire()
+        if self.pool is None:
+            self._run(image, path, resize)
+        else:
+            future = self.pool.submit(self._run, image, path, resize)
+            future.artifact_path = path
+            with self.lock:
+                self.futures.append(future)
+        return path
+
+    def flush(self):
+        """Waits for every queued write; raises `ArtifactWriteError` listing the images that failed."""
+        with self.lock:
+            futures, self.futures = self.futures, []
+        errors = []
+        for future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                errors.append(f"{future.artifact_path.name}: {e}")
+        if errors:
+            raise ArtifactWriteError(f"{len(errors)} artifact(s) could not be written: " + "; ".join(errors[:5]))
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
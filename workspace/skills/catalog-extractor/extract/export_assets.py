@@ -1,19 +1,27 @@
 
+import gc
 import logging
 import json
 import os
 import sys
+import time
+import shutil
+import threading
 from pathlib import Path
 
-# DEBUG: confirm execution
-with open('/tmp/debug_doc_extract.txt', 'a') as f:
-    f.write(f"Script started at {sys.argv} \n")
-
 from docling.document_converter import DocumentConverter, PdfFormatOption
 from docling.datamodel.pipeline_options import PdfPipelineOptions
 from docling.datamodel.base_models import InputFormat
 from docling_core.types.doc import ImageRefMode
 
+try:
+    from extract.metrics import RssSampler
+    from extract.artifact_writer import ArtifactWriter, make_artifact_profile
+except ImportError:
+    sys.path.append(str(Path(__file__).parent))
+    from metrics import RssSampler
+    from artifact_writer import ArtifactWriter, make_artifact_profile
+
 # Setup logging to stdout
 logging.basicConfig(
     level=logging.INFO,
@@ -22,54 +30,116 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def export_assets(pdf_path: str, output_base_dir: str, page_offset: int = 0):
-    pdf_path = Path(pdf_path).resolve()
-    output_dir = Path(output_base_dir).resolve()
-    image_dir = output_dir / "images"
-    image_dir.mkdir(parents=True, exist_ok=True)
+# Rendering profile (pixels per PDF point). Page images default to the scale synthesis sends
+# (`SYNTHESIS_IMAGE_SCALE`, see extract/images.py), so they aren't stored large and downsized on every request.
+# The picture crops that `catalog.md` embeds keep their own, higher `crop_scale`. Docling renders once, at the
+# largest of the page, crop and archive scales; every image rendered above its own scale is resized on write.
+# A full-size copy of each page can be kept in `images/archive/` with `archive_scale`.
+# The scales only affect generated page/picture images; Docling's layout and table models use their own.
+DEFAULT_IMAGES_SCALE = float(os.environ.get("EXPORT_IMAGES_SCALE", 1.0))
+DEFAULT_CROP_SCALE = float(os.environ.get("EXPORT_CROP_SCALE", 2.0))
 
-    print(f"[*] Processing: {pdf_path}")
-    print(f"[*] Output directory: {output_dir}")
-    print(f"[*] Page Offset: {page_offset}")
-    sys.stdout.flush()
-    
-    # Configure Pipeline for High-Fidelity Extraction
-    options = PdfPipelineOptions()
-    options.generate_picture_images = True
-    options.generate_page_images = True
-    options.images_scale = 2.0  # 2x scale for high quality
-
-    converter = DocumentConverter(
-        format_options={
-            InputFormat.PDF: PdfFormatOption(pipeline_options=options)
-        }
-    )
-
-    print("[*] Starting conversion (this may take a moment)...")
-    sys.stdout.flush()
-    result = converter.convert(pdf_path)
-    doc = result.document
+# Long-lived converters keyed by pipeline options. Building a DocumentConverter and loading its
+# layout/TableFormer models is a large share of per-chunk time, so each runner process does it once.
+# Threads that convert concurrently (pipeline export workers) each use their own `slot`.
+_converters = {}
+_converters_lock = threading.Lock()
 
-    # 1. Save Page Images as pageX.png
-    print(f"[*] Saving full-page images for {len(doc.pages)} pages...")
-    sys.stdout.flush()
+def _converter_key(images_scale, slot=0):
+    return (("generate_picture_images", True), ("generate_page_images", True), ("images_scale", images_scale), ("slot", slot))
+
+def get_converter(images_scale: float = DEFAULT_IMAGES_SCALE, slot: int = 0):
+    """
+    Returns (converter, load_seconds) for the given options.
+    `load_seconds` is 0.0 when an already-initialized converter is reused.
+    """
+    key = _converter_key(images_scale, slot)
+    with _converters_lock:
+        if key in _converters:
+            return _converters[key], 0.0
+
+        start = time.perf_counter()
+        # Configure Pipeline for High-Fidelity Extraction
+        options = PdfPipelineOptions()
+        options.generate_picture_images = True
+        options.generate_page_images = True
+        options.images_scale = images_scale
+
+        converter = DocumentConverter(
+            format_options={
+                InputFormat.PDF: PdfFormatOption(pipeline_options=options)
+            }
+        )
+        # Load the models now instead of lazily inside the first convert() call
+        converter.initialize_pipeline(InputFormat.PDF)
+        load_seconds = time.perf_counter() - start
+
+        _converters[key] = converter
+        print(f"[*] Docling converter initialized in {load_seconds:.1f}s (images_scale={images_scale}, slot={slot})")
+        sys.stdout.flush()
+        return converter, load_seconds
+
+def render_scale(images_scale=DEFAULT_IMAGES_SCALE, archive_scale=None, crop_scale=DEFAULT_CROP_SCALE):
+    """Scale Docling has to render at for a profile (the converter to warm up)."""
+    return max(scale for scale in (images_scale, archive_scale, crop_scale) if scale)
+
+def scaled_size(image, scale, rendered_at):
+    """Size to resize a render at `rendered_at` to for `scale`, or None when it is already there."""
+    if not scale or scale >= rendered_at:
+        return None
+    factor = scale / rendered_at
+    return (max(1, int(image.width * factor)), max(1, int(image.height * factor)))
+
+def dir_size(path):
+    return sum(p.stat().st_size for p in Path(path).rglob("*") if p.is_file())
+
+# Streaming export (`window_pages`): the chunk is converted a window of pages at a time. Each window's page
+# images and crops are written, its Docling JSON is saved as a part, and the ConversionResult is freed before
+# the next window, so peak RSS depends on the window size instead of the chunk size. The parts are listed
+# in `metadata.parts.json`, which `process_skus` reads in place of `metadata.json`.
+METADATA_FILE = "metadata.json"
+METADATA_PARTS_FILE = "metadata.parts.json"
+METADATA_PARTS_DIR = "metadata_parts"
+
+def pdf_page_count(pdf_path):
+    from pypdf import PdfReader
+    return len(PdfReader(pdf_path).pages)
+
+def page_windows(first, last, window_pages):
+    """Splits pages first-last (inclusive) into consecutive windows of at most `window_pages`."""
+    return [(start, min(start + window_pages - 1, last)) for start in range(first, last + 1, window_pages)]
+
+def save_page_images(doc, image_dir, page_offset, images_scale, archive_scale, writer, rendered_at=None):
+    """
+    Queues `page<N>` images for every page of `doc` (and the archive copy) on `writer`; returns the real page numbers.
+    Pages rendered at `rendered_at` (default: `images_scale`) are resized to each copy's scale.
+    """
+    archive_dir = image_dir / "archive"
+    rendered_at = rendered_at or images_scale
+    saved = []
     for page_no, page in doc.pages.items():
         if page.image:
             real_page_no = page_no + page_offset
-            page_filename = f"page{real_page_no}.png"
-            target_path = image_dir / page_filename
-            page.image.pil_image.save(target_path)
-            print(f"    [+] Saved: {page_filename}")
+            pil_image = page.image.pil_image
+            if archive_scale:
+                writer.save(pil_image, writer.path_for(archive_dir, f"page{real_page_no}"),
+                            scaled_size(pil_image, archive_scale, rendered_at))
+            target_path = writer.save(pil_image, writer.path_for(image_dir, f"page{real_page_no}"),
+                                      scaled_size(pil_image, images_scale, rendered_at))
+            saved.append(real_page_no)
+            print(f"    [+] Queued: {target_path.name}")
             sys.stdout.flush()
         else:
             print(f"    [!] Page {page_no} has no image data.")
             sys.stdout.flush()
+    return saved
 
+def save_picture_crops(doc, image_dir, output_dir, page_offset, writer, crop_scale=None, rendered_at=None):
+    """
+    Queues a crop of every picture element of `doc` on `writer`, resized from `rendered_at` to `crop_scale`
+    when it was rendered larger; returns its provenance map entries.
+    """
     image_mapping = []
-    
-    # 2. Extract specific picture elements and building provenance map
-    print("[*] Extracting specific picture elements...")
-    sys.stdout.flush()
     for item, _level in doc.iterate_items():
         if item.label == "picture":
             # Extract basic provenance
@@ -82,12 +152,13 @@ def export_assets(pdf_path: str, output_base_dir: str, page_offset: int = 0):
             pic_id = item.self_ref.split('/')[-1] if hasattr(item, 'self_ref') else f"p{real_page_no}_idx{_level}"
             
             # Generate a clean filename for cropping
-            filename = f"crop_page_{real_page_no}_{pic_id}.png"
-            target_path = image_dir / filename
+            target_path = writer.path_for(image_dir, f"crop_page_{real_page_no}_{pic_id}")
+            filename = target_path.name
             
             # Attempt to save the image if it exists in the item
             if hasattr(item, 'image') and item.image:
-                item.image.pil_image.save(target_path)
+                pil_image = item.image.pil_image
+                writer.save(pil_image, target_path, scaled_size(pil_image, crop_scale, rendered_at or crop_scale))
                 
                 # Capture context: text associated with or near the picture
                 context_text = item.text if hasattr(item, 'text') and item.text else ""
@@ -101,20 +172,147 @@ def export_assets(pdf_path: str, output_base_dir: str, page_offset: int = 0):
                     "text_context": context_text,
                     "path": str(target_path.relative_to(output_dir))
                 })
-                print(f"    [+] Saved crop: {filename} (bbox: {bbox})")
+                print(f"    [+] Queued crop: {filename} (bbox: {bbox})")
                 sys.stdout.flush()
             else:
                 print(f"    [!] Picture at page {page_no} has no image data.")
                 sys.stdout.flush()
+    return image_mapping
+
+def clear_metadata(output_dir, streaming):
+    """Removes the other layout's document JSON, so a re-export never leaves a stale one behind."""
+    if streaming:
+        (output_dir / METADATA_FILE).unlink(missing_ok=True)
+    else:
+        (output_dir / METADATA_PARTS_FILE).unlink(missing_ok=True)
+    shutil.rmtree(output_dir / METADATA_PARTS_DIR, ignore_errors=True)
 
-    # 3. Save the Image Provenance Map (JSON)
+def export_assets(pdf_path: str, output_base_dir: str, page_offset: int = 0, page_range=None,
+                  images_scale: float = DEFAULT_IMAGES_SCALE, archive_scale: float = None, converter_slot: int = 0,
+                  window_pages: int = None, artifact_profile=None, crop_scale: float = DEFAULT_CROP_SCALE):
+    """
+    Runs Docling on `pdf_path` and writes page images, picture crops, the provenance map
+    and `metadata.json` into `output_base_dir`.
+    `page_range` (1-based, inclusive) converts only those pages of `pdf_path`; Docling keeps the
+    original page numbers in that case, so `page_offset` should be 0.
+    Page images are written at `images_scale` (recorded in `images/render.json` for synthesis) and picture
+    crops at `crop_scale`; with `archive_scale`, full-size copies at that scale are also kept in `images/archive/`.
+    `converter_slot` picks the warm converter; concurrent callers in one process must use different slots.
+    With `window_pages`, pages are converted and written `window_pages` at a time and the document JSON
+    is saved as parts listed in `metadata.parts.json` (see above).
+    Images are encoded on a background `ArtifactWriter` with `artifact_profile` (format, PNG compression, quality,
+    threads; see extract/artifact_writer.py) and flushed before the provenance map and metadata are written.
+    Returns stage timings in seconds (`artifacts` is the sum of `page_images`, `picture_crops`, `artifact_flush`,
+    `provenance_maps` and `metadata`); `converter_load` is 0.0 when the warm converter was reused.
+    Timings, disk usage and the peak RSS sampled during the export are also written to `export_stats.json`.
+    """
+    timings = {"conversion": 0.0, "page_images": 0.0, "picture_crops": 0.0, "artifact_flush": 0.0, "metadata": 0.0}
+    pdf_path = Path(pdf_path).resolve()
+    output_dir = Path(output_base_dir).resolve()
+    image_dir = output_dir / "images"
+    image_dir.mkdir(parents=True, exist_ok=True)
+    archive_dir = image_dir / "archive"
+    if archive_scale and archive_scale > images_scale:
+        archive_dir.mkdir(exist_ok=True)
+    else:
+        archive_scale = None
+    rendered_at = render_scale(images_scale, archive_scale, crop_scale)
+
+    print(f"[*] Processing: {pdf_path}")
+    print(f"[*] Output directory: {output_dir}")
+    print(f"[*] Page Offset: {page_offset}")
+    if page_range:
+        print(f"[*] Page Range: {page_range[0]}-{page_range[1]}")
+    sys.stdout.flush()
+    
+    print(f"[*] Render Scale: {rendered_at} (page images {images_scale}, crops {crop_scale}"
+          + (f", archive copy {archive_scale})" if archive_scale else ")"))
+    sys.stdout.flush()
+    converter, timings["converter_load"] = get_converter(rendered_at, converter_slot)
+
+    # Whole chunk in one conversion, or consecutive windows of it
+    if window_pages:
+        first, last = page_range if page_range else (1, pdf_page_count(pdf_path))
+        windows = page_windows(first, last, window_pages)
+        print(f"[*] Streaming export: {last - first + 1} pages in {len(windows)} windows of up to {window_pages}")
+    else:
+        windows = [page_range]
+    clear_metadata(output_dir, bool(window_pages))
+    if window_pages:
+        (output_dir / METADATA_PARTS_DIR).mkdir()
+
+    pages = 0
+    page_nos = []
+    image_mapping = []
+    parts = []
+    json_path = output_dir / METADATA_FILE
+    writer = ArtifactWriter(artifact_profile)
+    print(f"[*] Artifacts: {writer.profile['format']} (PNG compression {writer.profile['compress_level']}, "
+          f"{writer.profile['workers']} writer threads)")
+    with RssSampler() as rss, writer:
+        for window in windows:
+            print("[*] Starting conversion (this may take a moment)..." if not window_pages else
+                  f"[*] Converting pages {window[0]}-{window[1]}...")
+            sys.stdout.flush()
+            start = time.perf_counter()
+            if window:
+                result = converter.convert(pdf_path, page_range=(window[0], window[1]))
+            else:
+                result = converter.convert(pdf_path)
+            doc = result.document
+            conversion = time.perf_counter() - start
+            timings["conversion"] += conversion
+            pages += len(doc.pages)
+            print(f"[*] Conversion finished in {conversion:.1f}s")
+            sys.stdout.flush()
+
+            # 1. Save Page Images as pageX.png
+            start = time.perf_counter()
+            print(f"[*] Saving full-page images for {len(doc.pages)} pages...")
+            sys.stdout.flush()
+            page_nos += save_page_images(doc, image_dir, page_offset, images_scale, archive_scale, writer, rendered_at)
+            timings["page_images"] += time.perf_counter() - start
+
+            # 2. Extract specific picture elements and building provenance map
+            start = time.perf_counter()
+            print("[*] Extracting specific picture elements...")
+            sys.stdout.flush()
+            image_mapping += save_picture_crops(doc, image_dir, output_dir, page_offset, writer, crop_scale, rendered_at)
+            timings["picture_crops"] += time.perf_counter() - start
+
+            # Every image is written (or the export fails) before the document JSON is saved, and,
+            # when streaming, before the window's memory is released
+            start = time.perf_counter()
+            writer.flush()
+            timings["artifact_flush"] += time.perf_counter() - start
+
+            # 3. Save Document JSON for SKU Processor (one part per window when streaming)
+            start = time.perf_counter()
+            if window_pages:
+                part_path = output_dir / METADATA_PARTS_DIR / f"part{len(parts) + 1:03d}.json"
+                doc.save_as_json(part_path)
+                parts.append({"path": str(part_path.relative_to(output_dir)), "pages": list(window), "bytes": part_path.stat().st_size})
+                # Drop this window's rendered pages and crops before converting the next one
+                del result, doc
+                gc.collect()
+                print(f"    [+] Saved part: {parts[-1]['path']} (RSS {rss.sample()} MB)")
+            else:
+                print(f"[*] Saving full document JSON to: {json_path}")
+                sys.stdout.flush()
+                doc.save_as_json(json_path)
+                del result, doc
+            timings["metadata"] += time.perf_counter() - start
+
+    start = time.perf_counter()
+
+    # 4. Save the Image Provenance Map (JSON)
     map_json_path = output_dir / "image_provenance_map.json"
     print(f"[*] Writing provenance map to: {map_json_path}")
     sys.stdout.flush()
     with open(map_json_path, "w") as f:
         json.dump(image_mapping, f, indent=2)
     
-    # 4. Save the Document Overview (Markdown) with Image References
+    # 5. Save the Document Overview (Markdown) with Image References
     map_md_path = output_dir / "image_provenance_map.md"
     print(f"[*] Writing human-readable map to: {map_md_path}")
     sys.stdout.flush()
@@ -127,14 +325,52 @@ def export_assets(pdf_path: str, output_base_dir: str, page_offset: int = 0):
             bbox_str = str(entry.get('bbox', 'N/A'))
             f.write(f"| ![]({entry['path']}) | {entry['page_number']} | {entry['text_context']} | {bbox_str} |\n")
 
-    # 5. Save Full Document JSON for SKU Processor
-    json_path = output_dir / "metadata.json"
-    print(f"[*] Saving full document JSON to: {json_path}")
-    sys.stdout.flush()
-    doc.save_as_json(json_path)
+    timings["provenance_maps"] = time.perf_counter() - start
+    start = time.perf_counter()
+
+    # 6. Parts manifest (streaming export)
+    if window_pages:
+        with open(output_dir / METADATA_PARTS_FILE, "w") as f:
+            json.dump({"window_pages": window_pages, "parts": parts}, f, indent=2)
 
+    # 7. Record how the page images were rendered (read by synthesis to size its payloads)
+    with open(image_dir / "render.json", "w") as f:
+        json.dump({"images_scale": images_scale, "crop_scale": crop_scale, "archive_scale": archive_scale,
+                   "render_scale": rendered_at, "format": writer.profile["format"]}, f, indent=2)
+
+    timings["metadata"] += time.perf_counter() - start
+    timings["artifacts"] = (timings["page_images"] + timings["picture_crops"] + timings["artifact_flush"]
+                            + timings["provenance_maps"] + timings["metadata"])
+
+    # 8. Export cost of this profile: time, disk and memory per chunk, comparable across runs
+    page_images = [writer.path_for(image_dir, f"page{page_no}") for page_no in page_nos]
+    disk = {
+        "page_images": sum(p.stat().st_size for p in page_images if p.exists()),
+        "picture_crops": sum((image_dir / entry["filename"]).stat().st_size for entry in image_mapping),
+        "archive": dir_size(archive_dir) if archive_scale else 0,
+        "metadata": sum(part["bytes"] for part in parts) if window_pages else json_path.stat().st_size,
+    }
+    disk["total"] = sum(disk.values())
+    with open(output_dir / "export_stats.json", "w") as f:
+        json.dump({
+            "images_scale": images_scale,
+            "crop_scale": crop_scale,
+            "archive_scale": archive_scale,
+            "pages": pages,
+            "window_pages": window_pages,
+            "windows": len(windows),
+            "peak_rss_mb": rss.peak_mb,
+            "artifacts": {**{k: writer.profile[k] for k in ("format", "compress_level", "quality", "workers")},
+                          "images": writer.stats["images"], "encode_seconds": round(writer.stats["encode_seconds"], 3)},
+            "timings": {k: round(v, 3) for k, v in timings.items()},
+            "disk_bytes": disk,
+        }, f, indent=2)
+    print(f"[*] Disk usage: {disk['total'] / 1e6:.1f} MB (page images {disk['page_images'] / 1e6:.1f} MB, "
+          f"crops {disk['picture_crops'] / 1e6:.1f} MB, archive {disk['archive'] / 1e6:.1f} MB, metadata {disk['metadata'] / 1e6:.1f} MB)")
+    print(f"[*] Peak RSS during export: {rss.peak_mb} MB")
     print("[*] Done.")
     sys.stdout.flush()
+    return timings
 
 if __name__ == "__main__":
     import argparse
@@ -142,6 +378,21 @@ if __name__ == "__main__":
     parser.add_argument("pdf_path", help="Path to PDF")
     parser.add_argument("output_dir", help="Output directory")
     parser.add_argument("--page-offset", type=int, default=0, help="Offset to add to page numbers")
+    parser.add_argument("--pages", help="start-end (1-based) page range of pdf_path to convert")
+    parser.add_argument("--images-scale", type=float, default=DEFAULT_IMAGES_SCALE, help=f"Page image resolution in pixels per PDF point (default: {DEFAULT_IMAGES_SCALE}, env EXPORT_IMAGES_SCALE)")
+    parser.add_argument("--crop-scale", type=float, default=DEFAULT_CROP_SCALE, help=f"Picture crop resolution in pixels per PDF point (default: {DEFAULT_CROP_SCALE}, env EXPORT_CROP_SCALE)")
+    parser.add_argument("--archive-scale", type=float, help="Also keep full-size page images at this scale in images/archive/")
+    parser.add_argument("--image-format", choices=["png", "webp", "jpeg"], help="Format of page images and crops (default: png, env EXPORT_IMAGE_FORMAT)")
+    parser.add_argument("--png-compression", type=int, help="PNG zlib level 0-9 (default: 6, env EXPORT_PNG_COMPRESSION)")
+    parser.add_argument("--image-quality", type=int, help="WebP/JPEG quality 1-100 (default: 90, env EXPORT_IMAGE_QUALITY)")
+    parser.add_argument("--writer-threads", type=int, help="Background image writer threads, 0 to write inline (default: min(4, CPUs), env EXPORT_WRITER_THREADS)")
+    parser.add_argument("--window", type=int, help="Stream the export N pages at a time (bounded memory; writes metadata.parts.json)")
     args = parser.parse_args()
     
-    export_assets(args.pdf_path, args.output_dir, args.page_offset)
+    page_range = None
+    if args.pages:
+        page_range = tuple(map(int, args.pages.split("-")))
+
+    export_assets(args.pdf_path, args.output_dir, args.page_offset, page_range, args.images_scale, args.archive_scale,
+                  window_pages=args.window, crop_scale=args.crop_scale,
+                  artifact_profile=make_artifact_profile(args.image_format, args.png_compression, args.image_quality, args.writer_threads))
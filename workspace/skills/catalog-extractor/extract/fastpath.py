@@ -0,0 +1,165 @@
+import re
+
+# Deterministic synthesis for pages whose spec tables Docling already parsed cleanly.
+# `process_skus` writes every technical table row to `sku_intermediate.jsonl` with its table's headers and
+# the row's cell count. A page takes the fast path when enough of its rows pass every check below; its
+# `sku.jsonl` records and Markdown tables are then rendered from those rows and no request is sent. Lines of
+# the page's pypdf text that the table cells don't account for (headings, notes, footers) are kept as text
+# around the tables, and the page's picture crops are embedded, so the fragment doesn't lose the page's
+# narrative or figures. The fast path is opt-in (`run.py --fastpath`).
+# Checks per row:
+#   columns: the row has as many cells as its table has headers (no merged or split cells)
+#   sku:     the SKU looks like a part number (digits, letters, "/", "-", "."; not a bare decimal like "5.03")
+#   text:    the SKU and every cell value occur in the page's pypdf text on token boundaries, so no cell was
+#            misread ("12" does not match inside "4120")
+#   shift:   `process_skus` didn't rotate the row to repair a column shift (`shifted`; `shift_ambiguous` marks
+#            rotations that rest only on an empty SKU or last cell)
+#   unique:  no other row on the page has the same SKU
+# A page's confidence is the share of its rows passing all checks; pages below the minimum go to the model.
+
+# With the default, a single failing row sends the page to the model
+DEFAULT_MIN_CONFIDENCE = 1.0
+CHECKS = ["columns", "sku", "text", "shift", "unique"]
+
+SKU_PATTERN = re.compile(r"^(?=.*\d)[A-Za-z0-9][A-Za-z0-9./\-]{2,24}$")
+DECIMAL = re.compile(r"^\d*\.\d+$")
+# Characters that continue a token: a cell must not start or end inside one in the page text
+TOKEN_CHAR = r"A-Za-z0-9"
+
+def valid_sku(sku):
+    return isinstance(sku, str) and bool(SKU_PATTERN.match(sku)) and not DECIMAL.match(sku)
+
+def in_text(value, page_text):
+    """True if the cell `value` occurs in `page_text` as whole tokens (any whitespace between its words)."""
+    words = str(value).split()
+    if not words:
+        return True
+    pattern = rf"(?<![{TOKEN_CHAR}])" + r"\s+".join(re.escape(w) for w in words) + rf"(?![{TOKEN_CHAR}])"
+    return re.search(pattern, page_text) is not None
+
+def row_failures(row, page_text, sku_counts):
+    """The checks a `sku_intermediate.jsonl` row fails (empty if it can be used as is)."""
+    failed = []
+    headers = row.get("headers") or []
+    if len(headers) < 2 or row.get("row_columns") != len(headers):
+        failed.append("columns")
+    sku = row.get("sku")
+    if not valid_sku(sku):
+        failed.append("sku")
+    elif not in_text(sku, page_text) or not all(in_text(v, page_text) for v in row.get("technical_data", {}).values()):
+        failed.append("text")
+    # Rows written before the structure fields existed count as unchecked
+    if row.get("shifted") is not False:
+        failed.append("shift")
+    if sku_counts.get(sku, 0) > 1:
+        failed.append("unique")
+    return failed
+
+def score_page(rows, page_text):
+    """(confidence, {check: failing rows}) for one page's rows; confidence is 0.0 for a page without rows."""
+    if not rows:
+        return 0.0, {}
+    sku_counts = {}
+    for row in rows:
+        sku_counts[row.get("sku")] = sku_counts.get(row.get("sku"), 0) + 1
+    failures = {}
+    passed = 0
+    for row in rows:
+        failed = row_failures(row, page_text or "", sku_counts)
+        for check in failed:
+            failures[check] = failures.get(check, 0) + 1
+        if not failed:
+            passed += 1
+    return round(passed / len(rows), 3), failures
+
+def _cell(text):
+    return str(text).replace("|", "\\|").replace("\n", " ").strip()
+
+def narrative_blocks(rows, page_text):
+    """
+    (before, after): the lines of `page_text` not made up of the rows' cells, headers and headings, as
+    paragraphs before the first line holding a SKU and after it.
+    """
+    covered = set()
+    skus = {str(row.get("sku")) for row in rows}
+    for row in rows:
+        values = list(row.get("technical_data", {}).values()) + list(row.get("headers") or [])
+        values += [row.get("sku"), row.get("series"), row.get("gauge")]
+        for value in values:
+            if value is not None:
+                covered.update(str(value).split())
+
+    before, after = [], []
+    block = []
+    seen_table = False
+    for line in (page_text or "").splitlines():
+        words = line.split()
+        if words and all(w in covered for w in words):
+            seen_table = seen_table or any(w in skus for w in words)
+            line = ""
+        if line.strip():
+            block.append(line.strip())
+            continue
+        if block:
+            (after if seen_table else before).append("\n".join(block))
+            block = []
+    if block:
+        (after if seen_table else before).append("\n".join(block))
+    return before, after
+
+def picture_blocks(pictures):
+    """Markdown for a page's picture crops (provenance map entries): each crop and its caption."""
+    parts = []
+    for item in pictures or []:
+        caption = (item.get("text_context") or "").strip()
+        parts.append(f"![{caption or item['filename']}](raw/{item['path']})")
+        if caption:
+            parts.append(f"*{caption}*")
+    return parts
+
+def render_page(page_num, img_name, rows, page_text="", pictures=None):
+    """
+    Markdown and SKU records for a page from its rows, in the shape synthesis produces: the page image and
+    its picture crops (see `picture_blocks`), the page's other text (see `narrative_blocks`) around, per
+    table, its series/gauge headings and a Markdown table; one SKU record per row.
+    """
+    before, after = narrative_blocks(rows, page_text)
+    parts = [f"![Page {page_num}](raw/images/{img_name})"] + picture_blocks(pictures) + before
+    tables = {}
+    for row in rows:
+        tables.setdefault(row.get("table_ref"), []).append(row)
+
+    series = None
+    for table_rows in tables.values():
+        first = table_rows[0]
+        if first.get("series") != series:
+            series = first.get("series")
+            parts.append(f"## {series}")
+        if first.get("gauge") and first["gauge"] != "N/A":
+            parts.append(f"### {first['gauge']}")
+        headers = [h for h in first.get("headers", []) if h]
+        lines = ["| " + " | ".join(_cell(h) for h in headers) + " |", "|" + "---|" * len(headers)]
+        for row in table_rows:
+            specs = row.get("technical_data", {})
+            lines.append("| " + " | ".join(_cell(specs.get(h, "")) for h in headers) + " |")
+        parts.append("\n".join(lines))
+    parts += after
+
+    skus = [{
+        "sku": row["sku"],
+        "series": row.get("series"),
+        "description": row.get("gauge") if row.get("gauge") != "N/A" else "",
+        "specs": row.get("technical_data", {}),
+        "provenance": {"page": page_num, "file": "catalog.pdf"},
+    } for row in rows]
+    return {"markdown_content": "\n\n".join(parts), "skus": skus}
+
+def fastpath_page(page_num, img_name, rows, page_text, min_confidence=DEFAULT_MIN_CONFIDENCE, pictures=None):
+    """
+    Returns (confidence, failures, fragment): the fragment (as `render_page`) when the page's rows
+    reach `min_confidence`, else None and the page is synthesized by the model.
+    """
+    confidence, failures = score_page(rows, page_text)
+    if not rows or confidence < min_confidence:
+        return confidence, failures, None
+    return confidence, failures, render_page(page_num, img_name, rows, page_text, pictures)
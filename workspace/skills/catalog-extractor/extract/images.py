@@ -0,0 +1,227 @@
+import io
+import os
+import json
+import time
+import hashlib
+import threading
+import PIL.Image
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+# Page image pre-processing for synthesis requests.
+# A profile fixes what goes over the wire: target resolution, colour mode and encoding. Encoded payloads
+# are cached next to the chunk's images (`.encoded/`) and prepared on a small thread pool ahead of the
+# requests that need them, so the synthesis threads only ever wait on the network. Each chunk's cache is
+# bounded like the response cache: least recently used entries (by mtime) are evicted above a size budget.
+
+IMAGE_FORMATS = {"png": "image/png", "jpeg": "image/jpeg", "webp": "image/webp"}
+GRAYSCALE_MODES = ["auto", "on", "off"]
+
+# Scale of the exported page images (pixels per PDF point) when the export didn't record one.
+DEFAULT_SOURCE_SCALE = 2.0
+
+DEFAULT_IMAGE_PROFILE = {
+    # Pixels per PDF point sent to the model; 1.0 matches the previous 50% downscale of 2x exports
+    "scale": float(os.environ.get("SYNTHESIS_IMAGE_SCALE", 1.0)),
+    "grayscale": os.environ.get("SYNTHESIS_IMAGE_GRAYSCALE", "off"),
+    "format": os.environ.get("SYNTHESIS_IMAGE_FORMAT", "png"),
+    # JPEG/WebP only
+    "quality": int(os.environ.get("SYNTHESIS_IMAGE_QUALITY", 85)),
+}
+
+# Size budget of a chunk's `.encoded/` cache; old profiles and replaced page images are evicted first
+DEFAULT_ENCODED_MAX_MB = int(os.environ.get("SYNTHESIS_ENCODED_CACHE_MAX_MB", 64))
+
+# "auto" grayscale: a page counts as line art when less than 1% of its pixels carry noticeable colour
+GRAYSCALE_SATURATION = 48
+GRAYSCALE_COLOR_FRACTION = 0.01
+
+def make_image_profile(scale=None, grayscale=None, fmt=None, quality=None):
+    """Returns the default profile with any given settings overridden, validated."""
+    profile = dict(DEFAULT_IMAGE_PROFILE)
+    for key, value in (("scale", scale), ("grayscale", grayscale), ("format", fmt), ("quality", quality)):
+        if value is not None:
+            profile[key] = value
+    profile["format"] = profile["format"].lower().replace("jpg", "jpeg")
+    if profile["format"] not in IMAGE_FORMATS:
+        raise ValueError(f"Unsupported image format: {profile['format']} (expected one of {', '.join(IMAGE_FORMATS)})")
+    if profile["grayscale"] not in GRAYSCALE_MODES:
+        raise ValueError(f"Unsupported grayscale mode: {profile['grayscale']} (expected one of {', '.join(GRAYSCALE_MODES)})")
+    if profile["scale"] <= 0 or not 1 <= profile["quality"] <= 100:
+        raise ValueError("Image scale must be positive and quality between 1 and 100")
+    return profile
+
+def read_source_scale(images_dir):
+    """Scale the page images were rendered at, from the `render.json` written by the export stage."""
+    try:
+        with open(Path(images_dir) / "render.json", "r") as f:
+            return float(json.load(f).get("images_scale", DEFAULT_SOURCE_SCALE))
+    except (FileNotFoundError, ValueError, TypeError):
+        return DEFAULT_SOURCE_SCALE
+
+def is_line_art(img):
+    """True when the page has (almost) no coloured pixels, judged on a thumbnail."""
+    thumb = img.convert("RGB")
+    thumb.thumbnail((256, 256))
+    saturation = thumb.convert("HSV").getchannel("S").histogram()
+    colored = sum(saturation[GRAYSCALE_SATURATION:])
+    return colored < GRAYSCALE_COLOR_FRACTION * (thumb.width * thumb.height)
+
+def encode_image(img_path, profile, source_scale=DEFAULT_SOURCE_SCALE):
+    """Resizes, optionally converts to grayscale and encodes one page image. Returns the payload dict."""
+    with PIL.Image.open(img_path) as img:
+        factor = profile["scale"] / source_scale
+        # Never upscale: a larger target than the export only adds tokens, not detail
+        if factor < 1:
+            new_size = (max(1, int(img.width * factor)), max(1, int(img.height * factor)))
+            img = img.resize(new_size, PIL.Image.Resampling.LANCZOS)
+        else:
+            img.load()
+
+        grayscale = profile["grayscale"] == "on" or (profile["grayscale"] == "auto" and is_line_art(img))
+        if grayscale:
+            img = img.convert("L")
+        elif img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+
+        buf = io.BytesIO()
+        if profile["format"] == "png":
+            img.save(buf, format="PNG", optimize=True)
+        elif profile["format"] == "jpeg":
+            img.save(buf, format="JPEG", quality=profile["quality"], optimize=True)
+        else:
+            img.save(buf, format="WEBP", quality=profile["quality"], method=4)
+
+    return {
+        "data": buf.getvalue(),
+        "mime_type": IMAGE_FORMATS[profile["format"]],
+        "width": img.width,
+        "height": img.height,
+        "grayscale": grayscale,
+    }
+
+class ImageEncoder:
+    """
+    Encodes page images for one chunk with a fixed profile, through an on-disk cache in `<images_dir>/.encoded/`.
+    Cache entries are keyed by the profile, the source scale and the source file's size and mtime.
+    `prefetch(paths)` starts encoding in order on a thread pool; `get(path)` returns the payload,
+    waiting for (or doing) the work if it isn't ready yet. Payloads are handed out once and then dropped.
+    `close()` evicts the least recently used entries once the cache is over `max_mb`.
+    """
+
+    def __init__(self, images_dir, profile=None, workers=2, lookahead=8, max_mb=None):
+        self.images_dir = Path(images_dir)
+        self.profile = profile or make_image_profile()
+        self.source_scale = read_source_scale(images_dir)
+        self.cache_dir = self.images_dir / ".encoded"
+        self.max_bytes = (max_mb or DEFAULT_ENCODED_MAX_MB) * 1024 * 1024
+        self.lookahead = lookahead
+        self.pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="encode")
+        self.lock = threading.Lock()
+        self.order = []
+        self.index = {}
+        self.submitted = 0
+        self.futures = {}
+        self.stats = {"encoded": 0, "reused": 0, "bytes": 0, "grayscale": 0, "encode_seconds": 0.0, "evicted": 0, "per_page": {}}
+
+        signature = json.dumps([self.profile, self.source_scale], sort_keys=True)
+        self.profile_key = hashlib.sha256(signature.encode("utf-8")).hexdigest()[:12]
+
+    def _cache_paths(self, img_path):
+        st = Path(img_path).stat()
+        stem = f"{Path(img_path).stem}.{self.profile_key}.{st.st_size}.{st.st_mtime_ns}"
+        return self.cache_dir / f"{stem}.{self.profile['format']}", self.cache_dir / f"{stem}.json"
+
+    def _load(self, img_path):
+        data_path, meta_path = self._cache_paths(img_path)
+        try:
+            with open(meta_path, "r") as f:
+                payload = json.load(f)
+            payload["data"] = data_path.read_bytes()
+            reused = True
+            # Touch on hit so eviction keeps recently used entries
+            try:
+                os.utime(meta_path)
+            except OSError:
+                pass
+        except (FileNotFoundError, json.JSONDecodeError):
+            started = time.time()
+            payload = encode_image(img_path, self.profile, self.source_scale)
+            elapsed = time.time() - started
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+            tmp = data_path.with_name(data_path.name + suffix)
+            tmp.write_bytes(payload["data"])
+            os.replace(tmp, data_path)
+            tmp = meta_path.with_name(meta_path.name + suffix)
+            with open(tmp, "w") as f:
+                json.dump({k: v for k, v in payload.items() if k != "data"}, f)
+            os.replace(tmp, meta_path)
+            reused = False
+            with self.lock:
+                self.stats["encode_seconds"] += elapsed
+
+        with self.lock:
+            self.stats["reused" if reused else "encoded"] += 1
+            self.stats["bytes"] += len(payload["data"])
+            self.stats["grayscale"] += int(payload["grayscale"])
+            self.stats["per_page"][Path(img_path).name] = len(payload["data"])
+        return payload
+
+    def _fill(self, upto):
+        with self.lock:
+            while self.submitted < min(upto, len(self.order)):
+                path = self.order[self.submitted]
+                self.futures[path] = self.pool.submit(self._load, path)
+                self.submitted += 1
+
+    def prefetch(self, paths):
+        """Queues `paths` in request order; the first `lookahead` start encoding immediately."""
+        with self.lock:
+            self.order = [Path(p) for p in paths]
+            self.index = {p: i for i, p in enumerate(self.order)}
+        self._fill(self.lookahead)
+
+    def get(self, img_path):
+        img_path = Path(img_path)
+        position = self.index.get(img_path)
+        if position is not None:
+            self._fill(position + 1 + self.lookahead)
+        with self.lock:
+            future = self.futures.pop(img_path, None)
+        # Not queued, or already handed out (a batch falling back to single pages): the disk cache makes this cheap
+        return future.result() if future is not None else self._load(img_path)
+
+    def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        self.prune()
+
+    def prune(self):
+        """Deletes the oldest entries (payload and metadata together) until the cache is back under 90% of its budget."""
+        entries = {}
+        for p in self.cache_dir.glob("*"):
+            try:
+                st = p.stat()
+            except FileNotFoundError:
+                continue
+            key = p.name if p.suffix == ".tmp" else p.stem
+            mtime, size, paths = entries.get(key, (0, 0, []))
+            entries[key] = (max(mtime, st.st_mtime), size + st.st_size, paths + [p])
+        total = sum(size for _, size, _ in entries.values())
+        if total <= self.max_bytes:
+            return
+        target = self.max_bytes * 0.9
+        for _, size, paths in sorted(entries.values(), key=lambda entry: entry[0]):
+            if total <= target:
+                break
+            for p in paths:
+                p.unlink(missing_ok=True)
+            total -= size
+            with self.lock:
+                self.stats["evicted"] += 1
+
+    def summary(self):
+        with self.lock:
+            stats = dict(self.stats)
+        stats["encode_seconds"] = round(stats["encode_seconds"], 2)
+        return {"profile": self.profile, "source_scale": self.source_scale, **stats}
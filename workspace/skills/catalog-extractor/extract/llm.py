@@ -0,0 +1,281 @@
+import os
+import re
+import json
+import time
+import base64
+import random
+import threading
+
+# Model backends for synthesis. A backend turns (prompt, encoded page images, generation config) into an
+# `LLMResponse`; nothing is imported or connected until the first request, so the synthesis module loads
+# without credentials or SDKs. One backend instance (and its HTTP connection pool) is shared by every
+# synthesis thread in the process, see `get_backend`.
+#   gemini: Google Gemini through the google-genai SDK (GOOGLE_API_KEY)
+#   openai: any OpenAI-compatible /chat/completions endpoint, e.g. a local vLLM or llama.cpp server
+#   stub:   deterministic canned responses, offline (benchmarks, dry runs)
+
+# Settings are read from the environment when a backend is created (after `.env` has been loaded):
+#   LLM_BACKEND (gemini), GEMINI_MODEL (gemini-2.0-flash), GOOGLE_API_KEY,
+#   LLM_BASE_URL (http://localhost:8000/v1), LLM_MODEL (default), LLM_API_KEY, LLM_POOL_SIZE (16), LLM_TIMEOUT (300),
+#   LLM_STUB_LATENCY (0)
+BACKENDS = ["gemini", "openai", "stub"]
+
+def _env(name, default):
+    return os.environ.get(name) or default
+
+def default_backend():
+    return _env("LLM_BACKEND", "gemini")
+
+class LLMConfigError(Exception):
+    """Raised when a backend can't be set up (missing credentials, unknown backend)."""
+
+class LLMResponse:
+    """Backend-neutral response: text plus reported usage (None when the backend doesn't report it)."""
+
+    def __init__(self, text, input_tokens=None, output_tokens=None, finish_reason=None):
+        self.text = text
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+        # "STOP", "MAX_TOKENS" or the backend's own value
+        self.finish_reason = finish_reason
+
+class GeminiBackend:
+    name = "gemini"
+
+    def __init__(self, model=None, api_key=None):
+        self.model = model or _env("GEMINI_MODEL", "gemini-2.0-flash")
+        self.api_key = api_key
+        self._client = None
+        self._types = None
+        self._lock = threading.Lock()
+
+    @property
+    def model_id(self):
+        # Bare model name, so response cache keys match those written before backends existed
+        return self.model
+
+    def ensure_ready(self):
+        with self._lock:
+            if self._client is None:
+                api_key = self.api_key or os.environ.get("GOOGLE_API_KEY")
+                if not api_key:
+                    raise LLMConfigError("GOOGLE_API_KEY environment variable not set.")
+                from google import genai
+                from google.genai import types
+                self._types = types
+                self._client = genai.Client(api_key=api_key)
+        return self
+
+    def generate(self, prompt, images, config):
+        self.ensure_ready()
+        types = self._types
+        response = self._client.models.generate_content(
+            model=self.model,
+            contents=[prompt, *(types.Part.from_bytes(data=img["data"], mime_type=img["mime_type"]) for img in images)],
+            config=types.GenerateContentConfig(**config),
+        )
+        in_tok, out_tok = None, None
+        if response.usage_metadata:
+            in_tok = response.usage_metadata.prompt_token_count
+            out_tok = response.usage_metadata.candidates_token_count
+        finish_reason = None
+        if getattr(response, "candidates", None):
+            finish_reason = getattr(response.candidates[0].finish_reason, "name", response.candidates[0].finish_reason)
+        return LLMResponse(response.text, in_tok, out_tok, finish_reason)
+
+class OpenAICompatibleBackend:
+    """
+    Chat-completions client over one pooled `httpx.Client` (keep-alive, up to `pool_size` connections),
+    shared by all threads. Images are sent inline as data URLs.
+    """
+
+    name = "openai"
+    FINISH_REASONS = {"stop": "STOP", "length": "MAX_TOKENS"}
+
+    def __init__(self, base_url=None, model=None, api_key=None, pool_size=None, timeout=None):
+        self.base_url = (base_url or _env("LLM_BASE_URL", "http://localhost:8000/v1")).rstrip("/")
+        self.model = model or _env("LLM_MODEL", "default")
+        self.api_key = api_key or os.environ.get("LLM_API_KEY")
+        # Connections kept alive to the endpoint; should cover the requests in flight per process
+        self.pool_size = pool_size or int(_env("LLM_POOL_SIZE", 16))
+        self.timeout = timeout or float(_env("LLM_TIMEOUT", 300))
+        self._http = None
+        self._lock = threading.Lock()
+
+    @property
+    def model_id(self):
+        return f"openai:{self.model}"
+
+    def ensure_ready(self):
+        with self._lock:
+            if self._http is None:
+                import httpx
+                headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+                self._http = httpx.Client(
+                    base_url=self.base_url,
+                    headers=headers,
+                    timeout=self.timeout,
+                    limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size),
+                )
+        return self
+
+    def generate(self, prompt, images, config):
+        self.ensure_ready()
+        content = [{"type": "text", "text": prompt}]
+        for img in images:
+            url = f"data:{img['mime_type']};base64,{base64.b64encode(img['data']).decode('ascii')}"
+            content.append({"type": "image_url", "image_url": {"url": url}})
+        body = {
+            "model": self.model,
+            "messages": [{"role": "user", "content": content}],
+            "temperature": config.get("temperature"),
+            "max_tokens": config.get("max_output_tokens"),
+        }
+        if config.get("response_mime_type") == "application/json":
+            body["response_format"] = {"type": "json_object"}
+        response = self._http.post("/chat/completions", json=body)
+        # Raises httpx.HTTPStatusError ("... 429 ...") so the caller's retry policy applies
+        response.raise_for_status()
+        data = response.json()
+        choice = data["choices"][0]
+        usage = data.get("usage") or {}
+        return LLMResponse(choice["message"]["content"], usage.get("prompt_tokens"), usage.get("completion_tokens"),
+                           self.FINISH_REASONS.get(choice.get("finish_reason"), choice.get("finish_reason")))
+
+    def close(self):
+        with self._lock:
+            if self._http is not None:
+                self._http.close()
+                self._http = None
+
+BATCH_PAGE = re.compile(r"=== PAGE (\d+)(?: \(Image #\d+, file `([^`]*)`\))?")
+SINGLE_PAGE = re.compile(r"Insert the image `!\[Page (\d+)\]\(raw/images/([^)]*)\)")
+
+def stub_page(page_num, img_name=None, skus_per_page=6):
+    """Canned synthesis output for one page: a small spec table and its SKUs."""
+    skus = [{"sku": f"{page_num:03d}-{i:02d}", "name": f"Synthetic cable {page_num}.{i}", "page": page_num,
+             "specs": {"AWG": str(4 + 2 * (i % 6)), "Conductors": str(1 + i % 4)}} for i in range(skus_per_page)]
+    rows = "\n".join(f"| {s['sku']} | {s['specs']['Conductors']} | {s['specs']['AWG']} |" for s in skus)
+    markdown = f"## Page {page_num}\n\n![Page {page_num}](raw/images/{img_name or f'page{page_num}.png'})\n\n| SKU | Conductors | AWG |\n|---|---|---|\n{rows}"
+    return {"markdown_content": markdown, "skus": skus}
+
+def stub_response_text(prompt):
+    """Response for the pages a prompt asks for (batch or single page), in the format the prompt requests."""
+    batch = BATCH_PAGE.findall(prompt)
+    if batch:
+        return json.dumps({"pages": [{"page": int(n), **stub_page(int(n), name)} for n, name in batch]})
+    match = SINGLE_PAGE.search(prompt)
+    return json.dumps(stub_page(int(match.group(1)), match.group(2)) if match else stub_page(0))
+
+class StubBackend:
+    """Offline backend: canned JSON for the requested pages after `latency` seconds (+/- `jitter`, relative)."""
+
+    name = "stub"
+
+    def __init__(self, latency=None, jitter=0.0, seed=0):
+        self.latency = float(_env("LLM_STUB_LATENCY", 0.0)) if latency is None else latency
+        self.jitter = jitter
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = 0
+
+    @property
+    def model_id(self):
+        return "stub"
+
+    def ensure_ready(self):
+        return self
+
+    def generate(self, prompt, images, config):
+        with self.lock:
+            self.calls += 1
+            delay = self.latency * (1 + self.jitter * (2 * self.rng.random() - 1))
+        if delay > 0:
+            time.sleep(delay)
+        text = stub_response_text(prompt)
+        # One 258-token tile per image, as for a small page image
+        return LLMResponse(text, len(prompt) // 4 + 258 * len(images), len(text) // 4, "STOP")
+
+def create_backend(name=None, **options):
+    name = name or default_backend()
+    if name == "gemini":
+        return GeminiBackend(**options)
+    if name == "openai":
+        return OpenAICompatibleBackend(**options)
+    if name == "stub":
+        return StubBackend(**options)
+    raise LLMConfigError(f"Unknown LLM backend: {name} (expected one of {', '.join(BACKENDS)})")
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+def get_backend(name=None):
+    """Returns the process-wide backend for `name` (default: $LLM_BACKEND or gemini), creating it on first use."""
+    name = name or default_backend()
+    with _backends_lock:
+        backend = _backends.get(name)
+        if backend is None:
+            backend = _backends[name] = create_backend(name)
+        return backend
+
+def configure_backend(name, **options):
+    """Replaces the process-wide backend for `name`, e.g. a stub with a given latency."""
+    with _backends_lock:
+        backend = _backends[name] = create_backend(name, **options)
+        return backend
+
+def serve_stub(host="127.0.0.1", port=8000, latency=0.0):
+    """
+    Runs an OpenAI-compatible /v1/chat/completions server answering like `StubBackend`,
+    to exercise the `openai` backend (HTTP, pooling, retries) without a model.
+    """
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self.send_error(404)
+                return
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            parts = body["messages"][-1]["content"]
+            prompt = "".join(p.get("text", "") for p in parts) if isinstance(parts, list) else parts
+            images = sum(1 for p in parts if isinstance(p, dict) and p.get("type") == "image_url") if isinstance(parts, list) else 0
+            if latency:
+                time.sleep(latency)
+            text = stub_response_text(prompt)
+            payload = json.dumps({
+                "object": "chat.completion",
+                "model": body.get("model", "stub"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": len(prompt) // 4 + 258 * images, "completion_tokens": len(text) // 4},
+            }).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    print(f"[*] Stub chat-completions server on http://{host}:{server.server_port}/v1 (latency {latency}s)")
+    return server
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible stub server for offline synthesis runs")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8000, help="Port to listen on (default: 8000)")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to wait before each response (default: 0)")
+    args = parser.parse_args()
+
+    server = serve_stub(args.host, args.port, args.latency)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
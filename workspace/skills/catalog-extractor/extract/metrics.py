@@ -0,0 +1,283 @@
+import os
+import json
+import time
+import socket
+import resource
+import threading
+from pathlib import Path
+
+# Structured performance telemetry.
+# Runners append one JSON record per event to `<job_dir>/metrics.jsonl`:
+#   stage: one pipeline stage of a chunk (export, skus, synthesis) with its timings and bytes written
+#   page:  one synthesized page (API latency, retries, rate-limit wait, tokens, image and fragment bytes)
+#          or one page kept from the model (status "local" or "skipped", with its triage or fast-path `route`)
+#   chunk: one processed chunk (final status, duration, peak RSS of the worker)
+#   pipeline: one `run.py --pipeline` run (per-stage workers, busy seconds and utilization, queue depths)
+# Every record carries `ts`, `kind`, `worker` and `chunk`. `run.py --report --perf` summarizes the file
+# and writes a Prometheus textfile (`metrics.prom`) next to it.
+
+METRICS_FILE = "metrics.jsonl"
+PROMETHEUS_FILE = "metrics.prom"
+PROMETHEUS_PREFIX = "catalog_extractor"
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MB (ru_maxrss is KB on Linux)."""
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+def current_rss_mb():
+    """Resident set size of this process right now, in MB (from /proc; None where it isn't available)."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return round(int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20, 1)
+    except (OSError, ValueError, IndexError):
+        return None
+
+class RssSampler:
+    """
+    Samples the current RSS every `interval` seconds while active; `peak_mb` is the largest value seen.
+    Unlike ru_maxrss (the process's lifetime peak), this is the peak of one piece of work, e.g. one
+    chunk's export in a long-running worker. RSS is per process, so it includes other threads' memory.
+    """
+
+    def __init__(self, interval=0.2):
+        self.interval = interval
+        self.peak_mb = current_rss_mb()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def sample(self):
+        rss = current_rss_mb()
+        if rss is not None:
+            self.peak_mb = max(self.peak_mb or 0, rss)
+        return rss
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.sample()
+
+class MetricsSink:
+    """
+    Appends records to a JSONL file. Each record is a single `os.write` on an O_APPEND descriptor,
+    so several threads and worker processes can share one file without interleaving lines.
+    `bind(**context)` returns a sink that adds `context` (e.g. the chunk id) to every record.
+    """
+
+    def __init__(self, path, **context):
+        self.path = Path(path)
+        self.context = context
+
+    def bind(self, **context):
+        return MetricsSink(self.path, **{**self.context, **context})
+
+    def emit(self, kind, **fields):
+        record = {"ts": round(time.time(), 3), "kind": kind, **self.context, **fields}
+        line = (json.dumps(record, separators=(",", ":")) + "\n").encode("utf-8")
+        try:
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line)
+            finally:
+                os.close(fd)
+        except OSError as e:
+            # Telemetry must never fail the chunk it describes
+            print(f"[!] Could not write metrics to {self.path}: {e}")
+
+def open_metrics(job_dir, worker=None):
+    return MetricsSink(Path(job_dir) / METRICS_FILE, worker=worker or f"{socket.gethostname()}:{os.getpid()}")
+
+def load_metrics(path):
+    """Reads every record of a metrics file, skipping a torn last line."""
+    records = []
+    path = Path(path)
+    if not path.exists():
+        return records
+    with open(path, "r") as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return records
+
+def percentile(values, q):
+    """Nearest-rank percentile (q in 0-100) of a list of numbers; None when empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * q // 100))
+    return ordered[int(rank) - 1]
+
+def distribution(values):
+    values = [v for v in values if v is not None]
+    return {
+        "count": len(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "max": max(values) if values else None,
+        "total": round(sum(values), 3),
+    }
+
+def summarize_metrics(records):
+    """
+    Job-wide performance summary: per-stage and API latency distributions (p50/p95/max/total seconds),
+    page counts, tokens per page, retries, bytes written, peak RSS and pages per minute of wall time.
+    """
+    stages = {}
+    requests = {}
+    pages = {"done": 0, "failed": 0, "cached": 0}
+    local_routes = {}
+    api_calls_avoided = 0
+    tokens = {"input": 0, "output": 0, "billed_pages": 0}
+    retries = 0
+    bytes_written = 0
+    chunks = {}
+    peak_rss = None
+    export_rss = []
+    span = [None, None]
+    pipeline = {}
+
+    for record in records:
+        kind = record.get("kind")
+        if kind == "stage":
+            for name, seconds in record.get("timings", {}).items():
+                stages.setdefault(f"{record['stage']}.{name}", []).append(seconds)
+            stages.setdefault(record["stage"], []).append(record.get("seconds"))
+            bytes_written += record.get("bytes_written", 0)
+            if record["stage"] == "export" and record.get("peak_rss_mb") is not None:
+                export_rss.append(record["peak_rss_mb"])
+            api_calls_avoided += record.get("api_calls_avoided", 0)
+        elif kind == "page":
+            pages[record.get("status", "done")] = pages.get(record.get("status", "done"), 0) + 1
+            bytes_written += record.get("bytes_written", 0)
+            if record.get("status") == "local":
+                local_routes[record.get("route")] = local_routes.get(record.get("route"), 0) + 1
+                continue
+            if record.get("cached"):
+                pages["cached"] += 1
+                continue
+            if record.get("input_tokens") is not None:
+                tokens["input"] += record["input_tokens"]
+                tokens["output"] += record.get("output_tokens") or 0
+                tokens["billed_pages"] += 1
+            # Pages of one batch share a request: count its latency and retries once
+            key = (record.get("worker"), record.get("chunk"), tuple(record.get("batch") or [record.get("page")]))
+            if key not in requests and record.get("latency") is not None:
+                requests[key] = (record["latency"], record.get("rate_limit_wait") or 0)
+                retries += record.get("retries") or 0
+        elif kind == "chunk":
+            chunks[record.get("status")] = chunks.get(record.get("status"), 0) + 1
+            if record.get("peak_rss_mb") is not None:
+                peak_rss = max(peak_rss or 0, record["peak_rss_mb"])
+            started = record["ts"] - record.get("seconds", 0)
+            span[0] = started if span[0] is None else min(span[0], started)
+            span[1] = record["ts"] if span[1] is None else max(span[1], record["ts"])
+        elif kind == "pipeline":
+            for name, stage in record.get("stages", {}).items():
+                totals = pipeline.setdefault(name, {"runs": 0, "workers": 0, "items": 0, "busy": 0.0, "capacity": 0.0, "queue_max": 0})
+                totals["runs"] += 1
+                totals["workers"] = max(totals["workers"], stage["workers"])
+                totals["items"] += stage["items"]
+                totals["busy"] += stage["busy"]
+                totals["capacity"] += stage["workers"] * record.get("wall", 0)
+                totals["queue_max"] = max(totals["queue_max"], record.get("queues", {}).get(name, {}).get("max", 0))
+
+    wall_minutes = (span[1] - span[0]) / 60 if span[0] is not None and span[1] > span[0] else None
+    exported = sum(r.get("pages", 0) for r in records if r.get("kind") == "stage" and r.get("stage") == "export")
+    billed = tokens["billed_pages"]
+    return {
+        "stages": {name: distribution(values) for name, values in sorted(stages.items())},
+        "api_latency": distribution([latency for latency, _ in requests.values()]),
+        "rate_limit_wait": distribution([wait for _, wait in requests.values()]),
+        "requests": len(requests),
+        "retries": retries,
+        # Pages written without a request, by route (triage text/image, fastpath), and the requests that saved
+        "local_routes": local_routes,
+        "api_calls_avoided": api_calls_avoided,
+        "chunks": chunks,
+        "pages": {**pages, "exported": exported},
+        "tokens": {
+            "input": round(tokens["input"]),
+            "output": round(tokens["output"]),
+            "input_per_page": round(tokens["input"] / billed, 1) if billed else None,
+            "output_per_page": round(tokens["output"] / billed, 1) if billed else None,
+        },
+        "bytes_written": bytes_written,
+        "peak_rss_mb": peak_rss,
+        # Sampled per chunk during the Docling export: what one more export worker needs
+        "export_rss_mb": distribution(export_rss),
+        # Across pipeline runs: utilization = busy seconds / (workers x wall seconds)
+        "pipeline": {name: {"runs": t["runs"], "workers": t["workers"], "items": t["items"], "busy": round(t["busy"], 3),
+                            "utilization": round(t["busy"] / t["capacity"], 3) if t["capacity"] else None,
+                            "queue_max": t["queue_max"]}
+                     for name, t in pipeline.items()},
+        "wall_minutes": round(wall_minutes, 2) if wall_minutes else None,
+        "pages_per_minute": {
+            "exported": round(exported / wall_minutes, 2) if wall_minutes else None,
+            "synthesized": round(pages["done"] / wall_minutes, 2) if wall_minutes else None,
+        },
+    }
+
+def format_prometheus(summary):
+    """Renders a summary in the Prometheus text exposition format (for node_exporter's textfile collector)."""
+    p = PROMETHEUS_PREFIX
+    lines = []
+
+    def series(name, kind, help_text, samples):
+        samples = [(labels, value) for labels, value in samples if value is not None]
+        if not samples:
+            return
+        lines.append(f"# HELP {p}_{name} {help_text}")
+        lines.append(f"# TYPE {p}_{name} {kind}")
+        for labels, value in samples:
+            label_str = ",".join(f'{k}="{v}"' for k, v in labels.items())
+            lines.append(f"{p}_{name}{{{label_str}}} {value}" if label_str else f"{p}_{name} {value}")
+
+    stage_samples = []
+    for stage, dist in summary["stages"].items():
+        stage_samples += [({"stage": stage, "quantile": "0.5"}, dist["p50"]), ({"stage": stage, "quantile": "0.95"}, dist["p95"])]
+    series("stage_seconds", "gauge", "Per-chunk stage duration quantiles", stage_samples)
+    series("stage_seconds_total", "counter", "Total seconds spent per stage",
+           [({"stage": stage}, dist["total"]) for stage, dist in summary["stages"].items()])
+    latency = summary["api_latency"]
+    series("api_latency_seconds", "gauge", "Synthesis request latency quantiles",
+           [({"quantile": "0.5"}, latency["p50"]), ({"quantile": "0.95"}, latency["p95"])])
+    series("requests_total", "counter", "Synthesis requests sent", [({}, summary["requests"])])
+    series("retries_total", "counter", "Synthesis request retries", [({}, summary["retries"])])
+    series("api_calls_avoided_total", "counter", "Synthesis requests avoided by triage and the fast path", [({}, summary["api_calls_avoided"])])
+    series("local_pages_total", "counter", "Pages written without a request, by route",
+           [({"route": k}, v) for k, v in summary["local_routes"].items()])
+    series("pages_total", "counter", "Pages by outcome", [({"status": k}, v) for k, v in summary["pages"].items()])
+    series("chunks_total", "counter", "Chunks by final status", [({"status": k}, v) for k, v in summary["chunks"].items()])
+    series("tokens_total", "counter", "Billed tokens",
+           [({"direction": "input"}, summary["tokens"]["input"]), ({"direction": "output"}, summary["tokens"]["output"])])
+    series("tokens_per_page", "gauge", "Billed tokens per synthesized page",
+           [({"direction": "input"}, summary["tokens"]["input_per_page"]), ({"direction": "output"}, summary["tokens"]["output_per_page"])])
+    series("bytes_written_total", "counter", "Bytes written by export, SKU parsing and synthesis", [({}, summary["bytes_written"])])
+    series("stage_utilization", "gauge", "Busy fraction of each pipeline stage's workers",
+           [({"stage": k}, v["utilization"]) for k, v in summary["pipeline"].items()])
+    series("queue_depth_max", "gauge", "Largest number of chunks waiting in front of a pipeline stage",
+           [({"stage": k}, v["queue_max"]) for k, v in summary["pipeline"].items()])
+    series("peak_rss_megabytes", "gauge", "Largest worker peak RSS", [({}, summary["peak_rss_mb"])])
+    export_rss = summary["export_rss_mb"]
+    series("export_rss_megabytes", "gauge", "Peak RSS during one chunk's export, quantiles",
+           [({"quantile": "0.5"}, export_rss["p50"]), ({"quantile": "0.95"}, export_rss["p95"]), ({"quantile": "1"}, export_rss["max"])])
+    series("pages_per_minute", "gauge", "Pages per minute of job wall time",
+           [({"stage": k}, v) for k, v in summary["pages_per_minute"].items()])
+    return "\n".join(lines) + "\n"
+
+def write_prometheus_textfile(path, summary):
+    path = Path(path)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "w") as f:
+        f.write(format_prometheus(summary))
+    os.replace(tmp_path, path)
+    return path
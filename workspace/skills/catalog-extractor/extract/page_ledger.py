@@ -0,0 +1,87 @@
+import os
+import json
+import datetime
+from pathlib import Path
+
+# Page-level bookkeeping for incremental synthesis.
+# Every synthesized page is stored as a fragment, `<chunk>/pages/page<N>.json`, tagged with the fingerprint of
+# the inputs it was generated from. `synthesis_ledger.json` records each page's status (done / failed) and
+# fingerprint, so a rerun only calls the model for pages that are missing, failed or stale, and the chunk's
+# `catalog.md` and `sku.jsonl` are rebuilt from the fragments.
+
+LEDGER_FILE = "synthesis_ledger.json"
+FRAGMENTS_DIR = "pages"
+
+def write_json_atomic(path, data, indent=None):
+    path = Path(path)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=indent)
+    os.replace(tmp_path, path)
+
+class PageLedger:
+    """Ledger and fragments for one chunk directory. Not thread-safe: updated from the thread writing results."""
+
+    def __init__(self, chunk_dir):
+        self.chunk_dir = Path(chunk_dir)
+        self.path = self.chunk_dir / LEDGER_FILE
+        self.fragments_dir = self.chunk_dir / FRAGMENTS_DIR
+        self.pages = {}
+        if self.path.exists():
+            try:
+                with open(self.path, "r") as f:
+                    self.pages = json.load(f).get("pages", {})
+            except (json.JSONDecodeError, AttributeError):
+                print(f"Warning: Ignoring unreadable {LEDGER_FILE}; every page will be synthesized.")
+
+    def fragment_path(self, page_num):
+        return self.fragments_dir / f"page{page_num}.json"
+
+    def is_current(self, page_num, fingerprint):
+        """True if the page was synthesized from exactly these inputs and its fragment is on disk."""
+        entry = self.pages.get(str(page_num))
+        return (entry is not None and entry.get("status") == "done" and entry.get("fingerprint") == fingerprint
+                and self.fragment_path(page_num).exists())
+
+    def status(self, page_num):
+        entry = self.pages.get(str(page_num))
+        return entry.get("status") if entry else None
+
+    def _record(self, page_num, entry):
+        entry["updated_at"] = datetime.datetime.now().isoformat()
+        self.pages[str(page_num)] = entry
+        write_json_atomic(self.path, {"pages": self.pages}, indent=2)
+
+    def record_done(self, page_num, fingerprint, fragment):
+        self.fragments_dir.mkdir(parents=True, exist_ok=True)
+        write_json_atomic(self.fragment_path(page_num), fragment)
+        self._record(page_num, {"status": "done", "fingerprint": fingerprint})
+
+    def record_failed(self, page_num, fingerprint, error):
+        self._record(page_num, {"status": "failed", "fingerprint": fingerprint, "error": error})
+
+    def load_fragment(self, page_num):
+        with open(self.fragment_path(page_num), "r") as f:
+            return json.load(f)
+
+    def assemble(self, page_nums, catalog_path, sku_path):
+        """
+        Rebuilds the chunk outputs from the fragments of `page_nums`, in page order.
+        Pages without a completed fragment are left out. Returns the list of pages written.
+        """
+        written = []
+        catalog_tmp = Path(catalog_path).with_name(f".{Path(catalog_path).name}.{os.getpid()}.tmp")
+        sku_tmp = Path(sku_path).with_name(f".{Path(sku_path).name}.{os.getpid()}.tmp")
+        with open(catalog_tmp, "w") as catalog, open(sku_tmp, "w") as skus:
+            catalog.write("# Product Catalog (Synthesized)\n\n")
+            for page_num in sorted(page_nums):
+                if self.status(page_num) != "done" or not self.fragment_path(page_num).exists():
+                    continue
+                fragment = self.load_fragment(page_num)
+                catalog.write(fragment["markdown"] + "\n\n---\n\n")
+                for sku in fragment["skus"]:
+                    skus.write(json.dumps(sku) + "\n")
+                written.append(page_num)
+        os.replace(catalog_tmp, catalog_path)
+        os.replace(sku_tmp, sku_path)
+        return written
@@ -0,0 +1,84 @@
+import re
+import json
+import mmap
+from pathlib import Path
+
+# Random access to the per-chunk `extract.md` text dump.
+# The planner writes `extract.idx.json` next to it: {"version": 1, "size": <bytes>, "pages": {"<page>": [offset, length]}}
+# with UTF-8 byte offsets of each page's text. With the index, a page is one slice of a memory-mapped file;
+# dumps written without one (older jobs, hand-made chunks) fall back to splitting on the "## Page N" headings.
+
+PAGE_HEADING = re.compile(r"## Page (\d+)")
+PAGE_SEPARATOR = "---"
+
+def index_path_for(md_path):
+    return Path(md_path).with_suffix(".idx.json")
+
+class PageTextIndex:
+    """
+    Memory-mapped view of a text dump and its sidecar index. `get(page)` decodes only that page.
+    Raises ValueError if the index is missing fields or doesn't match the dump (e.g. the dump was rewritten).
+    """
+
+    def __init__(self, md_path, index_path=None):
+        self.md_path = Path(md_path)
+        with open(index_path or index_path_for(md_path), "r") as f:
+            index = json.load(f)
+        if index.get("version") != 1 or "pages" not in index:
+            raise ValueError("unsupported page index")
+        self.offsets = {int(page): tuple(span) for page, span in index["pages"].items()}
+
+        self.file = open(self.md_path, "rb")
+        size = self.md_path.stat().st_size
+        if size != index.get("size"):
+            self.file.close()
+            raise ValueError(f"page index is stale ({size} bytes on disk, {index.get('size')} indexed)")
+        # mmap can't map an empty file; a dump with no pages has nothing to read anyway
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def pages(self):
+        return sorted(self.offsets)
+
+    def get(self, page_num, default=None):
+        span = self.offsets.get(page_num)
+        if span is None:
+            return default
+        offset, length = span
+        return self.data[offset:offset + length].decode("utf-8").strip()
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def split_page_text(content):
+    """Parses a dump without an index into {page: text}."""
+    text_map = {}
+    parts = PAGE_HEADING.split(content)
+    for i in range(1, len(parts), 2):
+        page_text = parts[i + 1].strip()
+        if page_text.endswith(PAGE_SEPARATOR):
+            page_text = page_text[:-len(PAGE_SEPARATOR)].rstrip()
+        text_map[int(parts[i])] = page_text
+    return text_map
+
+def open_page_text(md_path):
+    """
+    Returns an object with `.get(page, default)` for the dump at `md_path`: the mmap-backed index
+    when a valid sidecar exists, otherwise a dict built by splitting the whole file. None if there is no dump.
+    """
+    md_path = Path(md_path)
+    if not md_path.exists():
+        return None
+    if index_path_for(md_path).exists():
+        try:
+            return PageTextIndex(md_path)
+        except (ValueError, OSError, json.JSONDecodeError) as e:
+            print(f"Warning: Ignoring page index for {md_path.name}: {e}")
+    return split_page_text(md_path.read_text())
@@ -0,0 +1,82 @@
+import time
+import threading
+
+class TokenBucket:
+    """
+    Classic token bucket: holds up to `capacity` tokens and refills at `capacity / period` tokens per second.
+    `acquire(n)` blocks until `n` tokens are available. A capacity of 0 or None disables the bucket.
+    """
+
+    def __init__(self, capacity, period=60.0):
+        self.capacity = capacity or 0
+        self.rate = self.capacity / period if self.capacity else 0
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.cond = threading.Condition()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount=1):
+        if not self.capacity:
+            return 0.0
+        # A single request larger than the bucket would never fit; let it drain the bucket instead.
+        amount = min(amount, self.capacity)
+        started = time.monotonic()
+        with self.cond:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return time.monotonic() - started
+                self.cond.wait((amount - self.tokens) / self.rate)
+
+    def adjust(self, delta):
+        """Returns (delta > 0) or charges (delta < 0) tokens after the real cost of a request is known."""
+        if not self.capacity:
+            return
+        with self.cond:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens + delta)
+            self.cond.notify_all()
+
+class RateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute limiter shared by every synthesis thread in the process.
+    Callers reserve an estimated token count up front and `reconcile` it with the usage the API reports.
+    """
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+
+    def acquire(self, estimated_tokens):
+        """Blocks until both a request slot and `estimated_tokens` are available. Returns seconds waited."""
+        return self.requests.acquire(1) + self.tokens.acquire(estimated_tokens)
+
+    def reconcile(self, estimated_tokens, actual_tokens):
+        if actual_tokens is None:
+            return
+        self.tokens.adjust(estimated_tokens - actual_tokens)
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+def configure_rate_limiter(requests_per_minute=None, tokens_per_minute=None):
+    """Replaces the process-wide limiter. Pass the share of the quota this process may use."""
+    global _limiter
+    with _limiter_lock:
+        _limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+        return _limiter
+
+def get_rate_limiter(requests_per_minute=None, tokens_per_minute=None):
+    """Returns the process-wide limiter, creating it with the given quota on first use."""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+        return _limiter
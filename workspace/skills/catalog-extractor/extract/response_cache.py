@@ -0,0 +1,125 @@
+import os
+import json
+import hashlib
+import threading
+from pathlib import Path
+
+# Persistent, content-addressed cache of model responses.
+# Entries live at `<cache_dir>/<key[:2]>/<key>.json`; the key is a SHA-256 over everything that
+# determines the response (model, generation config, prompt text, image bytes), so unchanged pages
+# are served from disk and any change to the inputs is simply a miss.
+DEFAULT_CACHE_DIR = Path(os.environ.get("SYNTHESIS_CACHE_DIR", Path.home() / ".cache" / "catalog-extractor" / "synthesis"))
+DEFAULT_MAX_MB = int(os.environ.get("SYNTHESIS_CACHE_MAX_MB", 1024))
+
+# use: read and write | refresh: ignore existing entries but store new ones | off: bypass entirely
+CACHE_MODES = ["use", "refresh", "off"]
+
+def cache_key(model_name, config, prompt, image_bytes):
+    h = hashlib.sha256()
+    for part in (model_name, json.dumps(config, sort_keys=True, default=str), prompt):
+        data = part.encode("utf-8")
+        h.update(len(data).to_bytes(8, "big"))
+        h.update(data)
+    h.update(len(image_bytes).to_bytes(8, "big"))
+    h.update(image_bytes)
+    return h.hexdigest()
+
+class ResponseCache:
+    """
+    On-disk response cache with size-based eviction (least recently used first, by mtime).
+    Safe to share between threads; several processes may share a directory since writes are atomic renames.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_mb=DEFAULT_MAX_MB):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_mb * 1024 * 1024
+        self.lock = threading.Lock()
+        self.total_bytes = None
+        self.evictions = 0
+
+    def _path(self, key):
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def _entries(self):
+        return [p for p in self.cache_dir.glob("*/*.json") if p.is_file()]
+
+    def _ensure_size(self):
+        if self.total_bytes is None:
+            self.total_bytes = sum(p.stat().st_size for p in self._entries())
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "r") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        # Touch on hit so eviction keeps recently used entries
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry
+
+    def put(self, key, entry):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with self.lock:
+            # Size the existing cache before adding to it, so the new entry isn't counted twice
+            self._ensure_size()
+        data = json.dumps(entry).encode("utf-8")
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        previous = path.stat().st_size if path.exists() else 0
+        os.replace(tmp_path, path)
+
+        with self.lock:
+            self.total_bytes += len(data) - previous
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Deletes the oldest entries until the cache is back under 90% of its budget. Caller holds the lock."""
+        entries = []
+        for p in self._entries():
+            try:
+                st = p.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, p))
+        entries.sort()
+        self.total_bytes = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        for _, size, p in entries:
+            if self.total_bytes <= target:
+                break
+            p.unlink(missing_ok=True)
+            self.total_bytes -= size
+            self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            removed = 0
+            for p in self._entries():
+                p.unlink(missing_ok=True)
+                removed += 1
+            self.total_bytes = 0
+            return removed
+
+    def usage(self):
+        with self.lock:
+            self._ensure_size()
+            return {"entries": len(self._entries()), "bytes": self.total_bytes, "max_bytes": self.max_bytes}
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+def open_response_cache(cache_dir=None, max_mb=None):
+    """Returns the process-wide cache object for a directory (so size accounting is shared)."""
+    cache_dir = Path(cache_dir or DEFAULT_CACHE_DIR).expanduser().resolve()
+    with _caches_lock:
+        cache = _caches.get(cache_dir)
+        if cache is None:
+            cache = _caches[cache_dir] = ResponseCache(cache_dir, max_mb or DEFAULT_MAX_MB)
+        return cache
@@ -1,33 +1,145 @@
+import re
 import json
 import os
 import argparse
 from pathlib import Path
 
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
 # NOTE: This script is specialized for technical product catalogs (specifically Alpha Wire style).
 # It expects an input JSON structure (from Docling metadata.json) and extracts tables.
 # CRITICAL: It currently filters for tables with headers like "Part", "SKU", "Conductor".
 # Tables not matching these heuristics are dropped. If adapting for other docs, review `is_technical`.
 
+# Only these parts of a Docling document are needed to walk the body tree and read tables.
+# Everything else (page images, picture data, `table_cells`, provenance of non-table items) is
+# skipped while parsing, so memory stays proportional to the text and table grids only.
+ITEM_KINDS = ["texts", "tables", "pictures", "groups"]
+KEEP_FIELDS = {
+    "texts": {"self_ref", "label", "text", "children"},
+    "tables": {"self_ref", "label", "data", "prov", "children"},
+    "pictures": {"self_ref", "label", "children"},
+    "groups": {"self_ref", "label", "children"},
+}
+REF_PATTERN = re.compile(r"^#/?(texts|tables|pictures|groups)/(\d+)$")
+
+# A streaming export (`export_assets(window_pages=...)`) saves the document as one JSON part per page
+# window, listed in this manifest instead of a single `metadata.json`.
+METADATA_PARTS_FILE = "metadata.parts.json"
+
+def metadata_input(chunk_dir):
+    """The Docling document of an exported chunk: its parts manifest if it was streamed, else metadata.json."""
+    parts = Path(chunk_dir) / METADATA_PARTS_FILE
+    return parts if parts.exists() else Path(chunk_dir) / "metadata.json"
+
+def compact_item(kind, item):
+    """Reduces a Docling item to the fields the SKU walk reads."""
+    keep = KEEP_FIELDS[kind]
+    out = {k: v for k, v in item.items() if k in keep}
+    if "children" in out:
+        out["children"] = [c.get("$ref") for c in out["children"] if isinstance(c, dict)]
+    if kind == "tables":
+        data = out.get("data") or {}
+        out["data"] = {"grid": [
+            [{"text": cell.get("text", ""), "column_header": cell.get("column_header")} for cell in row]
+            for row in data.get("grid", [])
+        ]}
+        if "prov" in out:
+            out["prov"] = [{"page_no": p.get("page_no"), "bbox": p.get("bbox")} for p in out["prov"][:1]]
+    return out
+
+def _stream_items(f):
+    """Yields (kind, item) for every element of the item arrays, plus ("body", body), using ijson."""
+    builder = None
+    target = None
+    skip_prefix = None
+    for prefix, event, value in ijson.parse(f, use_float=True):
+        if builder is None:
+            if event == "start_map" and (prefix == "body" or prefix.endswith(".item") and prefix[:-5] in KEEP_FIELDS):
+                target = prefix
+                builder = ijson.ObjectBuilder()
+                builder.event(event, value)
+            continue
+
+        if skip_prefix is not None:
+            if prefix == skip_prefix or prefix.startswith(skip_prefix + "."):
+                continue
+            skip_prefix = None
+
+        # Drop unneeded top-level fields of the item before they are built
+        if prefix == target and event == "map_key":
+            kind = "body" if target == "body" else target[:-5]
+            keep = {"children"} if kind == "body" else KEEP_FIELDS[kind]
+            if value not in keep:
+                skip_prefix = f"{target}.{value}"
+                continue
+        elif event == "map_key" and prefix == f"{target}.data" and value == "table_cells":
+            skip_prefix = f"{target}.data.table_cells"
+            continue
+
+        builder.event(event, value)
+        if prefix == target and event == "end_map":
+            yield ("body" if target == "body" else target[:-5]), builder.value
+            builder = None
+
+def load_document(json_input_path):
+    """
+    Returns (arrays, overrides, body_children): compact item lists per kind, a ref table for the rare
+    `self_ref`s that don't match an item's position, and the body's child refs.
+    Streams with ijson when it is installed; otherwise falls back to a single `json.load`.
+    """
+    arrays = {kind: [] for kind in ITEM_KINDS}
+    body_children = []
+    with open(json_input_path, "rb") as f:
+        if ijson is not None:
+            for kind, item in _stream_items(f):
+                if kind == "body":
+                    body_children = [c.get("$ref") for c in item.get("children", []) if isinstance(c, dict)]
+                else:
+                    arrays[kind].append(compact_item(kind, item))
+        else:
+            data = json.load(f)
+            for kind in ITEM_KINDS:
+                arrays[kind] = [compact_item(kind, item) for item in data.get(kind, [])]
+            body_children = [c.get("$ref") for c in data.get("body", {}).get("children", []) if isinstance(c, dict)]
+            del data
+
+    overrides = {}
+    for kind in ITEM_KINDS:
+        for idx, item in enumerate(arrays[kind]):
+            ref = item.pop("self_ref", None)
+            if ref and resolve_ref(ref) != (kind, idx):
+                overrides[ref] = (kind, idx)
+    return arrays, overrides, body_children
+
+def iter_documents(json_input_path):
+    """Yields `load_document` for the input, or for each part of a parts manifest in page order (one part in memory at a time)."""
+    path = Path(json_input_path)
+    if path.name != METADATA_PARTS_FILE:
+        yield load_document(path)
+        return
+    with open(path, "r") as f:
+        manifest = json.load(f)
+    for part in manifest["parts"]:
+        yield load_document(path.parent / part["path"])
+
+def resolve_ref(ref, overrides=None):
+    """Maps a `#/texts/3`-style ref (or an overridden self_ref) to (kind, idx)."""
+    if overrides and ref in overrides:
+        return overrides[ref]
+    m = REF_PATTERN.match(ref)
+    if not m:
+        return None
+    return m.group(1), int(m.group(2))
+
 def process_skus(json_input_path, jsonl_output_path, page_offset=0):
     if not os.path.exists(json_input_path):
         print(f"Error: {json_input_path} not found.")
         return
 
-    with open(json_input_path, 'r') as f:
-        data = json.load(f)
-
-    # Build a lookup for all items in the document structure
-    items = {}
-    for key in ['texts', 'tables', 'pictures', 'groups']:
-        if key in data:
-            for idx, item in enumerate(data[key]):
-                # Store by BOTH index-based ref AND the self_ref provided in the JSON
-                items[f"#{key}/{idx}"] = item
-                items[f"#/{key}/{idx}"] = item
-                if 'self_ref' in item:
-                    items[item['self_ref']] = item
-    
-    processed_refs = set()
     output_chunks = []
 
     def clean_chunk(chunk):
@@ -56,6 +168,10 @@ def process_skus(json_input_path, jsonl_output_path, page_offset=0):
                 if last_val.replace('.','').isdigit() and '.' not in last_val and len(last_val) >= 4:
                     is_shifted = True
 
+        # Fast-path evidence only (the cleaning above and below is unchanged): whether the row was rotated, and
+        # whether that rotation rests only on an empty SKU or last cell, which the substring test always matches
+        chunk["shifted"] = is_shifted
+        chunk["shift_ambiguous"] = is_shifted and not (sku_val and last_val)
         if is_shifted:
             # ROTATE RIGHT
             # New Order: Last Value becomes First. First becomes Second.
@@ -80,98 +196,95 @@ def process_skus(json_input_path, jsonl_output_path, page_offset=0):
                                 f". Page {chunk['page_no']}."
         return chunk
 
-    def process_item(ref, section, gauge):
-        if ref in processed_refs:
-            return section, gauge
-        processed_refs.add(ref)
+    # Depth-first, pre-order walk of the body tree with an explicit stack (deep documents no longer
+    # hit the recursion limit). Section/gauge context carries over in visit order, exactly as before,
+    # and from one part to the next for a streamed export.
+    section, gauge = "General Catalog", "N/A"
+    for arrays, overrides, body_children in iter_documents(json_input_path):
+        processed_refs = set()
+        stack = [ref for ref in reversed(body_children) if ref]
+        while stack:
+            key = resolve_ref(stack.pop(), overrides)
+            if key is None or key in processed_refs:
+                continue
+            processed_refs.add(key)
 
-        item = items.get(ref)
-        if not item:
-            return section, gauge
+            kind, idx = key
+            if idx >= len(arrays[kind]):
+                continue
+            item = arrays[kind][idx]
+            label = item.get('label', '')
 
-        label = item.get('label', '')
+            # Update context
+            if label in ['section_header', 'header', 'title']:
+                text = item.get('text', '').strip()
+                if text:
+                    if 'AWG' in text:
+                        gauge = text
+                    else:
+                        section = text
+                continue
 
-        # Update context
-        if label in ['section_header', 'header', 'title']:
-            text = item.get('text', '').strip()
-            if text:
-                if 'AWG' in text:
-                    gauge = text
-                else:
-                    section = text
-            return section, gauge
-
-        # Handle Tables
-        if label == 'table':
-            table_data = item.get('data', {})
-            grid = table_data.get('grid', [])
-            if grid:
-                header_texts = []
-                data_start_row = 0
-                for r_idx, row in enumerate(grid):
-                    if any(cell.get('column_header') for cell in row):
-                        row_texts = [cell.get('text', '').strip() for cell in row]
-                        if not header_texts:
-                            header_texts = row_texts
-                        else:
-                            for c_idx, cell_text in enumerate(row_texts):
-                                if c_idx < len(header_texts) and cell_text and cell_text not in header_texts[c_idx]:
-                                    header_texts[c_idx] += f" {cell_text}"
-                        data_start_row = r_idx + 1
-                    else: break
-                
-                is_technical = any(any(k in h for h in header_texts) for k in ["Part", "SKU", "Conductor"])
-                if is_technical:
-                    for row_idx in range(data_start_row, len(grid)):
-                        row = grid[row_idx]
-                        row_values = [cell.get('text', '').strip() for cell in row]
-                        specs = {header_texts[i]: row_values[i] for i in range(min(len(header_texts), len(row_values))) if header_texts[i] and row_values[i]}
-                        
-                        sku = None
-                        potential_skus = [v for v in row_values if len(v) >= 4]
-                        if potential_skus:
-                            for s in potential_skus:
-                                if s.startswith('5') or '/' in s or s[0].isalpha():
-                                    sku = s
-                                    break
-                            # REMOVED: Fallback to last column ("Unknown") - prefer None/empty to let AI fix downstream.
-
-                        chunk = {
-                            "type": "product_spec", "sku": sku, "series": section, "gauge": gauge,
-                            "catalog_family_context": section,
-                            "series_context": gauge,
-                            "page_no": item.get('prov', [{}])[0].get('page_no') + page_offset,
-                            "bbox": item.get('prov', [{}])[0].get('bbox'),
-                            "technical_data": specs,
-                            "content": f"Product: {section}. Category: {gauge}. Part Number: {sku}. Details: " + 
-                                       ", ".join([f"{k}: {v}" for k, v in specs.items() if k.lower() != 'part no']) + 
-                                       f". Page {item.get('prov', [{}])[0].get('page_no') + page_offset}."
-                        }
-                        
-                        # Apply Cleaning Immediately
-                        chunk = clean_chunk(chunk)
-                        output_chunks.append(chunk)
-                # Note: Non-technical tables (selection guides) are implicitly dropped by not having an 'else' block here to append them.
-                # If we wanted them, we'd add them here, but we explicitly want to filter them out.
-
-        # Recurse into children
-        if 'children' in item:
-            for child_ref_obj in item['children']:
-                c_ref = child_ref_obj.get('$ref')
-                if c_ref:
-                    section, gauge = process_item(c_ref, section, gauge)
-        
-        return section, gauge
+            # Handle Tables
+            if label == 'table':
+                table_data = item.get('data', {})
+                grid = table_data.get('grid', [])
+                if grid:
+                    header_texts = []
+                    data_start_row = 0
+                    for r_idx, row in enumerate(grid):
+                        if any(cell.get('column_header') for cell in row):
+                            row_texts = [cell.get('text', '').strip() for cell in row]
+                            if not header_texts:
+                                header_texts = row_texts
+                            else:
+                                for c_idx, cell_text in enumerate(row_texts):
+                                    if c_idx < len(header_texts) and cell_text and cell_text not in header_texts[c_idx]:
+                                        header_texts[c_idx] += f" {cell_text}"
+                            data_start_row = r_idx + 1
+                        else: break
+            
+                    is_technical = any(any(k in h for h in header_texts) for k in ["Part", "SKU", "Conductor"])
+                    if is_technical:
+                        for row_idx in range(data_start_row, len(grid)):
+                            row = grid[row_idx]
+                            row_values = [cell.get('text', '').strip() for cell in row]
+                            specs = {header_texts[i]: row_values[i] for i in range(min(len(header_texts), len(row_values))) if header_texts[i] and row_values[i]}
+                    
+                            sku = None
+                            potential_skus = [v for v in row_values if len(v) >= 4]
+                            if potential_skus:
+                                for s in potential_skus:
+                                    if s.startswith('5') or '/' in s or s[0].isalpha():
+                                        sku = s
+                                        break
+                                # REMOVED: Fallback to last column ("Unknown") - prefer None/empty to let AI fix downstream.
 
-    # Start recursion from body
-    body = data.get('body', {})
-    body_children = body.get('children', [])
-    
-    curr_sec, curr_gauge = "General Catalog", "N/A"
-    for ref_obj in body_children:
-        ref = ref_obj.get('$ref')
-        if ref:
-            curr_sec, curr_gauge = process_item(ref, curr_sec, curr_gauge)
+                            chunk = {
+                                "type": "product_spec", "sku": sku, "series": section, "gauge": gauge,
+                                "catalog_family_context": section,
+                                "series_context": gauge,
+                                "page_no": item.get('prov', [{}])[0].get('page_no') + page_offset,
+                                "bbox": item.get('prov', [{}])[0].get('bbox'),
+                                "technical_data": specs,
+                                # Table structure, for the confidence checks of the synthesis fast path (extract/fastpath.py)
+                                "table_ref": f"#/{kind}/{idx}",
+                                "headers": header_texts,
+                                "row_columns": len(row_values),
+                                "shifted": False,
+                                "shift_ambiguous": False,
+                                "content": f"Product: {section}. Category: {gauge}. Part Number: {sku}. Details: " + 
+                                           ", ".join([f"{k}: {v}" for k, v in specs.items() if k.lower() != 'part no']) + 
+                                           f". Page {item.get('prov', [{}])[0].get('page_no') + page_offset}."
+                            }
+                    
+                            # Apply Cleaning Immediately
+                            chunk = clean_chunk(chunk)
+                            output_chunks.append(chunk)
+                    # Note: Non-technical tables (selection guides) are implicitly dropped by not having an 'else' block here to append them.
+                    # If we wanted them, we'd add them here, but we explicitly want to filter them out.
+
+            stack.extend(ref for ref in reversed(item.get('children', [])) if ref)
 
     # Sort output chunks by page_no (ascending) then bbox top (ascending)
     def sort_key(chunk):
@@ -199,6 +312,7 @@ def process_skus(json_input_path, jsonl_output_path, page_offset=0):
 
     print(f"SUCCESS: Generated {len(output_chunks)} cleaned product chunks.")
     print(f"File saved to: {output_path}")
+    return len(output_chunks)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Transform Docling JSON into AI-ready Product Card chunks.")
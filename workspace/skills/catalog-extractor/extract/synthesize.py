@@ -2,37 +2,62 @@ import os
 import sys
 import json
 import re
-import PIL.Image
+import math
+import time
+import threading
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from google import genai
-from google.genai import types
 from tenacity import retry, stop_after_attempt, wait_exponential, before_sleep
 
+try:
+    from extract.rate_limit import get_rate_limiter
+    from extract.response_cache import open_response_cache, cache_key, CACHE_MODES
+    from extract.page_text import open_page_text
+    from extract.page_ledger import PageLedger
+    from extract.images import ImageEncoder, encode_image, make_image_profile, read_source_scale, IMAGE_FORMATS, GRAYSCALE_MODES
+    from extract.llm import get_backend, LLMConfigError, BACKENDS
+    from extract.artifact_writer import ARTIFACT_FORMATS
+    from extract.fastpath import fastpath_page, picture_blocks
+except ImportError:
+    sys.path.append(str(Path(__file__).parent))
+    from rate_limit import get_rate_limiter
+    from response_cache import open_response_cache, cache_key, CACHE_MODES
+    from page_text import open_page_text
+    from page_ledger import PageLedger
+    from images import ImageEncoder, encode_image, make_image_profile, read_source_scale, IMAGE_FORMATS, GRAYSCALE_MODES
+    from llm import get_backend, LLMConfigError, BACKENDS
+    from artifact_writer import ARTIFACT_FORMATS
+    from fastpath import fastpath_page, picture_blocks
+
 # Load Environment Variables from .env file (if present)
 load_dotenv()
 
-# API Setup & Model Configuration
+# Model Configuration (the model itself is chosen by the backend, see extract/llm.py)
 MODEL_CONFIG = {
-    "model_name": "gemini-2.0-flash",
-    "generation_config": types.GenerateContentConfig(
-        response_mime_type="application/json",
-        max_output_tokens=8192,
-        temperature=0.1
-    )
+    "generation_config": {
+        "response_mime_type": "application/json",
+        "max_output_tokens": 8192,
+        "temperature": 0.1,
+    },
+    # Pages in flight at once per chunk, and the quota shared by all of them (per process).
+    # Defaults follow the paid tier for gemini-2.0-flash; override via env for other tiers.
+    "concurrency": int(os.environ.get("SYNTHESIS_CONCURRENCY", 4)),
+    "requests_per_minute": int(os.environ.get("GEMINI_RPM", 2000)),
+    "tokens_per_minute": int(os.environ.get("GEMINI_TPM", 4_000_000)),
 }
-API_KEY = os.environ.get("GOOGLE_API_KEY")
-if not API_KEY:
-    print("Error: GOOGLE_API_KEY environment variable not set.")
-    sys.exit(1)
+# Page image files synthesis picks up, in any format the export can write
+PAGE_IMAGE_SUFFIXES = set(ARTIFACT_FORMATS.values())
 
-client = genai.Client(api_key=API_KEY)
+# Retries of the request running on the current thread (reported per page in metrics.jsonl)
+_retries = threading.local()
 
 def log_retry_attempt(retry_state):
     """
     Logs warnings for rate limits or server errors before retrying.
     Extracts the API error message to show exactly what limit was hit.
     """
+    _retries.count = getattr(_retries, "count", 0) + 1
     exception = retry_state.outcome.exception()
     wait_time = retry_state.next_action.sleep
     
@@ -43,124 +68,53 @@ def log_retry_attempt(retry_state):
     else:
         print(f"\n  [WARNING] API Error: {error_str}. Retrying in {wait_time:.1f}s...")
 
+class EmptyResponseError(Exception):
+    """Raised when the model returns no text (e.g. a blocked or empty candidate), so the request is retried."""
+
 @retry(
     stop=stop_after_attempt(5),      # Try up to 5 times
     wait=wait_exponential(multiplier=2, min=4, max=60), # Wait 4s, 8s, 16s... (Exponential Backoff)
     before_sleep=log_retry_attempt,  # Log before waiting
-    reraise=True                     # If it fails 5 times, raise the error to crash the script
+    reraise=True                     # After the last attempt the error propagates; only this request's pages fail
 )
-def generate_with_retry(client, model_name, contents, config):
-    return client.models.generate_content(
-        model=model_name,
-        contents=contents,
-        config=config
-    )
+def generate_with_retry(backend, prompt, images, config, limiter=None, estimated_tokens=0):
+    """
+    One attempt at a request. Every attempt, retries included, first reserves a request slot and its
+    estimated tokens on the shared `limiter`, so a burst of 429s backs off through the quota too.
+    """
+    if limiter is not None:
+        _retries.waited = getattr(_retries, "waited", 0.0) + limiter.acquire(estimated_tokens)
+    response = backend.generate(prompt, images, config)
+    if response.text is None or not response.text.strip():
+        raise EmptyResponseError(f"Empty response (finish reason: {response.finish_reason})")
+    return response
 
-def synthesize_catalog(export_dir):
-    export_path = Path(export_dir).resolve()
-    # In new architecture, everything is flat in the chunk dir (or in images/ subdir)
-    raw_dir = export_path  
-    images_dir = raw_dir / "images"
-    final_dir = export_path # We can output final files here too, or keep separate?
-    # Let's keep outputs in root of chunk dir
+class SynthesisError(Exception):
+    """Raised when a page response cannot be turned into catalog output."""
 
+class CachedResponse:
+    """Stands in for a backend response when the request is served from the response cache."""
 
-    # 1. Load Text Context (pypdf)
-    text_map = {}
-    text_md_path = raw_dir / "extract.md"
-    if text_md_path.exists():
-        content = text_md_path.read_text()
-        # Split by "## Page N"
-        parts = re.split(r"## Page (\d+)", content)
-        for i in range(1, len(parts), 2):
-            page_num = int(parts[i])
-            page_text = parts[i+1].strip()
-            text_map[page_num] = page_text
-    else:
-        print("Warning: No extract.md found.")
+    def __init__(self, text):
+        self.text = text
 
-    # 1b. Load Image Provenance Map
-    prov_map = []
-    prov_path = raw_dir / "image_provenance_map.json"
-    if prov_path.exists():
-        try:
-            with open(prov_path, 'r') as f:
-                prov_map = json.load(f)
-        except Exception as e:
-            print(f"Warning: Could not load provenance map: {e}")
-    else:
-        print("Warning: No image_provenance_map.json found.")
+# Gemini bills images in 768x768 tiles of 258 tokens; used only to size rate-limiter reservations.
+IMAGE_TILE_PX = 768
+IMAGE_TILE_TOKENS = 258
 
-    # 1c. Load Intermediate SKU Data (Docling Extraction)
-    sku_map = {}
-    sku_path = raw_dir / "sku_intermediate.jsonl"
-    if sku_path.exists():
-        try:
-            with open(sku_path, 'r') as f:
-                for line in f:
-                    try:
-                        chunk = json.loads(line)
-                        p = chunk.get('page_no', 0)
-                        if p not in sku_map: sku_map[p] = []
-                        sku_map[p].append(chunk)
-                    except: pass
-        except Exception as e:
-            print(f"Warning: Could not load SKU intermediate data: {e}")
+def estimate_request_tokens(prompt, images):
+    tiles = sum(math.ceil(img["width"] / IMAGE_TILE_PX) * math.ceil(img["height"] / IMAGE_TILE_PX) for img in images)
+    return int(estimate_text_tokens(len(prompt))) + tiles * IMAGE_TILE_TOKENS
 
-    # 2. Iterate Images (Pages)
-    image_files = sorted(
-        list(images_dir.glob("page*.png")),
-        key=lambda x: int(x.stem.replace("page", ""))
-    )
-    
-    sku_output_path = final_dir / "sku.jsonl"
-    catalog_output_path = final_dir / "catalog.md"
-    
-    # Clear outputs
-    with open(sku_output_path, "w") as f: pass
-    with open(catalog_output_path, "w") as f: 
-        f.write("# Product Catalog (Synthesized)\n\n")
-    
-    print(f"Synthesizing {len(image_files)} pages using {MODEL_CONFIG['model_name']}...")
+def estimate_text_tokens(chars):
+    return chars / 4
 
-    # Token Tracking
-    token_stats = {
-        "model": MODEL_CONFIG['model_name'],
-        "total_input": 0,
-        "total_output": 0,
-        "pages_processed": 0
-    }
+def estimate_output_tokens(page_input):
+    """Rough size of one page's response: its text rewritten as Markdown plus one JSON object per SKU row."""
+    return 200 + len(page_input["raw_text"]) // 3 + 80 * page_input["sku_rows"]
 
-    for img_path in image_files:
-        # Extract page number from filename "page9.png"
-        try:
-            page_num = int(img_path.stem.replace("page", ""))
-        except ValueError:
-            continue
-            
-        print(f"Processing Page {page_num}...")
-        
-        # Get Context
-        raw_text = text_map.get(page_num, "")
-        
-        # Filter Provenance for Current Page
-        page_prov = [item for item in prov_map if item.get('page_number') == page_num]
-        prov_json_str = json.dumps(page_prov, indent=2)
-
-        # Filter SKU Context for Current Page
-        page_skus = sku_map.get(page_num, [])
-        # Format for AI as concise text
-        sku_context_str = json.dumps([
-            {
-                "sku": s.get("sku"),
-                "desc": s.get("content"),
-                "bbox": s.get("bbox")
-            } for s in page_skus
-        ], indent=2)
-
-        # Prompt
-        # NEW: Visual Gap Analysis & Content Restoration
-        prompt = f"""
+def build_prompt(page_num, img_name, raw_text, prov_json_str, sku_context_str):
+    prompt = f"""
         You are a highly accurate Catalog Digitization Agent.
         Your goal is to convert this product catalog page (Image + Raw Text + Structured Data) into two outputs:
         1. A clean Markdown document section.
@@ -184,7 +138,7 @@ def synthesize_catalog(export_dir):
         - Reconstruct the page content in Markdown.
         - Use correct headers (#, ##, ###) based on the visual hierarchy.
         - Fix any broken text from the raw stream (e.g. join "Indus-" "trial").
-        - Insert the image `![Page {page_num}](raw/images/{img_path.name})` at the top.
+        - Insert the image `![Page {page_num}](raw/images/{img_name})` at the top.
         - **Visual Gap Analysis & Content Restoration:**
             1.  **Analyze the Page Image:** Identify all visually significant elements such as **large diagrams**, **technical tables**, **section headers**, and **icons**. Use the provided bounding box (`bbox`) coordinates in the `image_provenance_map.json` to determine importance (e.g., larger area = higher significance).
             2.  **Cross-Reference with Extracted Data:** Compare these visual elements against the provided JSONL text/table data for the corresponding page.
@@ -212,85 +166,729 @@ def synthesize_catalog(export_dir):
             "skus": [ {{...sku_object...}}, ... ]
         }}
         """
+    return prompt
 
-        # Call API
-        # Load Image (Inline)
-        img = PIL.Image.open(img_path)
+def build_batch_prompt(page_inputs):
+    """
+    Prompt for several pages in one request: the instructions appear once, followed by
+    a context block per page. Images are attached in the same order as the page blocks.
+    """
+    page_blocks = []
+    for idx, p in enumerate(page_inputs, 1):
+        page_blocks.append(f"""
+        === PAGE {p['page']} (Image #{idx}, file `{p['img_name']}`) ===
+        - Text: "{p['raw_text']}" (OCR/Extraction - may have noise).
+        - Image Provenance (Available Crops/Diagrams):
+        ```json
+        {p['prov_json_str']}
+        ```
+        - Structured Data (Pre-extracted Context):
+        ```json
+        {p['sku_context_str']}
+        ```
+""")
+    page_list = ", ".join(str(p["page"]) for p in page_inputs)
 
-        # Optimization: Resize to 50% to reduce token usage
-        # Original was likely ~1200x1600 (factor 2.0). 
-        # Scaling by 0.5 brings it back to ~600x800 (factor 1.0 equivalent)
-        new_size = (int(img.width * 0.5), int(img.height * 0.5))
-        img = img.resize(new_size, PIL.Image.Resampling.LANCZOS)
+    prompt = f"""
+        You are a highly accurate Catalog Digitization Agent.
+        You receive {len(page_inputs)} consecutive product catalog pages (pages {page_list}), each as Image + Raw Text + Structured Data.
+        For EACH page, produce two outputs:
+        1. A clean Markdown document section.
+        2. A structured JSON dataset of Product SKUs.
+        Treat every page independently: only use a page's own image and context for that page's outputs.
+
+        INSTRUCTIONS (apply to every page):
         
-        response = generate_with_retry(
-            client=client,
-            model_name=MODEL_CONFIG['model_name'],
-            contents=[prompt, img],
-            config=MODEL_CONFIG['generation_config']
-        )
+        TASK 1: CATALOG MARKDOWN
+        - Reconstruct the page content in Markdown.
+        - Use correct headers (#, ##, ###) based on the visual hierarchy.
+        - Fix any broken text from the raw stream (e.g. join "Indus-" "trial").
+        - Insert the page image `![Page N](raw/images/<file>)` at the top, using the page number and file given in its block.
+        - **Visual Gap Analysis & Content Restoration:**
+            1.  **Analyze the Page Image:** Identify all visually significant elements such as **large diagrams**, **technical tables**, **section headers**, and **icons**. Use the provided bounding box (`bbox`) coordinates in the page's image provenance to determine importance (e.g., larger area = higher significance).
+            2.  **Cross-Reference with Extracted Data:** Compare these visual elements against the provided text/table data for the same page.
+            3.  **Detect Missing Information:** If a significant visual element (e.g., a wiring diagram or a specific technical table) is present in the image but **missing** or poorly represented in the text extraction:
+                *   **Explicitly include it** in the Markdown output.
+                *   Use the page's image provenance to find the correct image filename for that element.
+                *   Insert the image with a descriptive caption derived from its context (e.g., "Figure: Shielding Configuration").
+            4.  **Preserve Structure:** Ensure all section headers and anchors visible in the image are reflected in the Markdown structure to maintain the document's logical flow.
+        - Format tables as clean Markdown tables.
+
+        TASK 2: SKU EXTRACTION
+        - Identify any Product Specification Tables.
+        - Extract EVERY row into a JSON object.
+        - Fields:
+          - `sku`: The Part Number (e.g., "5920", "5020/15C").
+          - `series`: The Product Series (e.g., "Xtra-Guard 1") found in the page header.
+          - `description`: Brief description or category (e.g., "High Performance PVC").
+          - `specs`: A dictionary of all technical columns (Conductors, Diameter, Gauge, etc.).
+          - `provenance`: {{ "page": <page number>, "file": "catalog.pdf" }}
+
+        PAGES:
+{"".join(page_blocks)}
+        OUTPUT FORMAT (JSON):
+        Return a single JSON object with one entry per page, in page order:
+        {{
+            "pages": [
+                {{ "page": <page number>, "markdown_content": "The markdown string...", "skus": [ {{...sku_object...}}, ... ] }},
+                ...
+            ]
+        }}
+        """
+    return prompt
+
+def parse_response_json(response, page_num):
+    if response.text is None:
+        # Only reachable for a response that bypassed `generate_with_retry`
+        raise SynthesisError(f"Empty response on Page {page_num}")
+    try:
+        # Clean possible markdown formatting
+        clean_text = response.text.strip()
+        if clean_text.startswith("```json"):
+            clean_text = clean_text[7:]
+        if clean_text.startswith("```"):
+            clean_text = clean_text[3:]
+        if clean_text.endswith("```"):
+            clean_text = clean_text[:-3]
+        clean_text = clean_text.strip()
         
-        # Track Tokens
-        if response.usage_metadata:
-            in_tok = response.usage_metadata.prompt_token_count
-            out_tok = response.usage_metadata.candidates_token_count
-            token_stats["total_input"] += in_tok
-            token_stats["total_output"] += out_tok
+        return json.loads(clean_text)
+    except json.JSONDecodeError as e:
+        print(f"  !! JSON Parse Error on Page {page_num}: {e}")
+        print(f"  !! Raw Response Snippet: {response.text[:500]}...")
+        raise SynthesisError(f"JSON Parse Error on Page {page_num}: {e}") from e
+
+# Prompt context is serialized without indentation or \u escapes: the model reads it just as well,
+# and pretty-printing was pure whitespace tokens on every request.
+PROMPT_JSON = {"separators": (",", ":"), "ensure_ascii": False}
+
+def index_by_page(items, key):
+    """Groups records by their page field once per chunk, so each page's lookup is a dict hit."""
+    by_page = {}
+    for item in items:
+        by_page.setdefault(item.get(key), []).append(item)
+    return by_page
+
+def prepare_page(page_num, img_path, text_map, prov_by_page, sku_map):
+    """Collects the per-page context for a request (the image is loaded later, by the worker sending it)."""
+    # Get Context
+    raw_text = text_map.get(page_num, "")
+    
+    # Provenance for Current Page
+    page_prov = prov_by_page.get(page_num, [])
+    prov_json_str = json.dumps(page_prov, **PROMPT_JSON)
+
+    # SKU Context for Current Page
+    page_skus = sku_map.get(page_num, [])
+    # Format for AI as concise text
+    sku_context = [
+        {
+            "sku": s.get("sku"),
+            "desc": s.get("content"),
+            "bbox": s.get("bbox")
+        } for s in page_skus
+    ]
+    sku_context_str = json.dumps(sku_context, **PROMPT_JSON)
+
+    # Characters saved against the previous indent=2 serialization (reported in token_usage.json)
+    context_chars_saved = (len(json.dumps(page_prov, indent=2)) + len(json.dumps(sku_context, indent=2))
+                           - len(prov_json_str) - len(sku_context_str))
+
+    return {
+        "page": page_num,
+        "img_path": img_path,
+        "img_name": img_path.name,
+        "raw_text": raw_text,
+        "prov_json_str": prov_json_str,
+        "sku_context_str": sku_context_str,
+        "sku_rows": len(page_skus),
+        "context_chars_saved": context_chars_saved,
+    }
+
+def load_page_image(page_input, images=None):
+    """Returns the encoded payload for a page: prefetched by the chunk's `ImageEncoder`, or encoded on the spot."""
+    if images is None:
+        return encode_image(page_input["img_path"], make_image_profile(), read_source_scale(page_input["img_path"].parent))
+    return images.get(page_input["img_path"])
+
+def call_model(prompt, images, label, limiter, cache=None, cache_mode="use", backend=None):
+    """
+    Sends one request (prompt + images) through the LLM `backend`, or serves it from the response cache.
+    Returns the response and a usage dict: input/output tokens, finish reason, cache hit and saved tokens,
+    plus the request's latency (including retries), retry count and rate-limit wait in seconds.
+    """
+    backend = backend or get_backend()
+    # Cache lookup: identical model, config, prompt and image payloads -> identical request
+    key = None
+    if cache is not None and cache_mode != "off":
+        key = cache_key(
+            backend.model_id,
+            MODEL_CONFIG['generation_config'],
+            prompt,
+            b"".join(f"{img['mime_type']}:{len(img['data'])}:".encode() + img["data"] for img in images)
+        )
+        entry = cache.get(key) if cache_mode == "use" else None
+        if entry is not None:
+            print(f"  -> {label}: cache hit")
+            return CachedResponse(entry["text"]), {
+                "input_tokens": None,
+                "output_tokens": None,
+                "finish_reason": "STOP",
+                "cached": True,
+                "saved_input_tokens": entry.get("input_tokens") or 0,
+                "saved_output_tokens": entry.get("output_tokens") or 0,
+                "cache_key": None,
+                "latency": 0.0,
+                "retries": 0,
+                "rate_limit_wait": 0.0,
+            }
+
+    # Reserve quota before sending (in every attempt) so bursts queue here instead of turning into 429 backoffs
+    estimated_tokens = estimate_request_tokens(prompt, images)
+    _retries.count = 0
+    _retries.waited = 0.0
+    sent = time.perf_counter()
+    response = generate_with_retry(backend, prompt, images, MODEL_CONFIG['generation_config'], limiter, estimated_tokens)
+    waited = _retries.waited
+    latency = time.perf_counter() - sent - waited
+    if waited > 1:
+        print(f"  -> {label}: waited {waited:.1f}s for rate limit")
+    
+    # Track Tokens
+    in_tok, out_tok = response.input_tokens, response.output_tokens
+    if in_tok is not None:
+        print(f"  -> {label} Tokens: {in_tok} In / {out_tok} Out")
+    limiter.reconcile(estimated_tokens, in_tok)
+
+    return response, {
+        "input_tokens": in_tok,
+        "output_tokens": out_tok,
+        "finish_reason": response.finish_reason,
+        "cached": False,
+        "cache_key": key,
+        "latency": latency,
+        "retries": _retries.count,
+        "rate_limit_wait": waited,
+    }
+
+# Usage of a request that never produced a response
+NO_USAGE = {"input_tokens": None, "output_tokens": None, "cached": False}
+
+def page_result(page_num, parsed, usage, batch=None, error=None):
+    """One page's outcome. A failed page has `error` set and no content; its usage is still reported."""
+    parsed = parsed or {}
+    return {
+        "page": page_num,
+        "error": error,
+        "markdown": parsed.get("markdown_content", ""),
+        "skus": parsed.get("skus", []),
+        "input_tokens": usage["input_tokens"],
+        "output_tokens": usage["output_tokens"],
+        "cached": usage["cached"],
+        "saved_input_tokens": usage.get("saved_input_tokens", 0),
+        "saved_output_tokens": usage.get("saved_output_tokens", 0),
+        "latency": usage.get("latency"),
+        "retries": usage.get("retries", 0),
+        "rate_limit_wait": usage.get("rate_limit_wait", 0.0),
+        "batch": batch or [page_num],
+    }
+
+def synthesize_page(page_input, limiter, cache=None, cache_mode="use", images=None, backend=None):
+    """
+    Builds the prompt for one page, calls the model (or reads the response cache)
+    and returns its parsed result and token usage. An unparseable response fails only this page.
+    """
+    page_num = page_input["page"]
+    print(f"Processing Page {page_num}...")
+
+    # Prompt
+    # NEW: Visual Gap Analysis & Content Restoration
+    prompt = build_prompt(page_num, page_input["img_name"], page_input["raw_text"],
+                          page_input["prov_json_str"], page_input["sku_context_str"])
+
+    # Call API
+    response, usage = call_model(prompt, [load_page_image(page_input, images)], f"Page {page_num}", limiter, cache, cache_mode, backend)
+    try:
+        parsed = parse_response_json(response, page_num)
+    except SynthesisError as e:
+        return [page_result(page_num, None, usage, error=str(e))]
+    # Only responses that parsed are worth caching
+    if usage["cache_key"]:
+        cache.put(usage["cache_key"], {"text": response.text, "input_tokens": usage["input_tokens"], "output_tokens": usage["output_tokens"]})
+    return [page_result(page_num, parsed, usage)]
+
+def synthesize_batch(page_inputs, limiter, cache=None, cache_mode="use", images=None, backend=None):
+    """
+    Sends several consecutive pages in one request under a shared instruction block.
+    Falls back to per-page requests for any page the batch response doesn't cover
+    (truncated output, unparseable JSON or missing page entries).
+    Batch token usage is split evenly across the pages it covered.
+    """
+    if len(page_inputs) == 1:
+        return synthesize_page(page_inputs[0], limiter, cache, cache_mode, images, backend)
+
+    page_nums = [p["page"] for p in page_inputs]
+    label = f"Pages {page_nums[0]}-{page_nums[-1]}"
+    print(f"Processing {label} (batch of {len(page_nums)})...")
+
+    prompt = build_batch_prompt(page_inputs)
+    response, usage = call_model(prompt, [load_page_image(p, images) for p in page_inputs], label, limiter, cache, cache_mode, backend)
+
+    by_page = {}
+    if usage["finish_reason"] == "MAX_TOKENS":
+        print(f"  !! {label}: response truncated at max_output_tokens, retrying pages individually")
+    else:
+        try:
+            parsed = parse_response_json(response, label)
+            for entry in parsed.get("pages", []):
+                try:
+                    by_page[int(entry.get("page"))] = entry
+                except (TypeError, ValueError):
+                    continue
+        except SynthesisError:
+            print(f"  !! {label}: unusable batch response, retrying pages individually")
+
+    covered = [n for n in page_nums if n in by_page]
+    if usage["cache_key"] and len(covered) == len(page_nums):
+        cache.put(usage["cache_key"], {"text": response.text, "input_tokens": usage["input_tokens"], "output_tokens": usage["output_tokens"]})
+
+    # Apportion the batch's tokens to the pages it actually produced
+    share = dict(usage)
+    for key in ("input_tokens", "output_tokens", "saved_input_tokens", "saved_output_tokens"):
+        if share.get(key) is not None and covered:
+            share[key] = share[key] / len(covered)
+
+    results = []
+    for page_input in page_inputs:
+        n = page_input["page"]
+        if n in by_page:
+            results.append(page_result(n, by_page[n], share, batch=page_nums))
+        else:
+            results.extend(synthesize_page(page_input, limiter, cache, cache_mode, images, backend))
+    if not covered and usage["input_tokens"] is not None:
+        # Nothing usable came back, but the request was still billed
+        results[0]["wasted_input_tokens"] = usage["input_tokens"]
+        results[0]["wasted_output_tokens"] = usage["output_tokens"] or 0
+    return results
+
+def plan_batches(page_inputs, batch_pages):
+    """
+    Groups consecutive pages into requests of at most `batch_pages` pages, closing a batch early
+    when its estimated output would exceed `max_output_tokens` (with 20% headroom).
+    """
+    budget = MODEL_CONFIG['generation_config']['max_output_tokens'] * 0.8
+    batches, current, current_tokens = [], [], 0
+    for page_input in page_inputs:
+        tokens = estimate_output_tokens(page_input)
+        if current and (len(current) >= batch_pages or current_tokens + tokens > budget):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(page_input)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+def page_fingerprint(page_input, image_profile, model_id):
+    """Hash of everything a page's synthesis depends on: model, config, prompt, image profile and source image."""
+    prompt = build_prompt(page_input["page"], page_input["img_name"], page_input["raw_text"],
+                          page_input["prov_json_str"], page_input["sku_context_str"])
+    return cache_key(
+        model_id,
+        MODEL_CONFIG['generation_config'],
+        prompt,
+        json.dumps(image_profile, sort_keys=True).encode("utf-8") + page_input["img_path"].read_bytes()
+    )
+
+def local_fragment(page_num, route, img_path, text_map, prov_by_page):
+    """
+    Fragment for a page triage routed away from the model (see planner/triage.py), built from what is on disk:
+    "text" writes the pypdf text, "image" the page image, its picture crops and their captions. No SKUs.
+    """
+    raw_text = text_map.get(page_num, "") or ""
+    parts = [f"![Page {page_num}](raw/images/{img_path.name})"]
+    if route == "image":
+        parts += picture_blocks(prov_by_page.get(page_num))
+    if raw_text.strip():
+        # pypdf keeps the line breaks of the layout; blank lines separate its paragraphs
+        parts.append("\n".join(line.strip() for line in raw_text.splitlines()).strip())
+    return {"markdown_content": "\n\n".join(parts), "skus": []}
+
+def synthesize_catalog(export_dir, concurrency=None, cache_mode="use", cache_dir=None, cache_max_mb=None, batch_pages=1,
+                       image_profile=None, force=False, metrics=None, backend=None, page_routes=None, fastpath=None):
+    """
+    Synthesizes `catalog.md` and `sku.jsonl` for a chunk directory.
+    Each page is stored as a fragment in `pages/` and tracked in `synthesis_ledger.json` (see extract/page_ledger.py);
+    only pages that are missing, failed or whose inputs changed are sent (all of them with `force`), and the
+    chunk outputs are assembled from the fragments at the end. A page that fails doesn't stop the others.
+    Up to `concurrency` requests are in flight at once, throttled by the process-wide rate limiter.
+    Responses are served from / stored in the on-disk response cache according to `cache_mode`.
+    With `batch_pages > 1`, consecutive pages share one request (see `synthesize_batch`).
+    Page images are encoded per `image_profile` (see extract/images.py) on a prefetch pool ahead of the requests.
+    With a `metrics` sink (extract/metrics.py), one `page` record is emitted per synthesized or failed page.
+    Requests go through the LLM `backend` (name or instance, default $LLM_BACKEND or gemini; see extract/llm.py).
+    `page_routes` ({page: route}, see planner/triage.py) sends only "llm" pages (and unlisted ones) to the model:
+    "text" and "image" pages get a `local_fragment`; "skip" pages are left out of the outputs when Docling
+    found no pictures or tables on them, and are handled as "image" otherwise.
+    With `fastpath` (a minimum confidence, see extract/fastpath.py), model pages whose parsed spec tables score at
+    least that are rendered from `sku_intermediate.jsonl` (with their picture crops) instead of being sent.
+    Returns {"pages", "synthesized", "reused", "failed": [page numbers], "requests", "input_tokens", "output_tokens",
+    "local", "fastpath", "skipped", "api_calls_avoided", "bytes_written"}.
+    """
+    started = time.time()
+    export_path = Path(export_dir).resolve()
+    # In new architecture, everything is flat in the chunk dir (or in images/ subdir)
+    raw_dir = export_path  
+    images_dir = raw_dir / "images"
+    final_dir = export_path # We can output final files here too, or keep separate?
+    # Let's keep outputs in root of chunk dir
+
+
+    # 1. Load Text Context (pypdf) - pages are read on demand through the extract.idx.json index
+    text_map = open_page_text(raw_dir / "extract.md")
+    if text_map is None:
+        text_map = {}
+        print("Warning: No extract.md found.")
+
+    # 1b. Load Image Provenance Map
+    prov_map = []
+    prov_path = raw_dir / "image_provenance_map.json"
+    if prov_path.exists():
+        try:
+            with open(prov_path, 'r') as f:
+                prov_map = json.load(f)
+        except Exception as e:
+            print(f"Warning: Could not load provenance map: {e}")
+    else:
+        print("Warning: No image_provenance_map.json found.")
+
+    # 1c. Load Intermediate SKU Data (Docling Extraction)
+    sku_map = {}
+    sku_path = raw_dir / "sku_intermediate.jsonl"
+    if sku_path.exists():
+        try:
+            with open(sku_path, 'r') as f:
+                for line in f:
+                    try:
+                        chunk = json.loads(line)
+                        p = chunk.get('page_no', 0)
+                        if p not in sku_map: sku_map[p] = []
+                        sku_map[p].append(chunk)
+                    except: pass
+        except Exception as e:
+            print(f"Warning: Could not load SKU intermediate data: {e}")
+
+    # 2. Iterate Images (Pages) - in whichever format the export wrote them (see extract/artifact_writer.py)
+    image_files = sorted(
+        [p for p in images_dir.glob("page*.*") if p.suffix in PAGE_IMAGE_SUFFIXES and p.stem[4:].isdigit()],
+        key=lambda x: int(x.stem.replace("page", ""))
+    )
+    
+    sku_output_path = final_dir / "sku.jsonl"
+    catalog_output_path = final_dir / "catalog.md"
+    ledger = PageLedger(final_dir)
+
+    if backend is None or isinstance(backend, str):
+        backend = get_backend(backend)
+    # Fail before any work if the backend can't be used (e.g. missing API key)
+    backend.ensure_ready()
+    concurrency = max(1, concurrency or MODEL_CONFIG['concurrency'])
+    cache_mode = cache_mode or "use"
+    cache = open_response_cache(cache_dir, cache_max_mb) if cache_mode != "off" else None
+    limiter = get_rate_limiter(MODEL_CONFIG['requests_per_minute'], MODEL_CONFIG['tokens_per_minute'])
+    batch_pages = max(1, batch_pages or 1)
+    mode_str = f"batches of up to {batch_pages} pages" if batch_pages > 1 else "one page per request"
+    print(f"Chunk has {len(image_files)} pages; synthesizing with {backend.model_id} via {backend.name} ({mode_str}, {concurrency} in flight)...")
+
+    # Token Tracking
+    token_stats = {
+        "model": backend.model_id,
+        "backend": backend.name,
+        "mode": "batch" if batch_pages > 1 else "page",
+        "batch_pages": batch_pages,
+        "total_input": 0,
+        "total_output": 0,
+        "pages_processed": 0,
+        "pages_reused": 0,
+        "failed_pages": [],
+        "requests": 0,
+        "context_chars_saved": 0,
+        "routes": {},
+        "per_page": {}
+    }
+    request_batches = set()
+
+    pages = []
+    for img_path in image_files:
+        # Extract page number from filename "page9.png" (or .webp/.jpg)
+        try:
+            pages.append((int(img_path.stem.replace("page", "")), img_path))
+        except ValueError:
+            continue
+
+    # Triage: only model-routed pages become requests
+    page_routes = dict(page_routes or {})
+    prov_by_page = index_by_page(prov_map, "page_number")
+    for page_num, _ in pages:
+        if page_routes.get(page_num) == "skip" and (prov_by_page.get(page_num) or sku_map.get(page_num)):
+            # pypdf saw nothing here, but Docling did (e.g. a vector drawing): keep the page
+            print(f"  -> Page {page_num}: routed to skip but Docling found content on it; keeping its image.")
+            page_routes[page_num] = "image"
+    for page_num, _ in pages:
+        route = page_routes.get(page_num, "llm")
+        token_stats["routes"][route] = token_stats["routes"].get(route, 0) + 1
+    skipped_pages = [page_num for page_num, _ in pages if page_routes.get(page_num) == "skip"]
+    pages = [(page_num, img_path) for page_num, img_path in pages if page_routes.get(page_num) != "skip"]
+    local_pages = [(page_num, img_path) for page_num, img_path in pages if page_routes.get(page_num, "llm") != "llm"]
+    model_pages = [(page_num, img_path) for page_num, img_path in pages if page_routes.get(page_num, "llm") == "llm"]
+
+    # Cache Tracking (written next to token_usage.json)
+    cache_stats = {
+        "mode": cache_mode,
+        "hits": 0,
+        "misses": 0,
+        "saved_input_tokens": 0,
+        "saved_output_tokens": 0
+    }
+
+    def emit_page(result, status, bytes_written=0):
+        if metrics is None:
+            return
+        metrics.emit("page", page=result["page"], status=status, error=result["error"], cached=result["cached"],
+                     batch=result["batch"], retries=result["retries"],
+                     latency=None if result["latency"] is None else round(result["latency"], 3),
+                     rate_limit_wait=round(result["rate_limit_wait"], 3), input_tokens=result["input_tokens"],
+                     output_tokens=result["output_tokens"], image_bytes=images.stats["per_page"].get(image_names[result["page"]]),
+                     bytes_written=bytes_written)
+
+    def write_page(result):
+        page_num = result["page"]
+        if result["error"]:
+            # Billed but unusable; the page stays failed in the ledger and is retried next run
+            token_stats["total_input"] += result["input_tokens"] or 0
+            token_stats["total_output"] += result["output_tokens"] or 0
+            token_stats["failed_pages"].append(page_num)
+            ledger.record_failed(page_num, fingerprints[page_num], result["error"])
+            print(f"  !! Page {page_num}: failed ({result['error']})")
+            emit_page(result, "failed")
+            return
+
+        if result["cached"]:
+            cache_stats["hits"] += 1
+            cache_stats["saved_input_tokens"] += result["saved_input_tokens"]
+            cache_stats["saved_output_tokens"] += result["saved_output_tokens"]
+        elif cache is not None:
+            cache_stats["misses"] += 1
+        if result["input_tokens"] is not None:
+            token_stats["total_input"] += result["input_tokens"]
+            token_stats["total_output"] += result["output_tokens"] or 0
             token_stats["pages_processed"] += 1
-            print(f"  -> Tokens: {in_tok} In / {out_tok} Out")
-        
+            request_batches.add(tuple(result["batch"]))
+            token_stats["per_page"][str(result["page"])] = {
+                "input": round(result["input_tokens"]),
+                "output": round(result["output_tokens"] or 0),
+                "batch_size": len(result["batch"]),
+                "context_tokens_saved": round(estimate_text_tokens(context_savings.get(result["page"], 0)))
+            }
+            token_stats["context_chars_saved"] += context_savings.get(result["page"], 0)
+        # Tokens billed for a batch response that had to be redone page by page
+        token_stats["total_input"] += result.get("wasted_input_tokens", 0)
+        token_stats["total_output"] += result.get("wasted_output_tokens", 0)
+
+        ledger.record_done(page_num, fingerprints[page_num], {
+            "page": page_num,
+            "fingerprint": fingerprints[page_num],
+            "markdown": result["markdown"],
+            "skus": result["skus"],
+            "input_tokens": result["input_tokens"],
+            "output_tokens": result["output_tokens"],
+            "batch": result["batch"],
+            "cached": result["cached"],
+        })
+        print(f"  -> Page {page_num}: Extracted {len(result['skus'])} SKUs.")
+        emit_page(result, "done", ledger.fragment_path(page_num).stat().st_size)
+
+    local_results = [(page_num, page_routes[page_num], local_fragment(page_num, page_routes[page_num], img_path, text_map, prov_by_page))
+                     for page_num, img_path in local_pages]
+
+    # Fast path: pages whose spec tables Docling parsed cleanly are rendered from their rows, not sent
+    fastpath_stats = {"min_confidence": fastpath, "pages": 0, "per_page": {}}
+    if fastpath is not None:
+        remaining = []
+        for page_num, img_path in model_pages:
+            rows = sku_map.get(page_num, [])
+            if not rows:
+                remaining.append((page_num, img_path))
+                continue
+            confidence, failures, fragment = fastpath_page(page_num, img_path.name, rows, text_map.get(page_num, "") or "", fastpath,
+                                                           prov_by_page.get(page_num))
+            fastpath_stats["per_page"][str(page_num)] = {"rows": len(rows), "confidence": confidence, "failed_rows": failures,
+                                                         "fastpath": fragment is not None}
+            if fragment is None:
+                remaining.append((page_num, img_path))
+            else:
+                local_results.append((page_num, "fastpath", fragment))
+        fastpath_stats["pages"] = len(model_pages) - len(remaining)
+        model_pages = remaining
+    page_inputs = [prepare_page(page_num, img_path, text_map, prov_by_page, sku_map) for page_num, img_path in model_pages]
+    context_savings = {p["page"]: p["context_chars_saved"] for p in page_inputs}
+    image_names = {p["page"]: p["img_path"].name for p in page_inputs}
+    if hasattr(text_map, "close"):
+        text_map.close()
+
+    # Skip pages whose fragment was generated from identical inputs
+    images = ImageEncoder(images_dir, image_profile, workers=min(concurrency, os.cpu_count() or 1), lookahead=2 * concurrency)
+    fingerprints = {p["page"]: page_fingerprint(p, [images.profile, images.source_scale], backend.model_id) for p in page_inputs}
+    todo = [p for p in page_inputs if force or not ledger.is_current(p["page"], fingerprints[p["page"]])]
+    token_stats["pages_reused"] = len(page_inputs) - len(todo)
+    if token_stats["pages_reused"]:
+        print(f"Reusing {token_stats['pages_reused']} unchanged pages; {len(todo)} to synthesize.")
+
+    # Triage-routed and fast-path pages are cheap to rebuild, so they are rewritten on every run
+    for page_num, route, fragment in local_results:
+        fingerprint = cache_key(f"local:{route}", {}, fragment["markdown_content"], b"")
+        ledger.record_done(page_num, fingerprint, {
+            "page": page_num,
+            "fingerprint": fingerprint,
+            "markdown": fragment["markdown_content"],
+            "skus": fragment["skus"],
+            "input_tokens": None,
+            "output_tokens": None,
+            "route": route,
+        })
+        if metrics is not None:
+            confidence = fastpath_stats["per_page"][str(page_num)]["confidence"] if route == "fastpath" else None
+            metrics.emit("page", page=page_num, status="local", route=route, skus=len(fragment["skus"]), confidence=confidence,
+                         bytes_written=ledger.fragment_path(page_num).stat().st_size)
+    if metrics is not None:
+        for page_num in skipped_pages:
+            metrics.emit("page", page=page_num, status="skipped", route="skip")
+    if local_results or skipped_pages:
+        print(f"Triage: {len(local_results) - fastpath_stats['pages']} pages written without a request, {len(skipped_pages)} skipped; "
+              f"fast path: {fastpath_stats['pages']} pages from parsed tables; {len(page_inputs)} for the model.")
+
+    if batch_pages > 1:
+        batches = plan_batches(todo, batch_pages)
+    else:
+        batches = [[page_input] for page_input in todo]
+
+    # Encode images in request order on their own pool, a few pages ahead of the requests in flight
+    images.prefetch(p["img_path"] for batch in batches for p in batch)
+
+    # Submit all requests, then consume futures in page order: a fast later request waits in memory
+    # until every earlier page has been written, so output order never depends on response order.
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="synth") as pool:
+        futures = [
+            pool.submit(synthesize_batch, batch, limiter, cache, cache_mode, images, backend)
+            for batch in batches
+        ]
         try:
-            # Clean possible markdown formatting
-            clean_text = response.text.strip()
-            if clean_text.startswith("```json"):
-                clean_text = clean_text[7:]
-            if clean_text.startswith("```"):
-                clean_text = clean_text[3:]
-            if clean_text.endswith("```"):
-                clean_text = clean_text[:-3]
-            clean_text = clean_text.strip()
-            
-            result = json.loads(clean_text)
-        except json.JSONDecodeError as e:
-            print(f"  !! JSON Parse Error on Page {page_num}: {e}")
-            try:
-                print(f"  !! Raw Response Snippet: {response.text[:500]}...")
-            except:
-                pass
-            # Critical Error: Exit immediately
-            sys.exit(1)
-        
-        # Save Results
-        markdown = result.get("markdown_content", "")
-        skus = result.get("skus", [])
-        
-        # Append Markdown
-        with open(catalog_output_path, "a") as f:
-            f.write(markdown + "\n\n---\n\n")
-        
-        # Append SKUs
-        with open(sku_output_path, "a") as f:
-            for sku in skus:
-                f.write(json.dumps(sku) + "\n")
-        
-        print(f"  -> Extracted {len(skus)} SKUs.")
+            for batch, future in zip(batches, futures):
+                try:
+                    results = future.result()
+                except Exception as e:
+                    # The request itself failed (e.g. retries exhausted): fail its pages, keep going
+                    print(f"  !! Request for pages {batch[0]['page']}-{batch[-1]['page']} failed: {e}")
+                    results = [page_result(p["page"], None, NO_USAGE, error=str(e)) for p in batch]
+                for result in results:
+                    write_page(result)
+        except BaseException:
+            # Interrupted: drop queued pages; completed pages are already in the ledger
+            for future in futures:
+                future.cancel()
+            raise
+        finally:
+            images.close()
+
+    # Rebuild the chunk outputs from every completed fragment, in page order
+    assembled = ledger.assemble([page_num for page_num, _ in pages], catalog_output_path, sku_output_path)
+
+    # Per-page averages make page and batch mode directly comparable
+    elapsed = time.time() - started
+    token_stats["total_input"] = round(token_stats["total_input"])
+    token_stats["total_output"] = round(token_stats["total_output"])
+    token_stats["requests"] = len(request_batches)
+    processed = token_stats["pages_processed"]
+    token_stats["input_per_page"] = round(token_stats["total_input"] / processed, 1) if processed else 0
+    token_stats["output_per_page"] = round(token_stats["total_output"] / processed, 1) if processed else 0
+    token_stats["context_tokens_saved"] = round(estimate_text_tokens(token_stats["context_chars_saved"]))
+    token_stats["context_tokens_saved_per_page"] = round(token_stats["context_tokens_saved"] / processed, 1) if processed else 0
+    token_stats["images"] = images.summary()
+    token_stats["elapsed_seconds"] = round(elapsed, 2)
+    token_stats["seconds_per_page"] = round(elapsed / processed, 2) if processed else 0
+    token_stats["pages_local"] = len(local_results) - fastpath_stats["pages"]
+    token_stats["pages_skipped"] = len(skipped_pages)
+    token_stats["fastpath"] = fastpath_stats
+    # Requests the skipped, triage-routed and fast-path pages would have needed, at the pages per request this
+    # run actually sent (batches close early on the output budget; one page per request without batching)
+    pages_per_request = len(todo) / len(batches) if batches else batch_pages
+    token_stats["api_calls_avoided"] = math.ceil((len(skipped_pages) + len(local_results)) / pages_per_request)
 
     # Save Token Stats
     stats_path = final_dir / "token_usage.json"
     with open(stats_path, "w") as f:
         json.dump(token_stats, f, indent=2)
 
+    # Save Cache Stats
+    if cache is not None:
+        cache_stats["cache"] = cache.usage()
+        cache_stats["cache_dir"] = str(cache.cache_dir)
+    with open(final_dir / "cache_stats.json", "w") as f:
+        json.dump(cache_stats, f, indent=2)
+
     print("\n=== TOKEN USAGE SUMMARY ===")
-    print(f"Pages: {token_stats['pages_processed']}")
+    print(f"Pages: {token_stats['pages_processed']} synthesized, {token_stats['pages_reused']} reused, {len(token_stats['failed_pages'])} failed, "
+          f"{token_stats['pages_local']} routed locally, {token_stats['pages_skipped']} skipped by triage, {fastpath_stats['pages']} from parsed tables")
+    print(f"API Calls Avoided: {token_stats['api_calls_avoided']}")
     print(f"Input: {token_stats['total_input']:,}")
     print(f"Output: {token_stats['total_output']:,}")
     print(f"Total: {token_stats['total_input'] + token_stats['total_output']:,}")
+    print(f"Per Page: {token_stats['input_per_page']:,} In / {token_stats['output_per_page']:,} Out ({token_stats['requests']} requests, {token_stats['seconds_per_page']}s/page)")
+    print(f"Images: {token_stats['images']['bytes']:,} bytes as {token_stats['images']['profile']['format']} at scale {token_stats['images']['profile']['scale']} ({token_stats['images']['encoded']} encoded, {token_stats['images']['reused']} reused)")
+    print(f"Compact Context: ~{token_stats['context_tokens_saved']:,} input tokens saved (~{token_stats['context_tokens_saved_per_page']:,}/page, estimated at 4 chars/token)")
+    if cache is not None:
+        print(f"Cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses ({cache_stats['saved_input_tokens']:,} input tokens saved)")
     print("===========================")
-    print(f"Done. Outputs in {final_dir}")
+    if token_stats["failed_pages"]:
+        print(f"!! {len(token_stats['failed_pages'])} pages failed and are missing from the outputs: {token_stats['failed_pages']} (rerun to retry them)")
+    print(f"Done. {len(assembled)} of {len(pages)} pages in outputs in {final_dir}")
+    return {
+        "pages": len(pages),
+        "synthesized": token_stats["pages_processed"],
+        "reused": token_stats["pages_reused"],
+        "failed": token_stats["failed_pages"],
+        "requests": token_stats["requests"],
+        "input_tokens": token_stats["total_input"],
+        "output_tokens": token_stats["total_output"],
+        "local": token_stats["pages_local"],
+        "fastpath": fastpath_stats["pages"],
+        "skipped": token_stats["pages_skipped"],
+        "api_calls_avoided": token_stats["api_calls_avoided"],
+        "bytes_written": sum((final_dir / name).stat().st_size for name in ("catalog.md", "sku.jsonl", "token_usage.json")),
+    }
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python synthesize.py <export_dir>")
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("export_dir", help="Chunk directory with images/, extract.md and Docling outputs")
+    parser.add_argument("--concurrency", type=int, help="Requests in flight at once")
+    parser.add_argument("--batch-pages", type=int, default=1, help="Pack up to N consecutive pages into one request (default: 1)")
+    parser.add_argument("--cache", choices=CACHE_MODES, default="use", help="Response cache mode: use (default), refresh (ignore and overwrite entries) or off")
+    parser.add_argument("--cache-dir", help="Response cache directory (default: $SYNTHESIS_CACHE_DIR or ~/.cache/catalog-extractor/synthesis)")
+    parser.add_argument("--image-scale", type=float, help="Pixels per PDF point sent to the model (default: 1.0, env SYNTHESIS_IMAGE_SCALE)")
+    parser.add_argument("--image-format", choices=list(IMAGE_FORMATS), help="Image encoding sent to the model (default: png, env SYNTHESIS_IMAGE_FORMAT)")
+    parser.add_argument("--image-quality", type=int, help="JPEG/WebP quality, 1-100 (default: 85, env SYNTHESIS_IMAGE_QUALITY)")
+    parser.add_argument("--grayscale", choices=GRAYSCALE_MODES, help="Send pages in grayscale: on, off (default) or auto (line-art pages only)")
+    parser.add_argument("--force", action="store_true", help="Resynthesize every page, even those whose inputs are unchanged")
+    parser.add_argument("--backend", choices=BACKENDS, help="LLM backend: gemini, openai (OpenAI-compatible endpoint at $LLM_BASE_URL) or stub (default: $LLM_BACKEND or gemini)")
+    args = parser.parse_args()
+
+    profile = make_image_profile(args.image_scale, args.grayscale, args.image_format, args.image_quality)
+    try:
+        summary = synthesize_catalog(args.export_dir, concurrency=args.concurrency, cache_mode=args.cache, cache_dir=args.cache_dir,
+                                     batch_pages=args.batch_pages, image_profile=profile, force=args.force, backend=args.backend)
+    except LLMConfigError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    if summary["failed"]:
         sys.exit(1)
-        
-    synthesize_catalog(sys.argv[1])
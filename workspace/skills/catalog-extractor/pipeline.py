@@ -0,0 +1,194 @@
+import time
+import queue
+import threading
+import traceback
+
+# Staged executor for `run.py --pipeline`: stages connected by bounded queues, each with its own worker
+# threads, so the CPU-bound Docling export of the next chunk overlaps the network-bound synthesis of the
+# previous one. Items enter with `submit`; a handler returns the item to pass it to the next stage or None
+# when it is finished, and every item leaves through `on_exit` exactly once (with the exception, if any).
+# Per stage it records busy time, items and time spent waiting for input or for room downstream; a monitor
+# thread samples queue depths.
+
+STOP = object()
+
+class StageStats:
+    def __init__(self, name, workers):
+        self.name = name
+        self.workers = workers
+        self.items = 0
+        self.errors = 0
+        self.busy = 0.0
+        self.wait_in = 0.0
+        self.wait_out = 0.0
+        self.lock = threading.Lock()
+        self.active = 0
+
+    def add(self, **deltas):
+        with self.lock:
+            for key, value in deltas.items():
+                setattr(self, key, getattr(self, key) + value)
+
+class QueueDepth:
+    """min/avg/max of a queue's length over the monitor's samples."""
+
+    def __init__(self, name, capacity):
+        self.name = name
+        self.capacity = capacity
+        self.samples = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    def sample(self, depth):
+        self.samples += 1
+        self.total += depth
+        self.min = depth if self.min is None else min(self.min, depth)
+        self.max = max(self.max, depth)
+
+    @property
+    def avg(self):
+        return self.total / self.samples if self.samples else 0.0
+
+class StagePipeline:
+    """
+    `stages` is a list of (name, handler, workers). `handler(item, context)` runs in a worker thread;
+    `init(stage, index)` builds that thread's context (e.g. its own state store connection) and
+    `on_exit(item, context, error)` is called in the thread where the item finished.
+    Each stage's input queue holds at most `queue_size` items, and at most `capacity()` items are in
+    the pipeline at once (`acquire` blocks until one leaves).
+    """
+
+    def __init__(self, stages, queue_size=2, init=None, on_exit=None, sample_interval=0.5, status_interval=30):
+        self.stages = stages
+        self.init = init
+        self.on_exit = on_exit
+        self.sample_interval = sample_interval
+        self.status_interval = status_interval
+        self.queues = {name: queue.Queue(maxsize=max(1, queue_size)) for name, _, _ in stages}
+        self.stats = {name: StageStats(name, max(1, workers)) for name, _, workers in stages}
+        self.depths = {name: QueueDepth(name, q.maxsize) for name, q in self.queues.items()}
+        self.next_stage = {name: (stages[i + 1][0] if i + 1 < len(stages) else None) for i, (name, _, _) in enumerate(stages)}
+        self._slots = threading.Semaphore(self.capacity())
+        self._threads = {name: [] for name, _, _ in stages}
+        self._done = threading.Event()
+        self._monitor = threading.Thread(target=self._monitor_loop, daemon=True)
+        self.started = None
+        self.wall = None
+
+    def capacity(self):
+        """Items in flight: one per worker plus a full queue in front of every stage."""
+        return sum(s.workers for s in self.stats.values()) + sum(q.maxsize for q in self.queues.values())
+
+    def start(self):
+        self.started = time.perf_counter()
+        for name, handler, _ in self.stages:
+            for index in range(self.stats[name].workers):
+                thread = threading.Thread(target=self._worker, args=(name, handler, index), name=f"{name}-{index}", daemon=True)
+                thread.start()
+                self._threads[name].append(thread)
+        self._monitor.start()
+        return self
+
+    def acquire(self):
+        """Blocks until the pipeline has room for one more item; pair with `submit` or `release`."""
+        self._slots.acquire()
+
+    def release(self):
+        self._slots.release()
+
+    def submit(self, item, stage):
+        """Queues an item (after `acquire`) at `stage`, e.g. the first stage or one it can skip to."""
+        self.queues[stage].put(item)
+
+    def _finish(self, item, context, error=None):
+        try:
+            if self.on_exit:
+                self.on_exit(item, context, error)
+        except Exception as e:
+            print(f"!!! Pipeline exit handler failed: {e}")
+            traceback.print_exc()
+        finally:
+            self._slots.release()
+
+    def _worker(self, name, handler, index):
+        stats = self.stats[name]
+        inbox = self.queues[name]
+        next_stage = self.next_stage[name]
+        context = self.init(name, index) if self.init else None
+        while True:
+            waited = time.perf_counter()
+            item = inbox.get()
+            stats.add(wait_in=time.perf_counter() - waited)
+            if item is STOP:
+                return
+            stats.add(active=1)
+            started = time.perf_counter()
+            try:
+                result = handler(item, context)
+            except Exception as e:
+                stats.add(busy=time.perf_counter() - started, items=1, errors=1, active=-1)
+                print(f"!!! [{name}] {e}")
+                traceback.print_exc()
+                self._finish(item, context, e)
+                continue
+            stats.add(busy=time.perf_counter() - started, items=1, active=-1)
+            if result is None or next_stage is None:
+                self._finish(item, context)
+                continue
+            waited = time.perf_counter()
+            self.queues[next_stage].put(result)
+            stats.add(wait_out=time.perf_counter() - waited)
+
+    def _monitor_loop(self):
+        last_status = time.perf_counter()
+        while not self._done.wait(self.sample_interval):
+            for name, q in self.queues.items():
+                self.depths[name].sample(q.qsize())
+            if time.perf_counter() - last_status >= self.status_interval:
+                last_status = time.perf_counter()
+                print(f"[*] Pipeline: {self.status_line()}")
+
+    def status_line(self):
+        return " | ".join(f"{name} {s.active}/{s.workers} busy, {self.queues[name].qsize()} queued, {s.items} done"
+                          for name, s in self.stats.items())
+
+    def close(self):
+        """Drains the stages in order (each one stops after everything upstream of it has finished)."""
+        for name, _, _ in self.stages:
+            for _ in self._threads[name]:
+                self.queues[name].put(STOP)
+            for thread in self._threads[name]:
+                thread.join()
+        self._done.set()
+        self._monitor.join()
+        self.wall = time.perf_counter() - self.started
+
+    def report(self):
+        """Per stage: workers, items, busy/wait seconds and utilization (busy / workers x wall); per queue: depth."""
+        wall = self.wall if self.wall is not None else time.perf_counter() - self.started
+        stages = {}
+        for name, s in self.stats.items():
+            stages[name] = {
+                "workers": s.workers,
+                "items": s.items,
+                "errors": s.errors,
+                "busy": round(s.busy, 3),
+                "wait_in": round(s.wait_in, 3),
+                "wait_out": round(s.wait_out, 3),
+                "utilization": round(s.busy / (s.workers * wall), 3) if wall > 0 else None,
+            }
+        queues = {name: {"capacity": d.capacity, "min": d.min or 0, "avg": round(d.avg, 2), "max": d.max}
+                  for name, d in self.depths.items()}
+        return {"wall": round(wall, 3), "stages": stages, "queues": queues}
+
+def print_pipeline_report(report):
+    print("\n=== Pipeline Report ===")
+    print(f"{'stage':<12} {'workers':>7} {'items':>6} {'busy s':>9} {'util':>6} {'wait in s':>10} {'wait out s':>11} {'queue avg/max/cap':>14}")
+    for name, s in report["stages"].items():
+        q = report["queues"][name]
+        util = "-" if s["utilization"] is None else f"{s['utilization'] * 100:.0f}%"
+        depth = f"{q['avg']:.1f}/{q['max']}/{q['capacity']}"
+        print(f"{name:<12} {s['workers']:>7} {s['items']:>6} {s['busy']:>9.1f} {util:>6} {s['wait_in']:>10.1f} {s['wait_out']:>11.1f} {depth:>14}")
+    print(f"Wall time: {report['wall']:.1f}s")
+    print("=======================\n")
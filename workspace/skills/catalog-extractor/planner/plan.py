@@ -7,23 +7,136 @@ import datetime
 import traceback
 from pathlib import Path
 from pypdf import PdfReader
+from concurrent.futures import ProcessPoolExecutor
 
 # Import neighboring modules
 try:
-    from utils import slice_pdf_pages, map_catalog_structure, extract_pypdf_text, log_execution
+    from utils import slice_pdf_pages, map_catalog_structure, write_page_text_md, log_execution, timed, PageTextCache, page_stats
+    from state import create_state_store, default_backend, BACKENDS, SQLITE_MIN_CHUNKS
+    from triage import classify_page, class_counts, print_class_counts
 except ImportError:
     import sys
     sys.path.append(str(Path(__file__).parent))
-    from utils import slice_pdf_pages, map_catalog_structure, extract_pypdf_text, log_execution
+    from utils import slice_pdf_pages, map_catalog_structure, write_page_text_md, log_execution, timed, PageTextCache, page_stats
+    from state import create_state_store, default_backend, BACKENDS, SQLITE_MIN_CHUNKS
+    from triage import classify_page, class_counts, print_class_counts
 
-def initialize_job(pdf_path, job_dir, chunk_size=5):
+def build_chunk(reader, text_cache, runs_dir, start, end, total_pages, pdf_path, slice_pdfs=True, stats=None):
+    """
+    Slices one chunk PDF and writes its `extract.md` from the open source `reader`.
+    With `slice_pdfs=False` no chunk PDF is written: the chunk points at the source PDF
+    and its `page_range`, and the runner converts that range directly.
+    The chunk records per-page planning stats and their summed `cost`, which the runner uses to
+    dispatch expensive chunks first, and each page's triage class (see planner/triage.py).
+    `stats` (page -> `page_stats`) reuses stats already computed while planning.
+    Returns (chunk_entry, stage_timings).
+    """
+    timings = {}
+    
+    # Directory Name: 8_12
+    chunk_slug = f"{start}_{end}"
+    
+    # Create Chunk Directory: runs/8_12/
+    chunk_dir = runs_dir / chunk_slug
+    chunk_dir.mkdir(parents=True, exist_ok=True)
+    
+    # Define PDF Path: runs/8_12/8_12.pdf
+    chunk_pdf_name = f"{chunk_slug}.pdf"
+    chunk_pdf_path = chunk_dir / chunk_pdf_name
+    
+    # Slice & Save PDF
+    if slice_pdfs:
+        with timed(timings, "slice"):
+            slice_pdf_pages(reader, start, end, chunk_pdf_path)
+    else:
+        chunk_pdf_path = Path(pdf_path)
+
+    # Define Text MD Path: runs/8_12/extract.md
+    text_md_path = chunk_dir / "extract.md"
+    
+    # Extract Text Context (from the already-loaded source pages)
+    # Page numbers are the real catalog pages: chunk 8_12 is labelled "Page 8".."Page 12"
+    with timed(timings, "text"):
+        write_page_text_md(text_md_path, chunk_pdf_path, (
+            (p, text_cache.get(p - 1)) for p in range(start, end + 1) if p <= total_pages
+        ))
+    
+    with timed(timings, "stats"):
+        stats = stats or {}
+        pages = [dict(stats[p]) if p in stats else page_stats(reader, text_cache, p)
+                 for p in range(start, end + 1) if p <= total_pages]
+    with timed(timings, "triage"):
+        for page in pages:
+            page["class"] = classify_page(text_cache.get(page["page"] - 1), page)
+
+    chunk = {
+        "id": chunk_slug,                 # Stable id, also the chunk's directory name
+        "start": start,
+        "end": end,
+        "status": "PENDING",
+        "cost": round(sum(p["cost"] for p in pages), 3),
+        "working_dir": str(chunk_dir),   # Absolute path to chunk folder
+        "input_file": str(chunk_pdf_path), # Absolute path to sliced PDF (or the source PDF)
+        "text_file": str(text_md_path),   # Absolute path to text context
+        "pages": pages                    # Per-page stats: chars, table_lines, images, cost, class
+    }
+    if not slice_pdfs:
+        # Pages of `input_file` to convert (1-based, inclusive)
+        chunk["page_range"] = [start, end]
+    return chunk, timings
+
+# Per-process reader for `--jobs` workers: each worker parses the source PDF once, on startup.
+_worker_reader = None
+_worker_text_cache = None
+
+def _init_chunk_worker(pdf_path):
+    global _worker_reader, _worker_text_cache
+    _worker_reader = PdfReader(pdf_path)
+    _worker_text_cache = PageTextCache(_worker_reader)
+
+def _build_chunk_task(args):
+    # Pages the parent already extracted while planning (`--max-chunk-cost`) arrive with their text and stats
+    *chunk_args, texts, stats = args
+    _worker_text_cache.texts.update(texts)
+    return build_chunk(_worker_reader, _worker_text_cache, *chunk_args, stats=stats)
+
+def plan_section_chunks(start_page, end_page, chunk_size, page_cost=None, max_chunk_cost=None):
+    """
+    Splits a section into (start, end) ranges of at most `chunk_size` pages. With `max_chunk_cost`,
+    a range also closes before the page that would push its summed `page_cost(page)` over the
+    budget, so table- and image-dense stretches become smaller chunks (down to single pages).
+    """
+    ranges = []
+    start, cost = start_page, 0.0
+    for page in range(start_page, end_page + 1):
+        c = page_cost(page) if max_chunk_cost else 0.0
+        full = page - start >= chunk_size
+        over_budget = max_chunk_cost and cost + c > max_chunk_cost
+        if page > start and (full or over_budget):
+            ranges.append((start, page - 1))
+            start, cost = page, 0.0
+        cost += c
+    if start <= end_page:
+        ranges.append((start, end_page))
+    return ranges
+
+def initialize_job(pdf_path, job_dir, chunk_size=5, state_backend=None, jobs=1, slice_pdfs=True, max_chunk_cost=None):
     """
     Initializes a new catalog extraction job.
     1. Creates User-Defined Job Directory (`job_dir`)
     2. Maps Catalog Structure -> `structure.json`
     3. Slices PDFs into `runs/{start}_{end}/{start}_{end}.pdf`
-    4. Generates `state.json` tracking all chunks
+    4. Generates `state.json` (or `state.db` with the SQLite backend) tracking all chunks;
+       without `state_backend`, plans above `SQLITE_MIN_CHUNKS` chunks use SQLite
+    The source PDF is parsed once; every page's text is extracted once and written
+    straight into its chunk's `extract.md`. With `jobs > 1`, chunks are built by a
+    process pool (one reader per worker) and the state is assembled in plan order.
+    With `slice_pdfs=False` (source mode "range") no chunk PDFs are written; chunks
+    reference page ranges of the source PDF instead.
+    With `max_chunk_cost`, chunks are also bounded by the estimated cost of their pages; the text and
+    stats computed for that are reused when the chunks are built, including by `jobs` workers.
     """
+    timings = {}
     pdf_path = Path(pdf_path).resolve()
     job_dir = Path(job_dir).resolve()
     
@@ -34,9 +147,16 @@ def initialize_job(pdf_path, job_dir, chunk_size=5):
     job_dir.mkdir(parents=True, exist_ok=True)
     runs_dir.mkdir(parents=True, exist_ok=True)
     
+    # Load Source PDF Once
+    with timed(timings, "open"):
+        reader = PdfReader(pdf_path)
+        total_pages = len(reader.pages)
+    text_cache = PageTextCache(reader)
+
     # 2. Map Catalog Structure
     print(f"[*] Analyzing Catalog Structure: {pdf_path}")
-    structure = map_catalog_structure(str(pdf_path))
+    with timed(timings, "structure"):
+        structure = map_catalog_structure(str(pdf_path), reader=reader, text_cache=text_cache)
     
     # Save structure.json
     structure_path = job_dir / "structure.json"
@@ -46,79 +166,80 @@ def initialize_job(pdf_path, job_dir, chunk_size=5):
 
     # 3. Generate State & Slice PDFs
     
-    # Load Source PDF Once
-    reader = PdfReader(pdf_path)
-    total_pages = len(reader.pages)
-    
-    print(f"[*] Slicing PDFs & Extracting Text into chunks of {chunk_size} pages...")
+    print(f"[*] Slicing PDFs & Extracting Text into chunks of {chunk_size} pages ({jobs} job{'s' if jobs > 1 else ''})...")
     
     state = {
         "catalog_source": str(pdf_path),
         "working_dir": str(job_dir),
         "status": "ready",
+        "source_mode": "slice" if slice_pdfs else "range",
         "sections": []
     }
     
-    total_chunks = 0
+    # Calculate Chunks for every Section up front: (section_idx, start, end)
+    chunk_plan = []
+    planned_stats = {}
+
+    def page_cost(p):
+        if p > total_pages:
+            return 0.0
+        if p not in planned_stats:
+            planned_stats[p] = page_stats(reader, text_cache, p)
+        return planned_stats[p]["cost"]
+
+    if max_chunk_cost:
+        print(f"    Bounding chunks at an estimated cost of {max_chunk_cost} (a plain page is ~1)")
+    with timed(timings, "plan"):
+        for sec_idx, section in enumerate(structure["sections"]):
+            for start, end in plan_section_chunks(section["start_page"], section["end_page"], chunk_size, page_cost, max_chunk_cost):
+                chunk_plan.append((sec_idx, start, end))
     
-    for section in structure["sections"]:
-        sec_name = section["name"]
-        start_page = section["start_page"]
-        end_page = section["end_page"]
-        
-        # Calculate Chunks for this Section
-        chunks = []
-        for i in range(start_page, end_page + 1, chunk_size):
-            chunk_end = min(i + chunk_size - 1, end_page)
-            
-            # Directory Name: 8_12
-            chunk_slug = f"{i}_{chunk_end}"
-            
-            # Create Chunk Directory: runs/8_12/
-            chunk_dir = runs_dir / chunk_slug
-            chunk_dir.mkdir(parents=True, exist_ok=True)
-            
-            # Define PDF Path: runs/8_12/8_12.pdf
-            chunk_pdf_name = f"{chunk_slug}.pdf"
-            chunk_pdf_path = chunk_dir / chunk_pdf_name
-            
-            # Slice & Save PDF
-            slice_pdf_pages(reader, i, chunk_end, chunk_pdf_path)
-
-            # Define Text MD Path: runs/8_12/extract.md
-            text_md_path = chunk_dir / "extract.md"
-            
-            # Extract Text Context (using chunk PDF)
-            # Offset: If chunk starts at page 8 (i=8), small PDF page 1 needs to be labelled "Page 8"
-            # Logic: real_page = index(0) + 1 + offset => 8. Offset = 7.
-            extract_pypdf_text(str(chunk_pdf_path), str(text_md_path), pages=None, page_offset=(i - 1))
-            
-            # Add to State
-            chunks.append({
-                "start": i,
-                "end": chunk_end,
-                "status": "PENDING",
-                "working_dir": str(chunk_dir),   # Absolute path to chunk folder
-                "input_file": str(chunk_pdf_path), # Absolute path to sliced PDF
-                "text_file": str(text_md_path)    # Absolute path to text context
-            })
-            total_chunks += 1
-            print(f"    [+] Created chunk: {chunk_slug}")
-            
-        state["sections"].append({
-            "name": sec_name,
-            "chunks": chunks
-        })
-
-    # Save state.json
-    state_path = job_dir / "state.json"
-    with open(state_path, "w") as f:
-        json.dump(state, f, indent=2)
+    # Build chunks; results come back in plan order regardless of which worker finishes first
+    with timed(timings, "chunks"):
+        if jobs > 1 and len(chunk_plan) > 1:
+            with ProcessPoolExecutor(max_workers=jobs, initializer=_init_chunk_worker, initargs=(str(pdf_path),)) as pool:
+                tasks = []
+                for _, start, end in chunk_plan:
+                    pages = [p for p in range(start, end + 1) if p in planned_stats]
+                    tasks.append((runs_dir, start, end, total_pages, pdf_path, slice_pdfs,
+                                  {p - 1: text_cache.texts[p - 1] for p in pages}, {p: planned_stats[p] for p in pages}))
+                built = list(pool.map(_build_chunk_task, tasks, chunksize=max(1, len(tasks) // (jobs * 4))))
+        else:
+            built = [build_chunk(reader, text_cache, runs_dir, start, end, total_pages, pdf_path, slice_pdfs, planned_stats)
+                     for _, start, end in chunk_plan]
+    
+    # Worker stage times are summed across processes (CPU-seconds, not wall time)
+    for _, chunk_timings in built:
+        for stage, seconds in chunk_timings.items():
+            timings[stage] = timings.get(stage, 0.0) + seconds
+    
+    state["sections"] = [{"name": section["name"], "chunks": []} for section in structure["sections"]]
+    for (sec_idx, _, _), (chunk, _) in zip(chunk_plan, built):
+        state["sections"][sec_idx]["chunks"].append(chunk)
+        print(f"    [+] Created chunk: {chunk['start']}_{chunk['end']}")
+    total_chunks = len(built)
+    costs = sorted(chunk["cost"] for chunk, _ in built)
+
+    state["planning"] = {"total_pages": total_pages, "timings": {k: round(v, 3) for k, v in timings.items()}}
+
+    # Save state (state.json or state.db)
+    if state_backend is None:
+        state_backend = default_backend(total_chunks)
+        if state_backend == "sqlite":
+            print(f"[*] {total_chunks} chunks (> {SQLITE_MIN_CHUNKS}): storing job state in SQLite; pass --state-backend json to override")
+    with timed(timings, "state"):
+        store = create_state_store(job_dir, state_backend)
+        store.initialize(state)
+    state_path = store.path
         
     print(f"\n[*] Job Initialized Successfully!")
     print(f"    Total Sections: {len(state['sections'])}")
     print(f"    Total Chunks:   {total_chunks}")
+    if costs:
+        print(f"    Chunk Cost:     min {costs[0]:.1f} / median {costs[len(costs) // 2]:.1f} / max {costs[-1]:.1f} (total {sum(costs):.1f})")
+    print_class_counts(class_counts(chunk for chunk, _ in built))
     print(f"    State File:     {state_path}")
+    print("    Stage Timings:  " + ", ".join(f"{stage}={seconds:.2f}s" for stage, seconds in timings.items()))
     print("\nNext Steps:")
     print(f"Run the executor script pointing to this job directory: {job_dir}")
 
@@ -126,7 +247,11 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Initialize a Catalog Extraction Job")
     parser.add_argument("pdf_path", help="Absolute path to the source catalog PDF")
     parser.add_argument("job_dir", help="Absolute path to the job workspace directory (e.g. /tmp/my_job)")
-    parser.add_argument("--chunk-size", type=int, default=5, help="Pages per chunk (default: 5)")
+    parser.add_argument("--chunk-size", type=int, default=5, help="Pages per chunk (default: 5); the maximum when --max-chunk-cost is set")
+    parser.add_argument("--max-chunk-cost", type=float, help="Also close a chunk before its estimated cost exceeds this (a plain text page costs ~1; dense spec-table pages 2-4)")
+    parser.add_argument("--jobs", type=int, default=1, help="Worker processes for slicing chunks and extracting text (default: 1)")
+    parser.add_argument("--no-slice", action="store_true", help="Don't write per-chunk PDFs; the runner converts page ranges of the source PDF directly")
+    parser.add_argument("--state-backend", choices=BACKENDS, help=f"Where job state is stored: json (state.json) or sqlite (state.db) (default: json, sqlite above {SQLITE_MIN_CHUNKS} chunks)")
     
     args = parser.parse_args()
     
@@ -137,7 +262,8 @@ if __name__ == "__main__":
     message = "success"
     
     try:
-        initialize_job(args.pdf_path, args.job_dir, args.chunk_size)
+        initialize_job(args.pdf_path, args.job_dir, args.chunk_size, args.state_backend, args.jobs, slice_pdfs=not args.no_slice,
+                       max_chunk_cost=args.max_chunk_cost)
     except Exception as e:
         status = "FAILURE"
         message = traceback.format_exc()
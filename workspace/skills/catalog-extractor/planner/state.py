@@ -0,0 +1,636 @@
+import os
+import json
+import time
+import fcntl
+import heapq
+import socket
+import sqlite3
+from pathlib import Path
+from contextlib import contextmanager
+
+# Job state lives either in `state.json` (default, human readable) or in `state.db` (SQLite, WAL mode).
+# Both backends expose the same operations so the planner and runner never touch the files directly.
+STATE_JSON = "state.json"
+STATE_DB = "state.db"
+BACKENDS = ["json", "sqlite"]
+# Plans with more chunks than this default to SQLite: a json transition rewrites the whole file, about
+# 13 ms per claim + release at 500 chunks and 264 ms at 10,000 (benchmarks/bench_scheduler.py).
+SQLITE_MIN_CHUNKS = 1000
+
+# Chunk keys that are claim bookkeeping rather than plan data.
+CLAIM_KEYS = ("claimed_from", "claimed_by", "claimed_at", "heartbeat")
+
+@contextmanager
+def state_lock(job_dir):
+    """
+    Exclusive advisory lock on `<job_dir>/state.json.lock`.
+    Every read-modify-write of state.json must happen inside this lock so that
+    concurrent runners cannot double-claim chunks or drop each other's updates.
+    """
+    lock_path = Path(job_dir) / "state.json.lock"
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_path, "a") as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+def write_json_atomic(path, data):
+    """Writes JSON to a temp file and renames it over `path` so readers never see a partial file."""
+    path = Path(path)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    # dumps + one write is noticeably faster than streaming json.dump for large plans
+    text = json.dumps(data, indent=2)
+    with open(tmp_path, "w") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+def retire_state_file(path):
+    """
+    Renames a state file of the other backend to `<name>.migrated` so `open_state_store` can't pick it up
+    (state.db takes precedence over state.json, and a leftover state.json looks like a live plan).
+    """
+    path = Path(path)
+    if path.exists():
+        path.rename(path.with_name(f"{path.name}.migrated"))
+    for suffix in ("-wal", "-shm"):
+        Path(f"{path}{suffix}").unlink(missing_ok=True)
+
+def claimable_statuses(synthesis_mode):
+    """Statuses a runner may pick up, in priority order, for a given synthesis mode."""
+    statuses = []
+    # Priority 1: If include or skip, look for PENDING
+    if synthesis_mode in ["include", "skip"]:
+        statuses.append("PENDING")
+    # Priority 2: If include or only, look for SYNTHESIZE
+    if synthesis_mode in ["include", "only"]:
+        statuses.append("SYNTHESIZE")
+    return statuses
+
+def is_chunk_stale(chunk, stale_after, now=None):
+    """
+    True if an IN_PROGRESS chunk was left behind by a crashed worker:
+    its owner process is gone (same host) or its heartbeat is older than `stale_after`.
+    Chunks without any claim metadata (written by older runners) are always stale.
+    """
+    now = now or time.time()
+    owner = chunk.get("claimed_by")
+    heartbeat = chunk.get("heartbeat")
+    if not owner or heartbeat is None:
+        return True
+
+    host, _, pid = owner.rpartition(":")
+    if host == socket.gethostname() and pid.isdigit():
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return True
+        except PermissionError:
+            pass
+
+    return now - heartbeat > stale_after
+
+def chunk_id(chunk):
+    """Stable chunk id: the planner's `id`, or `<start>_<end>` (the chunk's directory name) for older plans."""
+    return chunk.get("id") or f"{chunk['start']}_{chunk['end']}"
+
+class ChunkIndex:
+    """
+    In-memory index over a `state.json` dict: chunks by id, status sets, per-section status counts and,
+    per (section, status), two claim queues: plan order, and highest cost first (ties in plan order).
+    Heaps use lazy deletion, so a status change and a claim are O(log n) instead of a scan of every chunk.
+    All status changes must go through `set_status`.
+    """
+
+    def __init__(self, state):
+        self.by_id = {}
+        self.position = {}
+        self.members = {}
+        self.counts = {}
+        self.queues = {}
+        self.cost_queues = {}
+        order = 0
+        for sec_idx, section in enumerate(state.get("sections", [])):
+            self.counts[sec_idx] = {}
+            for chunk in section.get("chunks", []):
+                cid = chunk_id(chunk)
+                self.by_id[cid] = chunk
+                self.position[cid] = (sec_idx, order)
+                order += 1
+                self._add(cid, chunk.get("status", "UNKNOWN"))
+
+    def _add(self, cid, status):
+        sec_idx, order = self.position[cid]
+        self.members.setdefault(status, set()).add(cid)
+        counts = self.counts[sec_idx]
+        counts[status] = counts.get(status, 0) + 1
+        heapq.heappush(self.queues.setdefault((sec_idx, status), []), (order, cid))
+        heapq.heappush(self.cost_queues.setdefault((sec_idx, status), []), (-(self.by_id[cid].get("cost") or 0), order, cid))
+
+    def set_status(self, chunk, status):
+        cid = chunk_id(chunk)
+        old = chunk.get("status", "UNKNOWN")
+        self.members[old].discard(cid)
+        counts = self.counts[self.position[cid][0]]
+        counts[old] -= 1
+        if not counts[old]:
+            del counts[old]
+        chunk["status"] = status
+        self._add(cid, status)
+
+    def with_status(self, status, target_section_idx=None):
+        """Chunks currently in `status` (optionally in one section), in plan order."""
+        ids = self.members.get(status, ())
+        if target_section_idx is not None:
+            ids = [cid for cid in ids if self.position[cid][0] == target_section_idx]
+        return [self.by_id[cid] for cid in sorted(ids, key=lambda cid: self.position[cid][1])]
+
+    def _peek(self, queues, sec_idx, status):
+        heap = queues.get((sec_idx, status))
+        while heap:
+            if self.by_id[heap[0][-1]].get("status") == status:
+                return heap[0]
+            heapq.heappop(heap)
+        return None
+
+    def next_chunk(self, synthesis_mode, target_section_idx=None, largest_first=False):
+        """
+        The next chunk to claim: the first status of `claimable_statuses` that has any, and within it the first
+        chunk in plan order. With `largest_first`, the chunk with the largest estimated `cost` instead (longest
+        job first keeps workers busy and stops one dense chunk from becoming the straggler); ties keep plan order.
+        """
+        queues = self.cost_queues if largest_first else self.queues
+        sections = [target_section_idx] if target_section_idx is not None else list(self.counts)
+        for status in claimable_statuses(synthesis_mode):
+            heads = [head for head in (self._peek(queues, sec_idx, status) for sec_idx in sections) if head]
+            if heads:
+                return self.by_id[min(heads)[-1]]
+        return None
+
+    def summary(self, state):
+        """Per-section status counts: [(section_idx, name, {status: count})], from the maintained counts."""
+        return [(i, section.get("name", section.get("title", f"Section {i}")), dict(self.counts.get(i, {})))
+                for i, section in enumerate(state.get("sections", []))]
+
+class JsonStateStore:
+    """
+    Whole-file `state.json` backend. Every transition (claim, release, heartbeat) rewrites the whole file under
+    `state_lock`, so its cost grows with the plan: about 50 ms per claim + release at 2000 chunks
+    (benchmarks/bench_scheduler.py). Large plans should use `SqliteStateStore` (the planner's default above
+    `SQLITE_MIN_CHUNKS`).
+    The parsed state and its `ChunkIndex` are kept between calls and only re-read when the file
+    was replaced by another process, so claims, releases and reports don't rescan every chunk.
+    """
+
+    kind = "json"
+
+    def __init__(self, job_dir):
+        self.job_dir = Path(job_dir)
+        self.path = self.job_dir / STATE_JSON
+        self._cached = None
+
+    def exists(self):
+        return self.path.exists()
+
+    def _read(self):
+        if not self.path.exists():
+            return None
+        with open(self.path, "r") as f:
+            return json.load(f)
+
+    def _signature(self):
+        st = os.stat(self.path)
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _load_indexed(self):
+        """(state, index) for the current file; reuses the cached parse if nobody else wrote it. Caller holds the lock."""
+        if not self.path.exists():
+            return None, None
+        signature = self._signature()
+        if self._cached and self._cached[0] == signature:
+            return self._cached[1], self._cached[2]
+        state = self._read()
+        index = ChunkIndex(state) if state else None
+        self._cached = (signature, state, index)
+        return state, index
+
+    def _write(self, state, index):
+        write_json_atomic(self.path, state)
+        self._cached = (self._signature(), state, index)
+
+    def load(self):
+        return self._read()
+
+    def initialize(self, state):
+        """Writes a fresh `state.json` (replacing any previous plan) and retires a `state.db` left in the job."""
+        self.job_dir.mkdir(parents=True, exist_ok=True)
+        with state_lock(self.job_dir):
+            write_json_atomic(self.path, state)
+            self._cached = None
+            retire_state_file(self.job_dir / STATE_DB)
+
+    def _reclaim_stale(self, index, stale_after):
+        reclaimed = []
+        now = time.time()
+        for chunk in index.with_status("IN_PROGRESS"):
+            if not is_chunk_stale(chunk, stale_after, now):
+                continue
+            owner = chunk.get("claimed_by")
+            index.set_status(chunk, chunk.get("claimed_from") or "PENDING")
+            for key in CLAIM_KEYS:
+                chunk.pop(key, None)
+            reclaimed.append((chunk, owner))
+        return reclaimed
+
+    def claim_next(self, synthesis_mode, target_section_idx, worker_id, stale_after, largest_first=False):
+        """
+        Atomically finds the next chunk (see `ChunkIndex.next_chunk`) and marks it IN_PROGRESS for `worker_id`.
+        Returns (chunk, original_status, reclaimed) where `reclaimed` lists stale chunks that were released.
+        """
+        with state_lock(self.job_dir):
+            state, index = self._load_indexed()
+            if not state:
+                return None, None, []
+
+            reclaimed = self._reclaim_stale(index, stale_after)
+            chunk = index.next_chunk(synthesis_mode, target_section_idx, largest_first)
+            if not chunk:
+                if reclaimed:
+                    self._write(state, index)
+                return None, None, reclaimed
+
+            original_status = chunk.get("status", "PENDING")
+            now = time.time()
+            index.set_status(chunk, "IN_PROGRESS")
+            chunk["claimed_from"] = original_status
+            chunk["claimed_by"] = worker_id
+            chunk["claimed_at"] = now
+            chunk["heartbeat"] = now
+            self._write(state, index)
+            return dict(chunk), original_status, reclaimed
+
+    def _update_owned(self, chunk, worker_id, update):
+        with state_lock(self.job_dir):
+            state, index = self._load_indexed()
+            target_chunk = index.by_id.get(chunk_id(chunk)) if state else None
+            if not target_chunk or target_chunk.get("claimed_by") != worker_id:
+                return False
+            update(target_chunk, index)
+            self._write(state, index)
+            return True
+
+    def release(self, chunk, worker_id, new_status):
+        """Writes the final status for a chunk, unless another worker has reclaimed it meanwhile."""
+        def update(target_chunk, index):
+            index.set_status(target_chunk, new_status)
+            for key in CLAIM_KEYS:
+                target_chunk.pop(key, None)
+        return self._update_owned(chunk, worker_id, update)
+
+    def heartbeat(self, chunk, worker_id):
+        return self._update_owned(chunk, worker_id, lambda c, index: c.__setitem__("heartbeat", time.time()))
+
+    def requeue_failed(self, resume_status, target_section_idx=None):
+        """
+        Puts FAILED chunks back in the queue with the status `resume_status(chunk)` returns
+        (PENDING or SYNTHESIZE). Returns the list of (chunk, new_status).
+        """
+        with state_lock(self.job_dir):
+            state, index = self._load_indexed()
+            if not state:
+                return []
+            requeued = []
+            for chunk in index.with_status("FAILED", target_section_idx):
+                index.set_status(chunk, resume_status(chunk))
+                requeued.append((dict(chunk), chunk["status"]))
+            if requeued:
+                self._write(state, index)
+            return requeued
+
+    def report(self):
+        with state_lock(self.job_dir):
+            state, index = self._load_indexed()
+        return index.summary(state) if state else None
+
+    def log_execution(self, entry):
+        with state_lock(self.job_dir):
+            state, index = None, None
+            try:
+                state, index = self._load_indexed()
+            except Exception:
+                pass
+            if state is None:
+                state = {}
+            state.setdefault("executions", []).append(entry)
+            self._write(state, index)
+
+class SqliteStateStore:
+    """
+    `state.db` backend. Chunks are rows indexed by status and section, so a claim or a status
+    update touches one row and `--report` is a single GROUP BY, independent of job size.
+    Chunk fields without a dedicated column are kept in the `extra` JSON column.
+    """
+
+    kind = "sqlite"
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+    CREATE TABLE IF NOT EXISTS sections (idx INTEGER PRIMARY KEY, name TEXT, extra TEXT);
+    CREATE TABLE IF NOT EXISTS chunks (
+        id INTEGER PRIMARY KEY,
+        chunk_id TEXT,
+        section_idx INTEGER NOT NULL,
+        start_page INTEGER NOT NULL,
+        end_page INTEGER NOT NULL,
+        status TEXT NOT NULL,
+        working_dir TEXT,
+        input_file TEXT,
+        text_file TEXT,
+        claimed_from TEXT,
+        claimed_by TEXT,
+        claimed_at REAL,
+        heartbeat REAL,
+        cost REAL,
+        extra TEXT
+    );
+    CREATE UNIQUE INDEX IF NOT EXISTS chunks_range ON chunks(start_page, end_page);
+    CREATE INDEX IF NOT EXISTS chunks_status ON chunks(status, id);
+    CREATE INDEX IF NOT EXISTS chunks_section_status ON chunks(section_idx, status, id);
+    CREATE TABLE IF NOT EXISTS executions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        datetime TEXT,
+        file TEXT,
+        args TEXT,
+        execution_time TEXT,
+        status TEXT,
+        message TEXT
+    );
+    """
+
+    COLUMNS = {
+        "id": "chunk_id",
+        "start": "start_page",
+        "end": "end_page",
+        "status": "status",
+        "working_dir": "working_dir",
+        "input_file": "input_file",
+        "text_file": "text_file",
+        "claimed_from": "claimed_from",
+        "claimed_by": "claimed_by",
+        "claimed_at": "claimed_at",
+        "heartbeat": "heartbeat",
+        "cost": "cost",
+    }
+
+    def __init__(self, job_dir):
+        self.job_dir = Path(job_dir)
+        self.path = self.job_dir / STATE_DB
+        self._conn = None
+
+    def exists(self):
+        return self.path.exists()
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            self.job_dir.mkdir(parents=True, exist_ok=True)
+            # Autocommit mode; write paths open explicit IMMEDIATE transactions.
+            self._conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+            self._conn.row_factory = sqlite3.Row
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(self.SCHEMA)
+            self._migrate(self._conn)
+        return self._conn
+
+    def _migrate(self, conn):
+        """Brings databases created by older planners up to the current schema."""
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(chunks)")}
+        if "cost" not in columns:
+            conn.execute("ALTER TABLE chunks ADD COLUMN cost REAL")
+        if "chunk_id" not in columns:
+            conn.execute("ALTER TABLE chunks ADD COLUMN chunk_id TEXT")
+            conn.execute("UPDATE chunks SET chunk_id = COALESCE(json_extract(extra, '$.id'), start_page || '_' || end_page)")
+        # Releases and heartbeats address a chunk by its stable id
+        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS chunks_chunk_id ON chunks(chunk_id)")
+        # `--largest-first` claims take the most expensive claimable chunk (see `ChunkIndex.next_chunk`)
+        conn.executescript("""
+        CREATE INDEX IF NOT EXISTS chunks_status_cost ON chunks(status, cost DESC, id);
+        CREATE INDEX IF NOT EXISTS chunks_section_status_cost ON chunks(section_idx, status, cost DESC, id);
+        """)
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    @contextmanager
+    def _transaction(self):
+        conn = self.conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _row_to_chunk(self, row):
+        chunk = {key: row[col] for key, col in self.COLUMNS.items() if row[col] is not None}
+        if row["extra"]:
+            chunk.update(json.loads(row["extra"]))
+        return chunk
+
+    def _chunk_to_row(self, chunk):
+        row = {col: chunk.get(key) for key, col in self.COLUMNS.items()}
+        row["chunk_id"] = chunk_id(chunk)
+        extra = {k: v for k, v in chunk.items() if k not in self.COLUMNS}
+        row["extra"] = json.dumps(extra) if extra else None
+        return row
+
+    def initialize(self, state):
+        """
+        Creates a fresh database from a `state.json`-shaped dict (replacing any previous plan) and retires
+        a `state.json` left in the job.
+        """
+        self.close()
+        for suffix in ("", "-wal", "-shm"):
+            Path(f"{self.path}{suffix}").unlink(missing_ok=True)
+        retire_state_file(self.job_dir / STATE_JSON)
+
+        with self._transaction() as conn:
+            for key, value in state.items():
+                if key in ("sections", "executions"):
+                    continue
+                conn.execute("INSERT INTO meta (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+
+            for idx, section in enumerate(state.get("sections", [])):
+                extra = {k: v for k, v in section.items() if k not in ("name", "chunks")}
+                conn.execute("INSERT INTO sections (idx, name, extra) VALUES (?, ?, ?)",
+                             (idx, section.get("name"), json.dumps(extra) if extra else None))
+                for chunk in section.get("chunks", []):
+                    row = self._chunk_to_row(chunk)
+                    row["section_idx"] = idx
+                    cols = ", ".join(row)
+                    conn.execute(f"INSERT INTO chunks ({cols}) VALUES ({', '.join('?' for _ in row)})", tuple(row.values()))
+
+            for entry in state.get("executions", []):
+                self._insert_execution(conn, entry)
+
+    def load(self):
+        """Materializes the full job state in the `state.json` layout."""
+        if not self.exists():
+            return None
+        conn = self.conn
+        state = {row["key"]: json.loads(row["value"]) for row in conn.execute("SELECT key, value FROM meta")}
+        sections = []
+        for row in conn.execute("SELECT idx, name, extra FROM sections ORDER BY idx"):
+            section = {"name": row["name"]}
+            if row["extra"]:
+                section.update(json.loads(row["extra"]))
+            section["chunks"] = []
+            sections.append(section)
+        for row in conn.execute("SELECT * FROM chunks ORDER BY id"):
+            sections[row["section_idx"]]["chunks"].append(self._row_to_chunk(row))
+        state["sections"] = sections
+        state["executions"] = [
+            {k: row[k] for k in ("datetime", "file", "args", "execution_time", "status", "message")}
+            for row in conn.execute("SELECT * FROM executions ORDER BY id")
+        ]
+        return state
+
+    def claim_next(self, synthesis_mode, target_section_idx, worker_id, stale_after, largest_first=False):
+        """Same contract as `JsonStateStore.claim_next`, as one IMMEDIATE transaction."""
+        if not self.exists():
+            return None, None, []
+
+        with self._transaction() as conn:
+            reclaimed = []
+            now = time.time()
+            for row in conn.execute("SELECT * FROM chunks WHERE status = 'IN_PROGRESS'").fetchall():
+                chunk = self._row_to_chunk(row)
+                if not is_chunk_stale(chunk, stale_after, now):
+                    continue
+                new_status = row["claimed_from"] or "PENDING"
+                conn.execute(
+                    "UPDATE chunks SET status = ?, claimed_from = NULL, claimed_by = NULL, claimed_at = NULL, heartbeat = NULL WHERE id = ?",
+                    (new_status, row["id"]))
+                chunk["status"] = new_status
+                reclaimed.append((chunk, row["claimed_by"]))
+
+            row = None
+            order = "cost DESC, id" if largest_first else "id"
+            for status in claimable_statuses(synthesis_mode):
+                if target_section_idx is not None:
+                    row = conn.execute(
+                        f"SELECT * FROM chunks WHERE section_idx = ? AND status = ? ORDER BY {order} LIMIT 1",
+                        (target_section_idx, status)).fetchone()
+                else:
+                    row = conn.execute(
+                        f"SELECT * FROM chunks WHERE status = ? ORDER BY {order} LIMIT 1", (status,)).fetchone()
+                if row:
+                    break
+            if not row:
+                return None, None, reclaimed
+
+            original_status = row["status"]
+            conn.execute(
+                "UPDATE chunks SET status = 'IN_PROGRESS', claimed_from = ?, claimed_by = ?, claimed_at = ?, heartbeat = ? WHERE id = ?",
+                (original_status, worker_id, now, now, row["id"]))
+            chunk = self._row_to_chunk(row)
+            chunk.update({"status": "IN_PROGRESS", "claimed_from": original_status,
+                          "claimed_by": worker_id, "claimed_at": now, "heartbeat": now})
+            return chunk, original_status, reclaimed
+
+    def release(self, chunk, worker_id, new_status):
+        cur = self.conn.execute(
+            "UPDATE chunks SET status = ?, claimed_from = NULL, claimed_by = NULL, claimed_at = NULL, heartbeat = NULL "
+            "WHERE chunk_id = ? AND claimed_by = ?",
+            (new_status, chunk_id(chunk), worker_id))
+        return cur.rowcount == 1
+
+    def heartbeat(self, chunk, worker_id):
+        cur = self.conn.execute(
+            "UPDATE chunks SET heartbeat = ? WHERE chunk_id = ? AND claimed_by = ?",
+            (time.time(), chunk_id(chunk), worker_id))
+        return cur.rowcount == 1
+
+    def requeue_failed(self, resume_status, target_section_idx=None):
+        """Same contract as `JsonStateStore.requeue_failed`."""
+        if not self.exists():
+            return []
+        requeued = []
+        with self._transaction() as conn:
+            query = "SELECT * FROM chunks WHERE status = 'FAILED'"
+            params = ()
+            if target_section_idx is not None:
+                query += " AND section_idx = ?"
+                params = (target_section_idx,)
+            for row in conn.execute(query + " ORDER BY id", params).fetchall():
+                chunk = self._row_to_chunk(row)
+                chunk["status"] = resume_status(chunk)
+                conn.execute("UPDATE chunks SET status = ? WHERE id = ?", (chunk["status"], row["id"]))
+                requeued.append((chunk, chunk["status"]))
+        return requeued
+
+    def report(self):
+        if not self.exists():
+            return None
+        conn = self.conn
+        rows = [[idx, name, {}] for idx, name in conn.execute("SELECT idx, name FROM sections ORDER BY idx")]
+        for section_idx, status, count in conn.execute(
+                "SELECT section_idx, status, COUNT(*) FROM chunks GROUP BY section_idx, status ORDER BY section_idx, MIN(id)"):
+            rows[section_idx][2][status] = count
+        return [tuple(r) for r in rows]
+
+    def _insert_execution(self, conn, entry):
+        conn.execute(
+            "INSERT INTO executions (datetime, file, args, execution_time, status, message) VALUES (?, ?, ?, ?, ?, ?)",
+            tuple(entry.get(k) for k in ("datetime", "file", "args", "execution_time", "status", "message")))
+
+    def log_execution(self, entry):
+        self._insert_execution(self.conn, entry)
+
+def default_backend(num_chunks):
+    """Backend for a new plan when none was requested: json for small plans, sqlite above `SQLITE_MIN_CHUNKS`."""
+    return "sqlite" if num_chunks > SQLITE_MIN_CHUNKS else "json"
+
+def create_state_store(job_dir, backend="json"):
+    if backend == "sqlite":
+        return SqliteStateStore(job_dir)
+    if backend == "json":
+        return JsonStateStore(job_dir)
+    raise ValueError(f"Unknown state backend: {backend} (expected one of {BACKENDS})")
+
+def open_state_store(job_dir):
+    """Opens the job's state store, preferring `state.db` when the job was planned with SQLite."""
+    if (Path(job_dir) / STATE_DB).exists():
+        return SqliteStateStore(job_dir)
+    return JsonStateStore(job_dir)
+
+def export_state_json(job_dir, output_path=None):
+    """Writes the job state in the legacy `state.json` layout (for tools that read the file directly)."""
+    store = open_state_store(job_dir)
+    state = store.load()
+    if state is None:
+        raise FileNotFoundError(f"No job state found in {job_dir}")
+    output_path = Path(output_path) if output_path else Path(job_dir) / STATE_JSON
+    write_json_atomic(output_path, state)
+    return output_path
+
+def migrate_state(job_dir, backend):
+    """Copies the current job state into `backend` and makes it the active store."""
+    source = open_state_store(job_dir)
+    if source.kind == backend:
+        print(f"[*] Job already uses the {backend} state backend.")
+        return source
+    state = source.load()
+    if state is None:
+        raise FileNotFoundError(f"No job state found in {job_dir}")
+    if isinstance(source, SqliteStateStore):
+        source.close()
+    # The new store's `initialize` renames the old backend's file to `<name>.migrated`
+    target = create_state_store(job_dir, backend)
+    target.initialize(state)
+    return target
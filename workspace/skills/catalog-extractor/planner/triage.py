@@ -0,0 +1,154 @@
+import re
+import sys
+import argparse
+from pathlib import Path
+
+try:
+    from planner.utils import count_table_lines
+    from planner.state import open_state_store
+except ImportError:
+    sys.path.append(str(Path(__file__).parent))
+    from utils import count_table_lines
+    from state import open_state_store
+
+# Cheap page triage from the pypdf text and planning stats, so pages that don't need the model don't get it.
+# The planner stores a `class` on every entry of a chunk's `pages`; with `run.py --triage` the runner maps
+# each class to a route (without it, every page goes to the model):
+#   llm:   full synthesis request (page image + text + Docling context)
+#   text:  the page's pypdf text is written as its fragment, no request
+#   image: the page image and its picture crops (with captions) are written as its fragment, no request
+#   skip:  the page is left out of the chunk's outputs, once the Docling export confirms it has no pictures
+#          or tables (otherwise it is handled as "image")
+# pypdf only counts raster images, so an "empty" page may still hold vector drawings: empty pages keep their
+# page image by default, and every chunk still goes through the Docling export.
+PAGE_CLASSES = ["spec_table", "narrative", "image_only", "empty"]
+ROUTES = ["llm", "text", "image", "skip"]
+DEFAULT_ROUTES = {"spec_table": "llm", "narrative": "text", "image_only": "image", "empty": "image"}
+
+# Fewer non-blank characters than this and no images: a blank or separator page
+EMPTY_MAX_CHARS = 20
+# Less text than this next to an image: cover, marketing spread or photo page
+IMAGE_ONLY_MAX_CHARS = 200
+# A spec table has at least this many table-like rows (see `count_table_lines`) making up this share of the lines
+SPEC_TABLE_MIN_LINES = 4
+SPEC_TABLE_MIN_SHARE = 0.25
+# ...or this many rows regardless of the surrounding text
+SPEC_TABLE_ALWAYS_LINES = 12
+
+# "Xtra-Guard Cable ......... 45": table of contents and index entries, which also look like table rows
+DOT_LEADER = re.compile(r"\.{3,}\s*\d+\s*$")
+
+def classify_page(text, stats=None):
+    """
+    Returns the page class for a page's pypdf `text` and planning `stats` ({"images", "table_lines"}, see
+    `page_stats`). When the image count is unknown (plans made before page stats), a page with little
+    text is treated as image_only rather than empty, so it is never dropped.
+    """
+    text = text or ""
+    stats = stats or {}
+    images = stats.get("images")
+    chars = len("".join(text.split()))
+    if chars < EMPTY_MAX_CHARS and images == 0:
+        return "empty"
+    if chars < IMAGE_ONLY_MAX_CHARS and images != 0:
+        return "image_only"
+
+    lines = [line for line in text.splitlines() if line.strip()]
+    if lines and sum(1 for line in lines if DOT_LEADER.search(line)) >= len(lines) / 2:
+        # Index / contents page
+        return "narrative"
+    table_lines = stats["table_lines"] if "table_lines" in stats else count_table_lines(text)
+    if table_lines >= SPEC_TABLE_ALWAYS_LINES or (table_lines >= SPEC_TABLE_MIN_LINES and table_lines >= SPEC_TABLE_MIN_SHARE * len(lines)):
+        return "spec_table"
+    return "narrative"
+
+def parse_routes(specs):
+    """Default routes overridden by CLASS=ROUTE strings (e.g. ["narrative=llm"]). Raises ValueError on bad input."""
+    routes = dict(DEFAULT_ROUTES)
+    for spec in specs or []:
+        page_class, sep, route = spec.partition("=")
+        page_class = page_class.strip().replace("-", "_")
+        route = route.strip()
+        if not sep or page_class not in PAGE_CLASSES or route not in ROUTES:
+            raise ValueError(f"Invalid route {spec!r}: expected CLASS=ROUTE with CLASS in {', '.join(PAGE_CLASSES)} "
+                             f"and ROUTE in {', '.join(ROUTES)}")
+        routes[page_class] = route
+    return routes
+
+def page_routes(chunk, routes=None):
+    """{page: route} for a chunk's classified pages; unclassified pages (older plans) are absent and go to the model."""
+    routes = routes or DEFAULT_ROUTES
+    return {p["page"]: routes.get(p["class"], "llm") for p in chunk.get("pages", []) if p.get("class")}
+
+def class_counts(chunks):
+    counts = {page_class: 0 for page_class in PAGE_CLASSES}
+    for chunk in chunks:
+        for p in chunk.get("pages", []):
+            if p.get("class") in counts:
+                counts[p["class"]] += 1
+    return counts
+
+def print_class_counts(counts):
+    total = sum(counts.values())
+    print("    Page Classes:   " + ", ".join(f"{page_class}={count}" for page_class, count in counts.items()))
+    if total and counts["image_only"] > total / 2:
+        # Scanned catalogs have no text layer: their spec tables only exist in the page images
+        print("    [!] Most pages have an image and almost no text (scanned catalog?); "
+              "if you run with --triage, add --route image_only=llm")
+
+def triage_job(job_dir):
+    """
+    (Re)classifies every page of an existing job from its chunks' `extract.md` and planning stats and writes
+    the classes to the job state. Chunks an earlier planner marked SKIPPED (empty pages only) go back to PENDING.
+    Returns the class counts. Refuses to run while chunks are IN_PROGRESS.
+    """
+    try:
+        from extract.page_text import open_page_text
+    except ImportError:
+        sys.path.append(str(Path(__file__).resolve().parent.parent))
+        from extract.page_text import open_page_text
+
+    store = open_state_store(job_dir)
+    state = store.load()
+    if state is None:
+        raise FileNotFoundError(f"No job state found in {job_dir}")
+    chunks = [chunk for section in state["sections"] for chunk in section["chunks"]]
+    if any(chunk.get("status") == "IN_PROGRESS" for chunk in chunks):
+        raise RuntimeError("Chunks are being processed; stop the runners before re-running triage.")
+
+    restored = 0
+    for chunk in chunks:
+        text_map = open_page_text(chunk["text_file"]) or {}
+        stats = {p["page"]: p for p in chunk.get("pages", [])}
+        pages = []
+        for page_num in range(chunk["start"], chunk["end"] + 1):
+            text = text_map.get(page_num)
+            if text is None and page_num not in stats:
+                # Past the end of the document
+                continue
+            entry = stats.get(page_num) or {"page": page_num}
+            entry["class"] = classify_page(text, entry)
+            pages.append(entry)
+        if hasattr(text_map, "close"):
+            text_map.close()
+        chunk["pages"] = pages
+        if chunk.get("status") == "SKIPPED":
+            chunk["status"] = "PENDING"
+            restored += 1
+
+    store.initialize(state)
+    counts = class_counts(chunks)
+    print(f"[+] Classified {sum(counts.values())} pages in {len(chunks)} chunks ({restored} SKIPPED chunks back to PENDING)")
+    print_class_counts(counts)
+    return counts
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Classify the pages of a planned job (spec_table, narrative, image_only, empty)")
+    parser.add_argument("job_dir", help="Path to the initialized job directory")
+    args = parser.parse_args()
+
+    try:
+        triage_job(args.job_dir)
+    except (FileNotFoundError, RuntimeError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
@@ -1,9 +1,16 @@
 
 from pathlib import Path
+from contextlib import contextmanager
 from pypdf import PdfWriter
 import json
+import time
 import datetime
 
+try:
+    from planner.state import open_state_store
+except ImportError:
+    from state import open_state_store
+
 def log_execution(job_dir, duration, status, message, file_name, args_str):
     if not job_dir: return
     try:
@@ -21,19 +28,7 @@ def log_execution(job_dir, duration, status, message, file_name, args_str):
         with open(jdir / "execution.log", "a") as f:
             f.write(log_line)
             
-        state_file = jdir / "state.json"
-        state = {}
-        if state_file.exists():
-            try:
-                with open(state_file, "r") as f:
-                    state = json.load(f)
-            except Exception:
-                pass
-                
-        if "executions" not in state:
-            state["executions"] = []
-            
-        state["executions"].append({
+        open_state_store(jdir).log_execution({
             "datetime": dt_str,
             "file": file_name,
             "args": args_str,
@@ -41,39 +36,98 @@ def log_execution(job_dir, duration, status, message, file_name, args_str):
             "status": status,
             "message": message
         })
-        
-        with open(state_file, "w") as f:
-            json.dump(state, f, indent=2)
     except Exception as e:
         print(f"Failed to log execution: {e}")
 
 
 
+@contextmanager
+def timed(timings, stage):
+    """Adds the wall time of the block to `timings[stage]` (seconds)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
+
+class PageTextCache:
+    """
+    Extracts each page's text from an open reader at most once.
+    Indices are 0-based, like `reader.pages`.
+    """
+
+    def __init__(self, reader):
+        self.reader = reader
+        self.texts = {}
+
+    def get(self, index):
+        if index not in self.texts:
+            self.texts[index] = self.reader.pages[index].extract_text()
+        return self.texts[index]
+
+# Relative cost of extracting one page, in "plain page" units: Docling's per-page work plus what grows
+# with the text (synthesis output), table rows (TableFormer, SKU rows) and embedded images (crops).
+PAGE_COST_WEIGHTS = {"base": 1.0, "per_1k_chars": 0.3, "per_table_line": 0.025, "per_image": 0.25}
+
+def count_table_lines(text):
+    """Lines that look like spec-table rows: three or more cells, at least two of them numeric."""
+    count = 0
+    for line in text.splitlines():
+        cells = line.split()
+        if len(cells) >= 3 and sum(any(ch.isdigit() for ch in cell) for cell in cells) >= 2:
+            count += 1
+    return count
+
+def page_stats(reader, text_cache, page_num):
+    """Planning stats for one page (1-based): text length, table-like lines, images and estimated cost."""
+    text = text_cache.get(page_num - 1) or ""
+    try:
+        images = len(reader.pages[page_num - 1].images)
+    except Exception:
+        images = 0
+    stats = {"page": page_num, "chars": len(text), "table_lines": count_table_lines(text), "images": images}
+    w = PAGE_COST_WEIGHTS
+    stats["cost"] = round(w["base"] + w["per_1k_chars"] * stats["chars"] / 1000
+                          + w["per_table_line"] * stats["table_lines"] + w["per_image"] * images, 3)
+    return stats
+
+def write_page_text_md(output_path, source, pages):
+    """
+    Writes the `extract.md` text dump. `pages` yields (real_page_num, text) in page order.
+    Also writes the `extract.idx.json` sidecar: the UTF-8 byte offset and length of each
+    page's text, so readers can mmap the dump and slice out one page (see extract/page_text.py).
+    """
+    output_path = Path(output_path)
+    index = {}
+    with open(output_path, "wb") as f:
+        f.write(f"# Raw Text Dump (pypdf)\nSource: {source}\n\n".encode("utf-8"))
+        for real_page_num, text in pages:
+            f.write(f"## Page {real_page_num}\n\n".encode("utf-8"))
+            data = text.encode("utf-8")
+            index[str(real_page_num)] = [f.tell(), len(data)]
+            f.write(data)
+            f.write(b"\n\n---\n\n")
+        size = f.tell()
+
+    with open(output_path.with_suffix(".idx.json"), "w") as f:
+        json.dump({"version": 1, "size": size, "pages": index}, f)
+
 def extract_pypdf_text(pdf_path, output_path, pages=None, page_offset=0):
     reader = PdfReader(pdf_path)
     
-    with open(output_path, "w") as f:
-        f.write(f"# Raw Text Dump (pypdf)\nSource: {pdf_path}\n\n")
-        
-        # Determine page range (0-indexed)
-        if pages:
-            start, end = pages
-            # Ensure within bounds
-            start = max(0, start - 1)  # User input 1-based -> 0-based
-            end = min(len(reader.pages), end)
-            page_indices = range(start, end)
-        else:
-            page_indices = range(len(reader.pages))
+    # Determine page range (0-indexed)
+    if pages:
+        start, end = pages
+        # Ensure within bounds
+        start = max(0, start - 1)  # User input 1-based -> 0-based
+        end = min(len(reader.pages), end)
+        page_indices = range(start, end)
+    else:
+        page_indices = range(len(reader.pages))
 
-        for i in page_indices:
-            page = reader.pages[i]
-            text = page.extract_text()
-            
-            real_page_num = i + 1 + page_offset
-            f.write(f"## Page {real_page_num}\n\n")
-            f.write(text)
-            f.write("\n\n---\n\n")
-            
+    write_page_text_md(output_path, pdf_path, (
+        (i + 1 + page_offset, reader.pages[i].extract_text()) for i in page_indices
+    ))
     print(f"Extracted pypdf text to: {output_path}")
 
 def slice_pdf_pages(reader, start_page: int, end_page: int, output_path: Path):
@@ -95,19 +149,23 @@ def slice_pdf_pages(reader, start_page: int, end_page: int, output_path: Path):
 import re
 from pypdf import PdfReader
 
-def map_catalog_structure(pdf_path) -> dict:
+def map_catalog_structure(pdf_path, reader=None, text_cache=None) -> dict:
     """
     Scans the PDF TOC to identify logical sections.
     Returns the structure dict.
+    Pass an already-open `reader` (and its `PageTextCache`) to avoid parsing the PDF again.
     """
-    reader = PdfReader(pdf_path)
+    if reader is None:
+        reader = PdfReader(pdf_path)
+    if text_cache is None:
+        text_cache = PageTextCache(reader)
     
     # TOC is usually on pages 2-3 (indices 1-2)
     # We'll scan a bit wider just in case: 1-5 (indices 0-4)
     toc_text = ""
     for i in range(0, min(5, len(reader.pages))):
         try:
-            text = reader.pages[i].extract_text()
+            text = text_cache.get(i)
             if text:
                 toc_text += text + "\n"
         except:
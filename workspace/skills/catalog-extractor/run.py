@@ -1,54 +1,54 @@
 
+import os
 import sys
 import json
 import time
+import socket
 import datetime
+import threading
 import traceback
 import argparse
+import multiprocessing
 from pathlib import Path
 
 # Add the current directory to sys.path so we can import from 'extract'
 sys.path.append(str(Path(__file__).parent))
 
 try:
-    from extract.export_assets import export_assets
-    from extract.skus import process_skus
-    from extract.synthesize import synthesize_catalog
-    from planner.utils import log_execution
+    from extract.export_assets import export_assets, get_converter, render_scale, DEFAULT_IMAGES_SCALE, DEFAULT_CROP_SCALE
+    from extract.skus import process_skus, metadata_input
+    from extract.synthesize import synthesize_catalog, MODEL_CONFIG
+    from extract.rate_limit import configure_rate_limiter
+    from extract.response_cache import open_response_cache, CACHE_MODES
+    from extract.images import make_image_profile, IMAGE_FORMATS, GRAYSCALE_MODES
+    from extract.artifact_writer import make_artifact_profile, ARTIFACT_FORMATS
+    from extract.fastpath import DEFAULT_MIN_CONFIDENCE
+    from extract.llm import BACKENDS as LLM_BACKENDS
+    from extract.metrics import open_metrics, load_metrics, summarize_metrics, write_prometheus_textfile, peak_rss_mb, METRICS_FILE, PROMETHEUS_FILE
+    from planner.utils import log_execution, timed
+    from planner.state import open_state_store, export_state_json, migrate_state, chunk_id, BACKENDS
+    from planner.triage import parse_routes, page_routes, PAGE_CLASSES, ROUTES
+    from pipeline import StagePipeline, print_pipeline_report
 except ImportError as e:
     print(f"Error importing modules: {e}")
     print("Ensure you are running this from the skills/catalog-extractor directory.")
     sys.exit(1)
 
-def load_state(job_dir):
-    state_path = Path(job_dir) / "state.json"
-    if not state_path.exists():
-        print(f"Error: state.json not found in {job_dir}")
-        return None
-    with open(state_path, "r") as f:
-        return json.load(f)
+# Seconds between heartbeats written by a worker for the chunk it holds.
+HEARTBEAT_INTERVAL = 30
+# An IN_PROGRESS chunk whose heartbeat is older than this is considered abandoned.
+DEFAULT_STALE_AFTER = 600
 
-def save_state(job_dir, state):
-    state_path = Path(job_dir) / "state.json"
-    with open(state_path, "w") as f:
-        json.dump(state, f, indent=2)
+def make_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
 
-def print_report(state):
+def print_report(report):
     print("\n=== Job State Report ===")
-    sections = state.get("sections", [])
-    if not sections:
+    if not report:
         print("No sections found in state.")
         return
         
-    for i, section in enumerate(sections):
-        title = section.get("title", f"Section {i}")
-        status_counts = {}
-        chunks = section.get("chunks", [])
-        
-        for chunk in chunks:
-            status = chunk.get("status", "UNKNOWN")
-            status_counts[status] = status_counts.get(status, 0) + 1
-            
+    for i, title, status_counts in report:
         # Format the counts summary
         counts_str = ", ".join([f"{status}: {count}" for status, count in status_counts.items()])
         if not counts_str:
@@ -57,41 +57,192 @@ def print_report(state):
         print(f"{i}: {title} - {counts_str}")
     print("========================\n")
 
-def find_next_chunk(state, synthesis_mode, target_section_idx=None):
-    """Finds the next chunk to process based on synthesis_mode and optional section index."""
-    sections = state.get("sections", [])
-    
-    # Priority 1: If include or skip, look for PENDING
-    if synthesis_mode in ["include", "skip"]:
-        for i, section in enumerate(sections):
-            if target_section_idx is not None and i != target_section_idx:
-                continue
-            for chunk in section.get("chunks", []):
-                if chunk.get("status") == "PENDING":
-                    return chunk
-
-    # Priority 2: If include or only, look for SYNTHESIZE
-    if synthesis_mode in ["include", "only"]:
-        for i, section in enumerate(sections):
-            if target_section_idx is not None and i != target_section_idx:
-                continue
-            for chunk in section.get("chunks", []):
-                if chunk.get("status") == "SYNTHESIZE":
-                    return chunk
-
-    return None
-
-def process_chunk(chunk, job_dir, original_status, synthesis_mode):
-    """Executes the extraction pipeline for a single chunk."""
-    
-    # Paths from State
-    chunk_dir = Path(chunk["working_dir"])
-    input_pdf = Path(chunk["input_file"])
+def print_perf_report(job_dir):
+    """Summarizes `metrics.jsonl` (p50/p95 per stage, API latency, throughput) and writes `metrics.prom`."""
+    job_dir = Path(job_dir)
+    records = load_metrics(job_dir / METRICS_FILE)
+    print("\n=== Performance Report ===")
+    if not records:
+        print(f"No metrics recorded yet ({job_dir / METRICS_FILE}).")
+        print("==========================\n")
+        return
+    summary = summarize_metrics(records)
+
+    def fmt(value):
+        return "-" if value is None else f"{value:.2f}"
+
+    print(f"{'stage':<28} {'count':>6} {'p50 s':>8} {'p95 s':>8} {'max s':>8} {'total s':>9}")
+    rows = list(summary["stages"].items()) + [("api request", summary["api_latency"]), ("rate-limit wait", summary["rate_limit_wait"])]
+    for name, dist in rows:
+        print(f"{name:<28} {dist['count']:>6} {fmt(dist['p50']):>8} {fmt(dist['p95']):>8} {fmt(dist['max']):>8} {dist['total']:>9.1f}")
+
+    pages, tokens, rate = summary["pages"], summary["tokens"], summary["pages_per_minute"]
+    print(f"Chunks: " + ", ".join(f"{status}: {count}" for status, count in summary["chunks"].items()))
+    print(f"Pages: {pages['exported']} exported, {pages['done']} synthesized ({pages['cached']} from cache), {pages['failed']} failed")
+    if pages.get("local") or pages.get("skipped"):
+        routes = ", ".join(f"{route} {count}" for route, count in summary["local_routes"].items())
+        print(f"Without the model: {pages.get('local', 0)} pages ({routes}), {pages.get('skipped', 0)} skipped | "
+              f"API calls avoided: {summary['api_calls_avoided']}")
+    print(f"Requests: {summary['requests']} ({summary['retries']} retries)")
+    print(f"Tokens: {tokens['input']:,} in / {tokens['output']:,} out ({fmt(tokens['input_per_page'])} / {fmt(tokens['output_per_page'])} per page)")
+    print(f"Throughput: {fmt(rate['exported'])} pages/min exported, {fmt(rate['synthesized'])} pages/min synthesized "
+          f"over {fmt(summary['wall_minutes'])} min of wall time")
+    print(f"Written: {summary['bytes_written'] / 1e6:.1f} MB | Peak RSS: {fmt(summary['peak_rss_mb'])} MB")
+    export_rss = summary["export_rss_mb"]
+    if export_rss["count"]:
+        print(f"Export peak RSS per chunk: p50 {fmt(export_rss['p50'])} MB, p95 {fmt(export_rss['p95'])} MB, max {fmt(export_rss['max'])} MB")
+    for name, stage in summary["pipeline"].items():
+        util = "-" if stage["utilization"] is None else f"{stage['utilization'] * 100:.0f}%"
+        print(f"Pipeline {name}: {stage['items']} chunks, {stage['workers']} workers, {util} utilized, queue max {stage['queue_max']}")
+    prom_path = write_prometheus_textfile(job_dir / PROMETHEUS_FILE, summary)
+    print(f"Prometheus textfile: {prom_path}")
+    print("==========================\n")
+
+class ChunkHeartbeat:
+    """Background thread that refreshes the claimed chunk's heartbeat while it is being processed."""
+
+    def __init__(self, job_dir, chunk, worker_id, interval=HEARTBEAT_INTERVAL):
+        self.job_dir = job_dir
+        self.chunk = chunk
+        self.worker_id = worker_id
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        # The store is opened in this thread: SQLite connections can't be shared across threads.
+        store = open_state_store(self.job_dir)
+        while not self._stop.wait(self.interval):
+            try:
+                if not store.heartbeat(self.chunk, self.worker_id):
+                    return
+            except Exception as e:
+                print(f"[!] Heartbeat update failed: {e}")
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+SOURCE_MODES = ["auto", "slice", "range"]
+
+def resolve_chunk_source(chunk, source_mode="auto", catalog_source=None):
+    """
+    Decides what Docling converts for a chunk: returns (pdf_path, page_offset, page_range).
+    - slice: the chunk's own sliced PDF; page 1 of the slice is real page `start`.
+    - range: pages `start`-`end` of the original catalog; Docling keeps real page numbers.
+    - auto:  whatever the planner produced (range if the chunk has a `page_range`).
+    """
+    if source_mode == "auto":
+        source_mode = "range" if chunk.get("page_range") else "slice"
+
+    if source_mode == "range":
+        pdf_path = chunk["input_file"] if chunk.get("page_range") else (catalog_source or chunk["input_file"])
+        return Path(pdf_path), 0, (chunk["start"], chunk["end"])
+
+    if chunk.get("page_range"):
+        raise ValueError(f"Chunk {chunk['start']}-{chunk['end']} was planned without a sliced PDF (--no-slice)")
+    # Offset calculation: 
+    #   Chunk Start: 8. 
+    #   Chunk PDF Page 1 -> Real Page 8.
+    #   Offset = 8 - 1 = 7.
+    return Path(chunk["input_file"]), chunk["start"] - 1, None
+
+def check_chunk_source(chunk, source_mode="auto", catalog_source=None):
+    """`resolve_chunk_source` plus an existence check; prints the problem and returns None if the chunk can't run."""
+    try:
+        input_pdf, page_offset, page_range = resolve_chunk_source(chunk, source_mode, catalog_source)
+    except ValueError as e:
+        print(f"CRITICAL: {e}")
+        return None
     
     # Ensure they exist (relative to job_dir if absolute paths fail, but state has absolute)
     if not input_pdf.exists():
         print(f"CRITICAL: Input PDF not found at {input_pdf}")
+        return None
+    return input_pdf, page_offset, page_range
+
+def export_stage(chunk_dir, input_pdf, page_offset, page_range, export_options=None, metrics=None, converter_slot=0):
+    """Step 1: Docling export of the chunk into `chunk_dir` (CPU-bound)."""
+    # Arguments: pdf_path, output_dir, page_offset, page_range
+    if page_range:
+        print(f"[1/3] Running Docling Export (Source Pages: {page_range[0]}-{page_range[1]})...")
+    else:
+        print(f"[1/3] Running Docling Export (Offset: {page_offset})...")
+    stage_timings = {}
+    with timed(stage_timings, "export"):
+        export_timings = export_assets(str(input_pdf), str(chunk_dir), page_offset=page_offset, page_range=page_range,
+                                       converter_slot=converter_slot, **(export_options or {}))
+    with open(chunk_dir / "export_stats.json", "r") as f:
+        export_stats = json.load(f)
+    print(f"    Docling: converter load {export_timings['converter_load']:.1f}s | "
+          f"conversion {export_timings['conversion']:.1f}s | artifacts {export_timings['artifacts']:.1f}s | "
+          f"peak RSS {export_stats.get('peak_rss_mb')} MB")
+    if metrics:
+        metrics.emit("stage", stage="export", seconds=round(stage_timings["export"], 3), pages=export_stats["pages"],
+                     timings={k: round(v, 3) for k, v in export_timings.items()},
+                     bytes_written=export_stats["disk_bytes"]["total"], peak_rss_mb=export_stats.get("peak_rss_mb"),
+                     windows=export_stats.get("windows"))
+
+def sku_stage(chunk_dir, page_offset, metrics=None):
+    """Step 2: SKU parsing of the chunk's Docling JSON."""
+    print(f"[2/3] Processing SKU Data...")
+    metadata_json = metadata_input(chunk_dir)
+    sku_output = chunk_dir / "sku_intermediate.jsonl"
+    stage_timings = {}
+    with timed(stage_timings, "skus"):
+        sku_count = process_skus(str(metadata_json), str(sku_output), page_offset=page_offset)
+    if metrics:
+        metrics.emit("stage", stage="skus", seconds=round(stage_timings["skus"], 3), skus=sku_count,
+                     bytes_written=sku_output.stat().st_size if sku_output.exists() else 0)
+
+def synthesis_stage(chunk, synthesis_options=None, metrics=None):
+    """
+    Step 3: LLM synthesis of the chunk's pages (network-bound). Returns the `synthesize_catalog` summary.
+    The `routes` option (class -> route, see planner/triage.py) decides which of the chunk's classified pages
+    are sent to the model; without it every page is.
+    """
+    print(f"[3/3] Synthesizing Final Output...")
+    options = dict(synthesis_options or {})
+    routes = options.pop("routes", None)
+    synthesis_started = time.perf_counter()
+    summary = synthesize_catalog(chunk["working_dir"], metrics=metrics, page_routes=page_routes(chunk, routes) if routes else None,
+                                 **options)
+    if metrics:
+        metrics.emit("stage", stage="synthesis", seconds=round(time.perf_counter() - synthesis_started, 3),
+                     pages=summary["pages"], synthesized=summary["synthesized"], reused=summary["reused"],
+                     failed=len(summary["failed"]), requests=summary["requests"], input_tokens=summary["input_tokens"],
+                     output_tokens=summary["output_tokens"], local=summary["local"], fastpath=summary["fastpath"],
+                     skipped=summary["skipped"], api_calls_avoided=summary["api_calls_avoided"], bytes_written=summary["bytes_written"])
+    return summary
+
+def synthesis_status(summary, duration):
+    if summary["failed"]:
+        # Completed pages are kept; a retry (--retry-failed) only resends the failed ones
+        print(f"=== Chunk Failed in {duration:.1f}s: pages {summary['failed']} could not be synthesized ===")
         return "FAILED"
+    print(f"=== Chunk Complete in {duration:.1f}s ===")
+    return "COMPLETED"
+
+def process_chunk(chunk, job_dir, original_status, synthesis_mode, synthesis_options=None, source_mode="auto", catalog_source=None,
+                  export_options=None, metrics=None):
+    """Executes the extraction pipeline for a single chunk. With a `metrics` sink, each stage emits a `stage` record."""
+    
+    # Paths from State
+    chunk_dir = Path(chunk["working_dir"])
+    source = check_chunk_source(chunk, source_mode, catalog_source)
+    if source is None:
+        return "FAILED"
+    input_pdf, page_offset, page_range = source
 
     print(f"\n=== Processing Chunk: {chunk['start']}-{chunk['end']} ===")
     print(f"Working Dir: {chunk_dir}")
@@ -102,21 +253,10 @@ def process_chunk(chunk, job_dir, original_status, synthesis_mode):
     try:
         if original_status == "PENDING":
             # Step 1: Docling Export (Heavy Lift)
-            # Arguments: pdf_path, output_dir, page_offset
-            # Offset calculation: 
-            #   Chunk Start: 8. 
-            #   Chunk PDF Page 1 -> Real Page 8.
-            #   Offset = 8 - 1 = 7.
-            page_offset = chunk["start"] - 1
-            
-            print(f"[1/3] Running Docling Export (Offset: {page_offset})...")
-            export_assets(str(input_pdf), str(chunk_dir), page_offset=page_offset)
+            export_stage(chunk_dir, input_pdf, page_offset, page_range, export_options, metrics)
 
             # Step 2: SKU Processing
-            print(f"[2/3] Processing SKU Data...")
-            metadata_json = chunk_dir / "metadata.json"
-            sku_output = chunk_dir / "sku_intermediate.jsonl"
-            process_skus(str(metadata_json), str(sku_output), page_offset=page_offset)
+            sku_stage(chunk_dir, page_offset, metrics)
 
             if synthesis_mode == "skip":
                 duration = time.time() - start_time
@@ -124,69 +264,241 @@ def process_chunk(chunk, job_dir, original_status, synthesis_mode):
                 return "SYNTHESIZE"
 
         # Step 3: Synthesis
-        print(f"[3/3] Synthesizing Final Output...")
-        synthesize_catalog(str(chunk_dir))
-        
-        duration = time.time() - start_time
-        print(f"=== Chunk Complete in {duration:.1f}s ===")
-        return "COMPLETED"
+        summary = synthesis_stage(chunk, synthesis_options, metrics)
+        return synthesis_status(summary, time.time() - start_time)
 
     except Exception as e:
         print(f"!!! Error processing chunk: {e}")
-        import traceback
         traceback.print_exc()
         return "FAILED"
 
-def run_job(job_dir, run_once=False, synthesis_mode="include", target_section_idx=None):
-    """Main loop to pick up pending jobs."""
+def run_job(job_dir, run_once=False, synthesis_mode="include", target_section_idx=None, stale_after=DEFAULT_STALE_AFTER,
+            synthesis_options=None, rate_limits=None, source_mode="auto", export_options=None, pipeline=None,
+            largest_first=False):
+    """
+    Main loop to pick up pending jobs.
+    `synthesis_options` are passed to `synthesize_catalog` and `export_options` (render profile) to
+    `export_assets`; `rate_limits` is this process's (requests_per_minute, tokens_per_minute) share of the API quota.
+    With `pipeline` (stage worker counts and queue size, see `run_pipeline`) the stages of consecutive chunks overlap.
+    Chunks are claimed in plan order, or the most expensive first with `largest_first`.
+    """
     job_dir = Path(job_dir).resolve()
+    worker_id = make_worker_id()
     print(f"[*] Starting Runner for Job: {job_dir}")
+    print(f"[*] Worker: {worker_id}")
     print(f"[*] Synthesis Mode: {synthesis_mode}")
     if target_section_idx is not None:
         print(f"[*] Target Section: {target_section_idx}")
+    if largest_first:
+        print("[*] Claim Order: largest estimated cost first")
+    if rate_limits:
+        configure_rate_limiter(*rate_limits)
+        print(f"[*] API Quota (this worker): {rate_limits[0]} RPM / {rate_limits[1]:,} TPM")
+    
+    store = open_state_store(job_dir)
+    if not store.exists():
+        print(f"Error: no job state (state.json / state.db) found in {job_dir}")
+        return
+    print(f"[*] State Backend: {store.kind} ({store.path.name})")
+    metrics = open_metrics(job_dir, worker_id)
+    catalog_source = None
+    if source_mode == "range":
+        catalog_source = store.load().get("catalog_source")
+        print(f"[*] Source Mode: range (converting pages of {catalog_source})")
+    
+    # Load Docling models once per runner process; every chunk reuses the warm converter
+    if synthesis_mode != "only":
+        export_options = export_options or {}
+        get_converter(render_scale(export_options.get("images_scale", DEFAULT_IMAGES_SCALE), export_options.get("archive_scale"),
+                                   export_options.get("crop_scale", DEFAULT_CROP_SCALE)))
+
+    if pipeline:
+        return run_pipeline(job_dir, store, worker_id, metrics, run_once, synthesis_mode, target_section_idx, stale_after,
+                            synthesis_options, source_mode, catalog_source, export_options, largest_first=largest_first, **pipeline)
     
     while True:
-        # 1. Load State
-        state = load_state(job_dir)
-        if not state: break
-        
-        # 2. Find Work
-        chunk = find_next_chunk(state, synthesis_mode, target_section_idx)
+        # 1. Find & Claim Work (atomic in the state store)
+        chunk, original_status, reclaimed = store.claim_next(synthesis_mode, target_section_idx, worker_id, stale_after, largest_first)
+        for stale_chunk, owner in reclaimed:
+            print(f"[*] Reclaimed stale chunk {stale_chunk['start']}-{stale_chunk['end']} from {owner or 'unknown worker'} -> {stale_chunk['status']}")
         
         if not chunk:
             print("[*] No chunks found matching criteria. Job Complete!")
             break
             
-        # 3. Mark IN_PROGRESS
-        original_status = chunk.get("status", "PENDING")
-        print(f"[*] Claiming Chunk {chunk['start']}-{chunk['end']} (Status: {original_status})...")
-        chunk["status"] = "IN_PROGRESS"
-        save_state(job_dir, state)
+        print(f"[*] [{worker_id}] Claimed Chunk {chunk['start']}-{chunk['end']} (Status: {original_status})...")
         
-        # 4. Execute
-        new_status = process_chunk(chunk, job_dir, original_status, synthesis_mode)
+        # 2. Execute (heartbeat keeps the claim alive for other workers)
+        chunk_metrics = metrics.bind(chunk=chunk_id(chunk))
+        chunk_started = time.time()
+        with ChunkHeartbeat(job_dir, chunk, worker_id):
+            new_status = process_chunk(chunk, job_dir, original_status, synthesis_mode, synthesis_options,
+                                       source_mode, catalog_source, export_options, chunk_metrics)
+        chunk_metrics.emit("chunk", status=new_status, original_status=original_status,
+                           seconds=round(time.time() - chunk_started, 3), peak_rss_mb=peak_rss_mb())
         
-        # 5. Update Status
-        # Reload state to avoid overwriting concurrent changes (if any)
-        state = load_state(job_dir)
-        # Find the chunk again to update it
-        # (This is a simple linear search re-match)
-        target_chunk = None
-        for s in state["sections"]:
-            for c in s["chunks"]:
-                if c["start"] == chunk["start"] and c["end"] == chunk["end"]:
-                    target_chunk = c
-                    break
-            if target_chunk: break
-            
-        if target_chunk:
-            target_chunk["status"] = new_status
-            save_state(job_dir, state)
+        # 3. Update Status
+        if not store.release(chunk, worker_id, new_status):
+            print(f"[!] Chunk {chunk['start']}-{chunk['end']} was reclaimed by another worker; not overwriting status.")
             
         if run_once:
             print("[*] Single run mode complete.")
             break
 
+def run_pipeline(job_dir, store, worker_id, metrics, run_once, synthesis_mode, target_section_idx, stale_after,
+                 synthesis_options=None, source_mode="auto", catalog_source=None, export_options=None,
+                 largest_first=False, export_workers=1, sku_workers=1, synthesis_workers=2, queue_size=2):
+    """
+    Runs the chunk stages as a pipeline (export -> skus -> synthesis) with `*_workers` threads per stage and
+    at most `queue_size` chunks waiting in front of each, so the next chunk's Docling export runs while the
+    previous chunk's pages wait on the API. Chunks are claimed only when the pipeline has room for them;
+    SYNTHESIZE chunks go straight to the synthesis stage. Prints (and records in metrics.jsonl) the stage
+    utilization and queue depths at the end.
+    """
+
+    def init(stage, index):
+        # Per thread: SQLite connections can't be shared across threads, and each export thread converts
+        # with its own warm converter
+        return {"store": open_state_store(job_dir), "slot": index}
+
+    def export(job, context):
+        chunk = job["chunk"]
+        print(f"[*] [export] Chunk {chunk['start']}-{chunk['end']}")
+        input_pdf, page_offset, page_range = job["source"]
+        export_stage(Path(chunk["working_dir"]), input_pdf, page_offset, page_range, export_options, job["metrics"],
+                     converter_slot=context["slot"])
+        return job
+
+    def skus(job, context):
+        chunk = job["chunk"]
+        print(f"[*] [skus] Chunk {chunk['start']}-{chunk['end']}")
+        sku_stage(Path(chunk["working_dir"]), job["source"][1], job["metrics"])
+        if synthesis_mode == "skip":
+            print(f"=== Chunk {chunk['start']}-{chunk['end']} Extraction Complete in {time.time() - job['started']:.1f}s (Synthesis Skipped) ===")
+            job["status"] = "SYNTHESIZE"
+            return None
+        return job
+
+    def synthesis(job, context):
+        chunk = job["chunk"]
+        print(f"[*] [synthesis] Chunk {chunk['start']}-{chunk['end']}")
+        summary = synthesis_stage(chunk, synthesis_options, job["metrics"])
+        job["status"] = synthesis_status(summary, time.time() - job["started"])
+        return None
+
+    def finish(job, context, error):
+        chunk = job["chunk"]
+        job["heartbeat"].stop()
+        new_status = "FAILED" if error else job["status"]
+        job["metrics"].emit("chunk", status=new_status, original_status=job["original_status"],
+                            seconds=round(time.time() - job["started"], 3), peak_rss_mb=peak_rss_mb())
+        if not context["store"].release(chunk, worker_id, new_status):
+            print(f"[!] Chunk {chunk['start']}-{chunk['end']} was reclaimed by another worker; not overwriting status.")
+
+    stages = [("export", export, export_workers), ("skus", skus, sku_workers), ("synthesis", synthesis, synthesis_workers)]
+    if synthesis_mode == "only":
+        stages = stages[2:]
+    elif synthesis_mode == "skip":
+        stages = stages[:2]
+    runner = StagePipeline(stages, queue_size, init=init, on_exit=finish).start()
+    print(f"[*] Pipeline: " + ", ".join(f"{name} x{workers}" for name, _, workers in stages) + f" | queue size {queue_size}")
+
+    while True:
+        runner.acquire()
+        chunk, original_status, reclaimed = store.claim_next(synthesis_mode, target_section_idx, worker_id, stale_after, largest_first)
+        for stale_chunk, owner in reclaimed:
+            print(f"[*] Reclaimed stale chunk {stale_chunk['start']}-{stale_chunk['end']} from {owner or 'unknown worker'} -> {stale_chunk['status']}")
+        if not chunk:
+            runner.release()
+            print("[*] No more chunks to claim; draining the pipeline.")
+            break
+
+        print(f"[*] [{worker_id}] Claimed Chunk {chunk['start']}-{chunk['end']} (Status: {original_status})...")
+        source = check_chunk_source(chunk, source_mode, catalog_source) if original_status == "PENDING" else None
+        if original_status == "PENDING" and source is None:
+            store.release(chunk, worker_id, "FAILED")
+            runner.release()
+        else:
+            job = {
+                "chunk": chunk,
+                "original_status": original_status,
+                "source": source,
+                "metrics": metrics.bind(chunk=chunk_id(chunk)),
+                "started": time.time(),
+                "status": None,
+                "heartbeat": ChunkHeartbeat(job_dir, chunk, worker_id).start(),
+            }
+            runner.submit(job, "export" if original_status == "PENDING" else "synthesis")
+
+        if run_once:
+            break
+
+    runner.close()
+    report = runner.report()
+    print_pipeline_report(report)
+    metrics.emit("pipeline", **report)
+    print("[*] Job Complete!")
+
+def resume_status(chunk):
+    """Where a FAILED chunk restarts: synthesis only if its Docling export and SKU data are already on disk."""
+    chunk_dir = Path(chunk["working_dir"])
+    if metadata_input(chunk_dir).exists() and (chunk_dir / "sku_intermediate.jsonl").exists():
+        return "SYNTHESIZE"
+    return "PENDING"
+
+def requeue_failed_chunks(job_dir, target_section_idx=None):
+    store = open_state_store(job_dir)
+    requeued = store.requeue_failed(resume_status, target_section_idx)
+    for chunk, new_status in requeued:
+        print(f"[*] Retrying failed chunk {chunk['start']}-{chunk['end']} -> {new_status}")
+    if not requeued:
+        print("[*] No failed chunks to retry.")
+
+def pipeline_options(args):
+    if not args.pipeline:
+        return None
+    return {"export_workers": args.export_workers, "sku_workers": args.sku_workers,
+            "synthesis_workers": args.synthesis_workers, "queue_size": args.queue_size}
+
+def _worker_main(job_dir, options):
+    try:
+        run_job(job_dir, **options)
+    except KeyboardInterrupt:
+        pass
+
+def run_workers(job_dir, workers, requests_per_minute=None, tokens_per_minute=None, **options):
+    """
+    Runs `workers` independent runner processes against the same job.
+    Each worker claims chunks atomically, so they never process the same chunk twice.
+    The API quota is split evenly between workers (each process has its own rate limiter).
+    """
+    workers = max(1, workers)
+    requests_per_minute = requests_per_minute or MODEL_CONFIG["requests_per_minute"]
+    tokens_per_minute = tokens_per_minute or MODEL_CONFIG["tokens_per_minute"]
+    options["rate_limits"] = (max(1, requests_per_minute // workers), max(1, tokens_per_minute // workers))
+
+    if workers == 1:
+        return run_job(job_dir, **options)
+
+    # Split the CPU between workers so Docling/torch threads don't oversubscribe the box.
+    os.environ.setdefault("OMP_NUM_THREADS", str(max(1, (os.cpu_count() or 1) // workers)))
+
+    print(f"[*] Starting {workers} workers for Job: {Path(job_dir).resolve()}")
+    ctx = multiprocessing.get_context("spawn")
+    procs = []
+    for _ in range(workers):
+        proc = ctx.Process(target=_worker_main, args=(job_dir, options))
+        proc.start()
+        procs.append(proc)
+
+    failed = 0
+    for proc in procs:
+        proc.join()
+        if proc.exitcode != 0:
+            failed += 1
+    if failed:
+        raise RuntimeError(f"{failed} of {workers} workers exited with an error")
+    print(f"[*] All {workers} workers finished.")
 
 
 if __name__ == "__main__":
@@ -195,9 +507,50 @@ if __name__ == "__main__":
     parser.add_argument("--once", action="store_true", help="Process only one chunk and exit")
     parser.add_argument("--synthesis", type=str, choices=["skip", "only", "include"], default="include", help="Synthesis mode: skip, only, or include (default)")
     parser.add_argument("--report", action="store_true", help="Print a summary report of the state and exit")
+    parser.add_argument("--perf", action="store_true", help="With --report: also summarize metrics.jsonl (p50/p95 per stage, throughput) and write metrics.prom")
     parser.add_argument("--section", type=int, help="Only process chunks within this specific section index (e.g., 0)")
+    parser.add_argument("--workers", type=int, default=1, help="Number of parallel worker processes (default: 1)")
+    parser.add_argument("--pipeline", action="store_true", help="Overlap the stages of consecutive chunks: export, SKU parsing and synthesis run in their own worker threads connected by bounded queues")
+    parser.add_argument("--export-workers", type=int, default=1, help="With --pipeline: Docling export threads per worker process (default: 1)")
+    parser.add_argument("--sku-workers", type=int, default=1, help="With --pipeline: SKU parsing threads per worker process (default: 1)")
+    parser.add_argument("--synthesis-workers", type=int, default=2, help="With --pipeline: chunks synthesized at once per worker process (default: 2)")
+    parser.add_argument("--queue-size", type=int, default=2, help="With --pipeline: chunks waiting in front of each stage (default: 2)")
+    parser.add_argument("--source-mode", choices=SOURCE_MODES, default="auto", help="What Docling converts: slice (per-chunk PDFs), range (page ranges of the original catalog) or auto (as planned, default)")
+    parser.add_argument("--render-scale", type=float, default=DEFAULT_IMAGES_SCALE, help=f"Resolution of exported page images, in pixels per PDF point (default: {DEFAULT_IMAGES_SCALE}, env EXPORT_IMAGES_SCALE)")
+    parser.add_argument("--crop-scale", type=float, default=DEFAULT_CROP_SCALE, help=f"Resolution of the picture crops embedded in catalog.md (default: {DEFAULT_CROP_SCALE}, env EXPORT_CROP_SCALE)")
+    parser.add_argument("--export-window", type=int, help="Stream the Docling export N pages at a time, writing and freeing each window's images before the next (bounds memory per chunk)")
+    parser.add_argument("--archive-scale", type=float, help="Also keep full-size page images at this scale in images/archive/ (off by default)")
+    parser.add_argument("--artifact-format", choices=list(ARTIFACT_FORMATS), help="Format of exported page images and crops (default: png, env EXPORT_IMAGE_FORMAT)")
+    parser.add_argument("--artifact-compression", type=int, help="PNG zlib level of exported images, 0-9 (default: 6, env EXPORT_PNG_COMPRESSION; 1 is much faster)")
+    parser.add_argument("--artifact-quality", type=int, help="WebP/JPEG quality of exported images, 1-100 (default: 90, env EXPORT_IMAGE_QUALITY)")
+    parser.add_argument("--artifact-writers", type=int, help="Background threads encoding exported images per export, 0 to write inline (default: min(4, CPUs), env EXPORT_WRITER_THREADS)")
+    parser.add_argument("--synthesis-concurrency", type=int, help=f"Pages in flight per chunk during synthesis (default: {MODEL_CONFIG['concurrency']}, env SYNTHESIS_CONCURRENCY)")
+    parser.add_argument("--batch-pages", type=int, default=1, help="Pack up to N consecutive pages into one synthesis request (default: 1 = one page per request)")
+    parser.add_argument("--image-scale", type=float, help="Resolution of page images sent to the model, in pixels per PDF point (default: 1.0, env SYNTHESIS_IMAGE_SCALE)")
+    parser.add_argument("--image-format", choices=list(IMAGE_FORMATS), help="Encoding of page images sent to the model (default: png, env SYNTHESIS_IMAGE_FORMAT)")
+    parser.add_argument("--image-quality", type=int, help="JPEG/WebP quality, 1-100 (default: 85, env SYNTHESIS_IMAGE_QUALITY)")
+    parser.add_argument("--grayscale", choices=GRAYSCALE_MODES, help="Send page images in grayscale: on, off (default, env SYNTHESIS_IMAGE_GRAYSCALE) or auto (line-art pages only)")
+    parser.add_argument("--backend", choices=LLM_BACKENDS, help="LLM backend for synthesis: gemini (default, env LLM_BACKEND), openai (OpenAI-compatible endpoint at $LLM_BASE_URL, e.g. vLLM/llama.cpp) or stub (offline canned output)")
+    parser.add_argument("--triage", action="store_true", help="Route pages by the planner's page class (see --route) instead of sending every page to the model")
+    parser.add_argument("--route", action="append", metavar="CLASS=ROUTE", help=f"With --triage (implied): override where a page class goes (repeatable): CLASS in {', '.join(PAGE_CLASSES)}, ROUTE in {', '.join(ROUTES)} (default: spec_table=llm narrative=text image_only=image empty=image)")
+    parser.add_argument("--fastpath", action="store_true", help="Render model-routed pages whose spec tables Docling parsed cleanly from those tables instead of sending them (off by default)")
+    parser.add_argument("--fastpath-min-confidence", type=float, default=DEFAULT_MIN_CONFIDENCE, help=f"With --fastpath: share of a page's rows that must pass the column, SKU, text, shift and uniqueness checks (default: {DEFAULT_MIN_CONFIDENCE})")
+    parser.add_argument("--rpm", type=int, help=f"API requests-per-minute quota shared by all workers (default: {MODEL_CONFIG['requests_per_minute']}, env GEMINI_RPM)")
+    parser.add_argument("--tpm", type=int, help=f"API tokens-per-minute quota shared by all workers (default: {MODEL_CONFIG['tokens_per_minute']:,}, env GEMINI_TPM)")
+    parser.add_argument("--cache", choices=CACHE_MODES, default="use", help="Synthesis response cache: use (default), refresh (ignore and overwrite cached responses) or off (bypass)")
+    parser.add_argument("--cache-dir", help="Synthesis response cache directory (default: $SYNTHESIS_CACHE_DIR or ~/.cache/catalog-extractor/synthesis)")
+    parser.add_argument("--cache-max-mb", type=int, help="Evict least recently used cache entries above this size (default: $SYNTHESIS_CACHE_MAX_MB or 1024)")
+    parser.add_argument("--clear-cache", action="store_true", help="Delete every entry in the synthesis response cache and exit")
+    parser.add_argument("--export-state", nargs="?", const="", metavar="PATH", help="Write the job state in the state.json layout (default: <job_dir>/state.json) and exit")
+    parser.add_argument("--migrate-state", choices=BACKENDS, help="Copy the job state into another backend (json or sqlite), make it active and exit")
+    parser.add_argument("--retry-failed", action="store_true", help="Put FAILED chunks back in the queue before running (synthesis-only if their export is on disk)")
+    parser.add_argument("--force-synthesis", action="store_true", help="Resynthesize every page of each chunk, even pages whose inputs are unchanged")
+    parser.add_argument("--largest-first", action="store_true", help="Claim the chunk with the highest estimated cost (recorded by the planner) first instead of in plan order, so a dense chunk doesn't finish last")
+    parser.add_argument("--stale-after", type=int, default=DEFAULT_STALE_AFTER, help=f"Seconds without a heartbeat before an IN_PROGRESS chunk is reclaimed (default: {DEFAULT_STALE_AFTER})")
     
     args = parser.parse_args()
+    if not 0 < args.fastpath_min_confidence <= 1:
+        parser.error("--fastpath-min-confidence must be in (0, 1]")
     
     start_time = time.time()
     file_name = Path(sys.argv[0]).name
@@ -207,13 +560,47 @@ if __name__ == "__main__":
     
     try:
         if args.report:
-            state = load_state(args.job_dir)
-            if state:
-                print_report(state)
+            report = open_state_store(args.job_dir).report()
+            if report is not None:
+                print_report(report)
             else:
                 print(f"Could not load state from {args.job_dir}")
+            if args.perf:
+                print_perf_report(args.job_dir)
+        elif args.clear_cache:
+            cache = open_response_cache(args.cache_dir)
+            removed = cache.clear()
+            print(f"[*] Removed {removed} cached responses from {cache.cache_dir}")
+        elif args.export_state is not None:
+            output_path = export_state_json(args.job_dir, args.export_state or None)
+            print(f"[*] Exported job state to: {output_path}")
+        elif args.migrate_state:
+            store = migrate_state(args.job_dir, args.migrate_state)
+            print(f"[*] Job state now stored in: {store.path}")
         else:
-            run_job(args.job_dir, run_once=args.once, synthesis_mode=args.synthesis, target_section_idx=args.section)
+            if args.retry_failed:
+                # Once, before any worker starts, so a chunk that fails again isn't retried in a loop
+                requeue_failed_chunks(args.job_dir, args.section)
+            run_workers(args.job_dir, args.workers, requests_per_minute=args.rpm, tokens_per_minute=args.tpm,
+                        run_once=args.once, synthesis_mode=args.synthesis, target_section_idx=args.section,
+                        stale_after=args.stale_after, largest_first=args.largest_first, source_mode=args.source_mode,
+                        pipeline=pipeline_options(args),
+                        export_options={"images_scale": args.render_scale, "crop_scale": args.crop_scale, "archive_scale": args.archive_scale,
+                                        "window_pages": args.export_window,
+                                        "artifact_profile": make_artifact_profile(args.artifact_format, args.artifact_compression,
+                                                                                  args.artifact_quality, args.artifact_writers)},
+                        synthesis_options={
+                            "concurrency": args.synthesis_concurrency,
+                            "cache_mode": args.cache,
+                            "cache_dir": args.cache_dir,
+                            "cache_max_mb": args.cache_max_mb,
+                            "batch_pages": args.batch_pages,
+                            "image_profile": make_image_profile(args.image_scale, args.grayscale, args.image_format, args.image_quality),
+                            "force": args.force_synthesis,
+                            "backend": args.backend,
+                            "routes": parse_routes(args.route) if args.triage or args.route else None,
+                            "fastpath": args.fastpath_min_confidence if args.fastpath else None,
+                        })
     except Exception as e:
         status = "FAILURE"
         message = traceback.format_exc()
@@ -0,0 +1,6 @@
+import sys
+from pathlib import Path
+
+# Tests import the planner and extract modules the way run.py does, from the skill directory.
+# None of the modules under test import Docling, so the suite runs without the export stack installed.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,66 @@
+import os
+import time
+
+import PIL.Image
+import pytest
+
+from extract.artifact_writer import ArtifactWriteError, ArtifactWriter, make_artifact_profile
+from extract.images import ImageEncoder, make_image_profile
+
+def noise(size=(120, 90)):
+    return PIL.Image.frombytes("RGB", size, os.urandom(size[0] * size[1] * 3))
+
+@pytest.mark.parametrize("workers", [0, 3])
+def test_pool_and_inline_writes_match(tmp_path, workers):
+    images = [noise() for _ in range(6)]
+    with ArtifactWriter(make_artifact_profile(workers=workers), max_pending=2) as writer:
+        paths = [writer.save(image, tmp_path / f"page_{i}.png") for i, image in enumerate(images)]
+        writer.flush()
+    assert [PIL.Image.open(p).tobytes() for p in paths] == [image.tobytes() for image in images]
+    assert writer.stats["images"] == 6 and writer.stats["bytes"] == sum(p.stat().st_size for p in paths)
+
+def test_format_change_replaces_the_old_file(tmp_path):
+    with ArtifactWriter(make_artifact_profile(workers=0)) as writer:
+        writer.save(noise(), tmp_path / "page_1.png")
+    with ArtifactWriter(make_artifact_profile(fmt="webp", quality=80, workers=0)) as writer:
+        path = writer.save(noise(), tmp_path / "page_1.png", resize=(60, 45))
+    assert path.name == "page_1.webp" and PIL.Image.open(path).size == (60, 45)
+    assert not (tmp_path / "page_1.png").exists()
+
+def test_flush_reports_failed_writes(tmp_path):
+    with ArtifactWriter(make_artifact_profile(workers=2)) as writer:
+        writer.save(noise(), tmp_path / "missing" / "page_1.png")
+        writer.save(noise(), tmp_path / "page_2.png")
+        with pytest.raises(ArtifactWriteError, match="page_1.png"):
+            writer.flush()
+    assert (tmp_path / "page_2.png").exists()
+
+def test_profile_validation():
+    with pytest.raises(ValueError):
+        make_artifact_profile(fmt="tiff")
+    with pytest.raises(ValueError):
+        make_artifact_profile(compress_level=10)
+
+def test_encoded_cache_is_pruned_to_its_budget(tmp_path):
+    pages = []
+    for i in range(6):
+        noise((200, 200)).save(tmp_path / f"page_{i}.png")
+        pages.append(tmp_path / f"page_{i}.png")
+    encoder = ImageEncoder(tmp_path, make_image_profile(scale=1.0))
+    for page in pages:
+        encoder.get(page)
+    entries = sorted(encoder.cache_dir.glob("*.png"))
+    # Oldest first: pages 0..5
+    for age, entry in enumerate(sorted(entries, key=lambda p: p.name)):
+        stamp = time.time() - 100 + age
+        os.utime(entry, (stamp, stamp))
+        os.utime(entry.with_suffix(".json"), (stamp, stamp))
+    per_entry = sum(p.stat().st_size for p in encoder.cache_dir.iterdir()) / 6
+    encoder.max_bytes = int(per_entry * 3.5)
+    encoder.close()
+
+    remaining = sorted(p.name.split(".")[0] for p in encoder.cache_dir.glob("*.png"))
+    assert encoder.summary()["evicted"] == 3
+    assert remaining == ["page_3", "page_4", "page_5"]
+    # Payload and metadata go together
+    assert len(list(encoder.cache_dir.glob("*.json"))) == 3
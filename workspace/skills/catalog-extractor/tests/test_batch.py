@@ -0,0 +1,81 @@
+import json
+
+import PIL.Image
+import pytest
+
+from extract.llm import LLMResponse
+from extract.rate_limit import RateLimiter
+from extract.synthesize import plan_batches, prepare_page, synthesize_batch
+
+class ScriptedBackend:
+    """Answers requests in order from a list of (text, finish_reason)."""
+    model_id = "stub-model"
+
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.prompts = []
+
+    def generate(self, prompt, images, config):
+        self.prompts.append((prompt, len(images)))
+        text, finish_reason = self.replies.pop(0)
+        return LLMResponse(text, 900, 300, finish_reason)
+
+def page_json(page):
+    return {"page": page, "markdown_content": f"# Page {page}", "skus": [{"sku": f"{page}000"}]}
+
+def single(page):
+    entry = page_json(page)
+    del entry["page"]
+    return json.dumps(entry), "STOP"
+
+@pytest.fixture
+def page_inputs(tmp_path):
+    inputs = []
+    for page in (4, 5, 6):
+        img_path = tmp_path / f"page_{page}.png"
+        PIL.Image.new("RGB", (60, 80), "white").save(img_path)
+        inputs.append(prepare_page(page, img_path, {page: f"Text of page {page}"}, {}, {}))
+    return inputs
+
+def run(page_inputs, backend):
+    results = synthesize_batch(page_inputs, RateLimiter(), backend=backend)
+    return {r["page"]: r for r in results}
+
+def test_one_request_for_the_whole_batch(page_inputs):
+    backend = ScriptedBackend([(json.dumps({"pages": [page_json(p) for p in (4, 5, 6)]}), "STOP")])
+    results = run(page_inputs, backend)
+    assert [len(backend.prompts), backend.prompts[0][1]] == [1, 3]
+    assert [results[p]["markdown"] for p in (4, 5, 6)] == ["# Page 4", "# Page 5", "# Page 6"]
+    assert all(r["batch"] == [4, 5, 6] for r in results.values())
+    # Batch usage is split over the pages it produced
+    assert results[4]["input_tokens"] == pytest.approx(300)
+
+def test_missing_pages_fall_back_to_single_requests(page_inputs):
+    backend = ScriptedBackend([(json.dumps({"pages": [page_json(4), page_json(6)]}), "STOP"), single(5)])
+    results = run(page_inputs, backend)
+    assert len(backend.prompts) == 2 and backend.prompts[1][1] == 1
+    assert results[5]["markdown"] == "# Page 5" and results[5]["batch"] == [5]
+    assert results[4]["input_tokens"] == pytest.approx(450)
+
+def test_truncated_batch_is_redone_page_by_page(page_inputs):
+    backend = ScriptedBackend([(json.dumps({"pages": [page_json(4)]}), "MAX_TOKENS"), single(4), single(5), single(6)])
+    results = run(page_inputs, backend)
+    assert len(backend.prompts) == 4
+    assert all(results[p]["batch"] == [p] and not results[p]["error"] for p in (4, 5, 6))
+
+def test_unparseable_batch_is_billed_and_redone(page_inputs):
+    backend = ScriptedBackend([("not json", "STOP"), single(4), single(5), ("still not json", "STOP")])
+    results = run(page_inputs, backend)
+    assert len(backend.prompts) == 4
+    assert results[6]["error"] and not results[4]["error"]
+    # The wasted batch request is charged to the first page
+    assert results[4]["wasted_input_tokens"] == 900
+
+def test_plan_batches_respects_size():
+    inputs = [{"page": p, "sku_rows": 0, "raw_text": ""} for p in range(1, 8)]
+    assert [[p["page"] for p in batch] for batch in plan_batches(inputs, 3)] == [[1, 2, 3], [4, 5, 6], [7]]
+
+def test_plan_batches_closes_early_on_output_budget():
+    # Each page's estimated response (~3900 tokens) is more than half of the 80% output budget
+    inputs = [{"page": p, "sku_rows": 40, "raw_text": "x" * 1500} for p in range(1, 6)]
+    assert [[p["page"] for p in batch] for batch in plan_batches(inputs, 4)] == [[1], [2], [3], [4], [5]]
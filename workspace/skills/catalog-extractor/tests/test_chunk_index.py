@@ -0,0 +1,63 @@
+import random
+
+import pytest
+from pypdf import PdfWriter
+
+import planner.plan as plan
+from benchmarks.bench_scheduler import find_next_chunk, make_state, summarize_sections
+from planner.plan import initialize_job
+from planner.state import SQLITE_MIN_CHUNKS, ChunkIndex, default_backend
+
+STATUSES = ["PENDING", "SYNTHESIZE", "IN_PROGRESS", "DONE", "FAILED"]
+
+@pytest.mark.parametrize("largest_first", [False, True])
+def test_index_agrees_with_linear_scans(largest_first):
+    """Random transitions: every claim and report matches a scan of the whole state."""
+    rng = random.Random(7)
+    state = make_state(300, sections=6)
+    index = ChunkIndex(state)
+    chunks = [chunk for section in state["sections"] for chunk in section["chunks"]]
+    for _ in range(500):
+        index.set_status(rng.choice(chunks), rng.choice(STATUSES))
+        for mode in ("skip", "only", "include"):
+            for target in (None, rng.randrange(6)):
+                assert (index.next_chunk(mode, target, largest_first)
+                        is find_next_chunk(state, mode, target, largest_first))
+    assert index.summary(state) == summarize_sections(state)
+
+def test_with_status_is_in_plan_order():
+    state = make_state(40, sections=4)
+    index = ChunkIndex(state)
+    chunks = [chunk for section in state["sections"] for chunk in section["chunks"]]
+    for chunk in reversed(chunks[::3]):
+        index.set_status(chunk, "FAILED")
+    assert index.with_status("FAILED") == chunks[::3]
+    assert index.with_status("FAILED", 1) == [c for c in chunks[::3] if c in state["sections"][1]["chunks"]]
+    assert len(index.with_status("PENDING")) == len(chunks) - len(chunks[::3])
+
+def test_claimed_chunks_leave_the_queue():
+    state = make_state(20, sections=2)
+    index = ChunkIndex(state)
+    claimed = []
+    while (chunk := index.next_chunk("skip")) is not None:
+        index.set_status(chunk, "IN_PROGRESS")
+        claimed.append(chunk["id"])
+    assert claimed == [chunk["id"] for section in state["sections"] for chunk in section["chunks"]]
+
+def test_large_plans_default_to_sqlite():
+    assert default_backend(SQLITE_MIN_CHUNKS) == "json"
+    assert default_backend(SQLITE_MIN_CHUNKS + 1) == "sqlite"
+
+def test_planner_picks_the_backend_from_the_chunk_count(tmp_path, monkeypatch):
+    writer = PdfWriter()
+    for _ in range(6):
+        writer.add_blank_page(612, 792)
+    writer.write(tmp_path / "catalog.pdf")
+
+    initialize_job(tmp_path / "catalog.pdf", tmp_path / "small", chunk_size=2)
+    assert (tmp_path / "small" / "state.json").exists()
+    monkeypatch.setattr(plan, "default_backend", lambda num_chunks: "sqlite" if num_chunks > 2 else "json")
+    initialize_job(tmp_path / "catalog.pdf", tmp_path / "large", chunk_size=2)
+    assert (tmp_path / "large" / "state.db").exists() and not (tmp_path / "large" / "state.json").exists()
+    initialize_job(tmp_path / "catalog.pdf", tmp_path / "forced", chunk_size=2, state_backend="json")
+    assert (tmp_path / "forced" / "state.json").exists()
@@ -0,0 +1,108 @@
+import os
+import time
+import socket
+import multiprocessing
+
+import pytest
+
+from planner.state import create_state_store
+
+WORKER = f"{socket.gethostname()}:{os.getpid()}"
+
+def make_state(num_chunks=3):
+    chunks = [{"id": f"{5 * i + 1}_{5 * i + 5}", "start": 5 * i + 1, "end": 5 * i + 5, "status": "PENDING"}
+              for i in range(num_chunks)]
+    return {"pdf_path": "catalog.pdf", "sections": [{"name": "Cables", "chunks": chunks}]}
+
+def statuses(store):
+    return {chunk["id"]: chunk["status"] for section in store.load()["sections"] for chunk in section["chunks"]}
+
+@pytest.fixture(params=["json", "sqlite"])
+def store(request, tmp_path):
+    store = create_state_store(tmp_path, request.param)
+    store.initialize(make_state())
+    yield store
+    if hasattr(store, "close"):
+        store.close()
+
+def test_claim_marks_chunk_in_progress(store):
+    chunk, original, reclaimed = store.claim_next("skip", None, WORKER, 600)
+    assert (original, reclaimed) == ("PENDING", [])
+    assert chunk["claimed_by"] == WORKER
+    assert statuses(store)[chunk["id"]] == "IN_PROGRESS"
+
+def test_claims_run_out(store):
+    claimed = [store.claim_next("skip", None, WORKER, 600)[0]["id"] for _ in range(3)]
+    assert sorted(claimed) == sorted(statuses(store))
+    assert store.claim_next("skip", None, WORKER, 600) == (None, None, [])
+
+def test_release_clears_claim(store):
+    chunk, _, _ = store.claim_next("skip", None, WORKER, 600)
+    assert store.release(chunk, WORKER, "SYNTHESIZE")
+    released = next(c for s in store.load()["sections"] for c in s["chunks"] if c["id"] == chunk["id"])
+    assert released["status"] == "SYNTHESIZE"
+    assert not any(key in released for key in ("claimed_by", "claimed_from", "claimed_at", "heartbeat"))
+
+def test_release_refused_for_other_worker(store):
+    chunk, _, _ = store.claim_next("skip", None, WORKER, 600)
+    assert not store.release(chunk, "otherhost:1", "DONE")
+    assert not store.heartbeat(chunk, "otherhost:1")
+    assert store.heartbeat(chunk, WORKER)
+    assert statuses(store)[chunk["id"]] == "IN_PROGRESS"
+
+def test_stale_claim_is_reclaimed(tmp_path):
+    for backend in ("json", "sqlite"):
+        store = create_state_store(tmp_path / backend, backend)
+        store.initialize(make_state(num_chunks=1))
+        chunk, _, _ = store.claim_next("skip", None, "otherhost:1", 600)
+        # Fresh heartbeat: left alone
+        assert store.claim_next("skip", None, WORKER, 600) == (None, None, [])
+        time.sleep(0.01)
+        reclaimed_chunk, original, reclaimed = store.claim_next("skip", None, WORKER, 0)
+        assert [(c["id"], owner) for c, owner in reclaimed] == [(chunk["id"], "otherhost:1")]
+        # Back to the status it was claimed from, and claimable again
+        assert (reclaimed_chunk["id"], original) == (chunk["id"], "PENDING")
+        assert not store.release(chunk, "otherhost:1", "DONE")
+        assert store.release(reclaimed_chunk, WORKER, "DONE")
+        assert statuses(store) == {chunk["id"]: "DONE"}
+        if hasattr(store, "close"):
+            store.close()
+
+def test_dead_local_owner_is_reclaimed(store):
+    # A pid that can't exist on this host: the owner process is gone, whatever the heartbeat
+    chunk, _, _ = store.claim_next("skip", None, f"{socket.gethostname()}:999999999", 600)
+    _, _, reclaimed = store.claim_next("skip", None, WORKER, 600)
+    assert [c["id"] for c, _ in reclaimed] == [chunk["id"]]
+
+def test_report_counts(store):
+    chunk, _, _ = store.claim_next("skip", None, WORKER, 600)
+    store.release(chunk, WORKER, "DONE")
+    assert store.report() == [(0, "Cables", {"PENDING": 2, "DONE": 1})]
+
+def _claim_all(job_dir, backend, results):
+    store = create_state_store(job_dir, backend)
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    while True:
+        chunk, _, _ = store.claim_next("skip", None, worker_id, 600)
+        if chunk is None:
+            break
+        results.put(chunk["id"])
+        store.release(chunk, worker_id, "DONE")
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_concurrent_workers_never_share_a_chunk(tmp_path, backend):
+    store = create_state_store(tmp_path, backend)
+    store.initialize(make_state(num_chunks=40))
+    if hasattr(store, "close"):
+        store.close()
+
+    ctx = multiprocessing.get_context("fork")
+    results = ctx.Queue()
+    workers = [ctx.Process(target=_claim_all, args=(tmp_path, backend, results)) for _ in range(4)]
+    for p in workers:
+        p.start()
+    claimed = [results.get(timeout=30) for _ in range(40)]
+    for p in workers:
+        p.join(timeout=30)
+    assert sorted(claimed) == sorted(chunk["id"] for chunk in make_state(40)["sections"][0]["chunks"])
+    assert set(statuses(create_state_store(tmp_path, backend)).values()) == {"DONE"}
@@ -0,0 +1,15 @@
+import PIL.Image
+import pytest
+
+export_assets = pytest.importorskip("extract.export_assets", reason="needs Docling")
+
+def test_docling_renders_at_the_largest_scale():
+    assert export_assets.render_scale(1.0, None, 2.0) == 2.0
+    assert export_assets.render_scale(1.0, 3.0, 2.0) == 3.0
+    assert export_assets.render_scale(1.5, None, None) == 1.5
+
+def test_images_are_resized_only_below_the_render_scale():
+    page = PIL.Image.new("RGB", (1224, 1584))
+    assert export_assets.scaled_size(page, 1.0, 2.0) == (612, 792)
+    assert export_assets.scaled_size(page, 2.0, 2.0) is None
+    assert export_assets.scaled_size(page, None, 2.0) is None
@@ -0,0 +1,33 @@
+import time
+
+import pytest
+
+from extract.metrics import RssSampler, current_rss_mb
+
+def test_sampler_keeps_the_peak_of_its_own_block():
+    if current_rss_mb() is None:
+        pytest.skip("no /proc/self/statm")
+    with RssSampler(interval=0.01) as rss:
+        block = bytearray(64 * 2**20)
+        block[::4096] = b"x" * len(block[::4096])
+        time.sleep(0.05)
+        del block
+    assert rss.peak_mb >= current_rss_mb() + 32
+
+def test_page_windows():
+    export_assets = pytest.importorskip("extract.export_assets", reason="needs Docling")
+    assert export_assets.page_windows(11, 20, 4) == [(11, 14), (15, 18), (19, 20)]
+    assert export_assets.page_windows(5, 5, 4) == [(5, 5)]
+
+def test_switching_layouts_removes_the_other_document_json(tmp_path):
+    export_assets = pytest.importorskip("extract.export_assets", reason="needs Docling")
+    (tmp_path / export_assets.METADATA_FILE).write_text("{}")
+    (tmp_path / export_assets.METADATA_PARTS_DIR).mkdir()
+    (tmp_path / export_assets.METADATA_PARTS_DIR / "part001.json").write_text("{}")
+    export_assets.clear_metadata(tmp_path, streaming=True)
+    assert not (tmp_path / export_assets.METADATA_FILE).exists()
+    assert not (tmp_path / export_assets.METADATA_PARTS_DIR).exists()
+
+    (tmp_path / export_assets.METADATA_PARTS_FILE).write_text("{}")
+    export_assets.clear_metadata(tmp_path, streaming=False)
+    assert not (tmp_path / export_assets.METADATA_PARTS_FILE).exists()
@@ -0,0 +1,127 @@
+import json
+from pathlib import Path
+
+import PIL.Image
+import pytest
+
+import extract.skus as skus
+from extract.fastpath import fastpath_page, in_text, row_failures, score_page, valid_sku
+from extract.synthesize import synthesize_catalog
+from planner.utils import write_page_text_md
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+HEADERS = ["Part No.", "AWG", "OD mm"]
+PAGE_TEXT = """Hookup Wire
+UL Style 1007, rated 300 V.
+Part No. AWG OD mm
+5851 22 1.52
+5852 20 1.70
+All dimensions nominal.
+"""
+
+def make_row(sku, awg, od, **overrides):
+    row = {
+        "sku": sku, "series": "Hookup Wire", "gauge": "N/A", "table_ref": "#/tables/0",
+        "headers": HEADERS, "row_columns": 3, "shifted": False,
+        "technical_data": {"Part No.": sku, "AWG": awg, "OD mm": od},
+    }
+    row.update(overrides)
+    return row
+
+ROWS = [make_row("5851", "22", "1.52"), make_row("5852", "20", "1.70")]
+
+def test_valid_sku():
+    assert valid_sku("5851")
+    assert valid_sku("M22759/16-20")
+    assert not valid_sku("5.03")
+    assert not valid_sku("AWG")
+    assert not valid_sku(None)
+
+def test_in_text_matches_whole_tokens():
+    assert in_text("5851", "Part 5851 22")
+    assert not in_text("585", "Part 5851 22")
+    assert not in_text("12", "4120")
+    assert in_text("7/30 Strands", "22 7/30\nStrands")
+    assert in_text("", "anything")
+
+def test_clean_rows_pass():
+    assert score_page(ROWS, PAGE_TEXT) == (1.0, {})
+
+def test_each_check_fails_its_row():
+    counts = {"5851": 1}
+    assert row_failures(make_row("5851", "22", "1.52", row_columns=2), PAGE_TEXT, counts) == ["columns"]
+    assert row_failures(make_row("5851", "22", "1.52", shifted=True), PAGE_TEXT, counts) == ["shift"]
+    # Written before the structure fields existed
+    legacy = make_row("5851", "22", "1.52")
+    del legacy["shifted"]
+    assert row_failures(legacy, PAGE_TEXT, counts) == ["shift"]
+    assert row_failures(make_row("5851", "22", "1.52"), PAGE_TEXT, {"5851": 2}) == ["unique"]
+    assert row_failures(make_row("5.03", "22", "1.52"), PAGE_TEXT, {"5.03": 1}) == ["sku"]
+
+def test_misread_cell_fails_text_check():
+    # "1.5" only occurs inside "1.52" on the page
+    row = make_row("5851", "22", "1.5")
+    assert row_failures(row, PAGE_TEXT, {"5851": 1}) == ["text"]
+    # SKU only occurs inside a longer number
+    row = make_row("585", "22", "1.52")
+    assert row_failures(row, PAGE_TEXT, {"585": 1}) == ["text"]
+
+def test_confidence_gates_the_fast_path():
+    rows = ROWS + [make_row("5853", "18", "2.01")]
+    confidence, failures, fragment = fastpath_page(4, "page_4.png", rows, PAGE_TEXT)
+    assert (confidence, failures, fragment) == (0.667, {"text": 1}, None)
+    confidence, _, fragment = fastpath_page(4, "page_4.png", rows, PAGE_TEXT, min_confidence=0.6)
+    assert fragment is not None
+    assert fastpath_page(4, "page_4.png", [], PAGE_TEXT)[2] is None
+
+def test_fragment_keeps_tables_skus_and_page_text():
+    _, _, fragment = fastpath_page(4, "page_4.png", ROWS, PAGE_TEXT)
+    markdown = fragment["markdown_content"]
+    assert markdown.startswith("![Page 4](raw/images/page_4.png)")
+    assert "| 5851 | 22 | 1.52 |" in markdown
+    # Narrative text stays on its side of the table; table lines and headings are not repeated
+    assert markdown.index("UL Style 1007") < markdown.index("## Hookup Wire") < markdown.index("All dimensions nominal.")
+    assert "5852 20 1.70" not in markdown
+    assert [sku["sku"] for sku in fragment["skus"]] == ["5851", "5852"]
+    assert fragment["skus"][0]["provenance"] == {"page": 4, "file": "catalog.pdf"}
+
+PICTURES = [{"filename": "crop_page_4_0.png", "path": "images/crop_page_4_0.png", "page_number": 4, "text_context": "Cross section"},
+            {"filename": "crop_page_4_1.png", "path": "images/crop_page_4_1.png", "page_number": 4, "text_context": ""}]
+
+def test_fragment_embeds_the_page_picture_crops():
+    _, _, fragment = fastpath_page(4, "page_4.png", ROWS, PAGE_TEXT, pictures=PICTURES)
+    markdown = fragment["markdown_content"]
+    assert "![Cross section](raw/images/crop_page_4_0.png)\n\n*Cross section*" in markdown
+    assert "![crop_page_4_1.png](raw/images/crop_page_4_1.png)" in markdown
+    assert markdown.index("crop_page_4_1.png") < markdown.index("| 5851 | 22 | 1.52 |")
+
+def test_sku_rows_carry_the_structure_fields(tmp_path):
+    output = tmp_path / "sku_intermediate.jsonl"
+    skus.process_skus(str(FIXTURES / "docling_skus.json"), str(output), page_offset=10)
+    records = [json.loads(line) for line in output.read_text().splitlines()]
+    assert records[0]["table_ref"] == "#/tables/0"
+    assert records[0]["headers"] == ["Part No.", "AWG", "Strands", "OD mm"]
+    assert records[0]["row_columns"] == 4
+    # Both later rows were rotated: the third only because its SKU cell was empty (ambiguous), the fourth on a matching last cell
+    assert [(r["shifted"], r["shift_ambiguous"]) for r in records[:4]] == [(False, False), (False, False), (True, True), (True, False)]
+
+@pytest.fixture
+def chunk_dir(tmp_path):
+    (tmp_path / "images").mkdir()
+    PIL.Image.new("RGB", (60, 80), "white").save(tmp_path / "images" / "page4.png")
+    write_page_text_md(tmp_path / "extract.md", "4_4.pdf", [(4, PAGE_TEXT)])
+    (tmp_path / "image_provenance_map.json").write_text(json.dumps(PICTURES))
+    with open(tmp_path / "sku_intermediate.jsonl", "w") as f:
+        for row in ROWS:
+            f.write(json.dumps(dict(row, page_no=4)) + "\n")
+    return tmp_path
+
+def test_fast_path_is_opt_in(chunk_dir):
+    summary = synthesize_catalog(str(chunk_dir), cache_mode="off", backend="stub")
+    assert (summary["fastpath"], summary["requests"]) == (0, 1)
+
+    summary = synthesize_catalog(str(chunk_dir), cache_mode="off", backend="stub", force=True, fastpath=1.0)
+    assert (summary["fastpath"], summary["requests"]) == (1, 0)
+    catalog = (chunk_dir / "catalog.md").read_text()
+    assert "| 5852 | 20 | 1.70 |" in catalog and "raw/images/crop_page_4_0.png" in catalog
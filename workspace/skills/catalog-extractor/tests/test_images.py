@@ -0,0 +1,70 @@
+import io
+import json
+
+import PIL.Image
+import pytest
+
+from extract.images import ImageEncoder, encode_image, make_image_profile, read_source_scale
+
+def save_page(path, size=(400, 600), color="white"):
+    img = PIL.Image.new("RGB", size, color)
+    # A red block so "auto" grayscale has colour to find on coloured pages
+    if color != "white":
+        img.paste((220, 30, 30), (0, 0, size[0], size[1] // 2))
+    img.save(path)
+    return path
+
+def decode(payload):
+    return PIL.Image.open(io.BytesIO(payload["data"]))
+
+def test_profile_validation():
+    assert make_image_profile(fmt="JPG")["format"] == "jpeg"
+    for kwargs in ({"fmt": "gif"}, {"grayscale": "maybe"}, {"scale": 0}, {"quality": 101}):
+        with pytest.raises(ValueError):
+            make_image_profile(**kwargs)
+
+def test_downscales_from_the_recorded_source_scale(tmp_path):
+    (tmp_path / "render.json").write_text(json.dumps({"images_scale": 2.0}))
+    page = save_page(tmp_path / "page_1.png")
+    payload = encode_image(page, make_image_profile(scale=1.0), read_source_scale(tmp_path))
+    assert (payload["width"], payload["height"]) == (200, 300)
+    assert decode(payload).size == (200, 300)
+
+def test_never_upscales(tmp_path):
+    page = save_page(tmp_path / "page_1.png")
+    payload = encode_image(page, make_image_profile(scale=2.0), source_scale=1.0)
+    assert (payload["width"], payload["height"]) == (400, 600)
+
+def test_formats_and_grayscale(tmp_path):
+    page = save_page(tmp_path / "page_1.png", color="red")
+    jpeg = encode_image(page, make_image_profile(scale=1.0, fmt="jpeg", quality=60), 1.0)
+    assert jpeg["mime_type"] == "image/jpeg" and decode(jpeg).format == "JPEG"
+    webp = encode_image(page, make_image_profile(scale=1.0, fmt="webp"), 1.0)
+    assert webp["mime_type"] == "image/webp"
+    assert encode_image(page, make_image_profile(scale=1.0, grayscale="on"), 1.0)["grayscale"]
+    # "auto" keeps colour pages in colour and converts line art
+    assert not encode_image(page, make_image_profile(scale=1.0, grayscale="auto"), 1.0)["grayscale"]
+    line_art = save_page(tmp_path / "page_2.png")
+    assert decode(encode_image(line_art, make_image_profile(scale=1.0, grayscale="auto"), 1.0)).mode == "L"
+
+def test_encoder_prefetches_and_reuses_its_disk_cache(tmp_path):
+    pages = [save_page(tmp_path / f"page_{i}.png") for i in range(1, 5)]
+    encoder = ImageEncoder(tmp_path, make_image_profile(scale=1.0), workers=2, lookahead=2)
+    encoder.prefetch(pages)
+    first = [encoder.get(p) for p in pages]
+    encoder.close()
+    assert encoder.summary()["encoded"] == 4
+
+    encoder = ImageEncoder(tmp_path, make_image_profile(scale=1.0))
+    again = [encoder.get(p) for p in pages]
+    encoder.close()
+    assert encoder.summary()["reused"] == 4
+    assert [p["data"] for p in again] == [p["data"] for p in first]
+
+    # Another profile or a changed source image is a new entry
+    encoder = ImageEncoder(tmp_path, make_image_profile(scale=0.5))
+    encoder.get(pages[0])
+    save_page(pages[1], size=(300, 300))
+    encoder.get(pages[1])
+    encoder.close()
+    assert encoder.summary()["encoded"] == 2
@@ -0,0 +1,57 @@
+import json
+import threading
+
+import pytest
+
+from extract import llm
+from extract.llm import LLMConfigError, OpenAICompatibleBackend, StubBackend, create_backend, serve_stub
+from extract.synthesize import MODEL_CONFIG, build_batch_prompt, build_prompt
+
+IMAGE = {"mime_type": "image/png", "data": b"png", "width": 10, "height": 10}
+
+def page_input(page):
+    return {"page": page, "img_name": f"page_{page}.png", "raw_text": "", "prov_json_str": "[]", "sku_context_str": "[]"}
+
+def test_stub_answers_the_pages_a_prompt_asks_for():
+    backend = StubBackend()
+    single = backend.generate(build_prompt(7, "page_7.png", "", "[]", "[]"), [IMAGE], MODEL_CONFIG["generation_config"])
+    assert single.finish_reason == "STOP" and single.input_tokens > 258
+    assert "raw/images/page_7.png" in json.loads(single.text)["markdown_content"]
+
+    prompt = build_batch_prompt([page_input(3), page_input(4)])
+    batch = json.loads(backend.generate(prompt, [IMAGE, IMAGE], {}).text)
+    assert [p["page"] for p in batch["pages"]] == [3, 4]
+    assert batch["pages"][1]["skus"][0]["sku"] == "004-00"
+    # Deterministic: the same prompt always gets the same text
+    assert StubBackend().generate(prompt, [IMAGE, IMAGE], {}).text == backend.generate(prompt, [IMAGE, IMAGE], {}).text
+    assert backend.calls == 3
+
+def test_unknown_backend_and_missing_key(monkeypatch):
+    with pytest.raises(LLMConfigError):
+        create_backend("llamafile")
+    monkeypatch.delenv("GOOGLE_API_KEY", raising=False)
+    with pytest.raises(LLMConfigError):
+        create_backend("gemini").ensure_ready()
+
+def test_get_backend_shares_one_instance(monkeypatch):
+    monkeypatch.setattr(llm, "_backends", {})
+    monkeypatch.setenv("LLM_BACKEND", "stub")
+    assert llm.get_backend() is llm.get_backend("stub")
+    configured = llm.configure_backend("stub", latency=0.0, seed=3)
+    assert llm.get_backend("stub") is configured
+
+def test_openai_backend_against_the_stub_server():
+    server = serve_stub(port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    backend = OpenAICompatibleBackend(base_url=f"http://127.0.0.1:{server.server_port}/v1", model="stub", pool_size=2)
+    try:
+        prompt = build_prompt(5, "page_5.png", "", "[]", "[]")
+        response = backend.generate(prompt, [IMAGE], MODEL_CONFIG["generation_config"])
+        assert response.text == StubBackend().generate(prompt, [IMAGE], {}).text
+        assert response.finish_reason == "STOP" and response.output_tokens == len(response.text) // 4
+        assert backend.model_id == "openai:stub"
+    finally:
+        backend.close()
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,57 @@
+import json
+
+import PIL.Image
+
+from extract.page_ledger import LEDGER_FILE, PageLedger
+from extract.synthesize import page_fingerprint, prepare_page
+
+def fragment(page):
+    return {"page": page, "markdown": f"# Page {page}", "skus": [{"sku": f"{page}000"}]}
+
+def test_done_page_is_current_only_for_its_fingerprint(tmp_path):
+    ledger = PageLedger(tmp_path)
+    ledger.record_done(3, "abc", fragment(3))
+    assert ledger.is_current(3, "abc")
+    assert not ledger.is_current(3, "def")
+    assert not ledger.is_current(4, "abc")
+    # Survives a rerun
+    assert PageLedger(tmp_path).is_current(3, "abc")
+
+def test_failed_or_missing_fragment_is_not_current(tmp_path):
+    ledger = PageLedger(tmp_path)
+    ledger.record_failed(3, "abc", "boom")
+    assert ledger.status(3) == "failed" and not ledger.is_current(3, "abc")
+    ledger.record_done(4, "abc", fragment(4))
+    ledger.fragment_path(4).unlink()
+    assert not ledger.is_current(4, "abc")
+
+def test_assemble_writes_done_pages_in_page_order(tmp_path):
+    ledger = PageLedger(tmp_path)
+    for page in (7, 5, 6):
+        ledger.record_done(page, "fp", fragment(page))
+    ledger.record_failed(6, "fp", "boom")
+    catalog, skus = tmp_path / "catalog.md", tmp_path / "sku.jsonl"
+    assert ledger.assemble([7, 6, 5, 8], catalog, skus) == [5, 7]
+    text = catalog.read_text()
+    assert text.index("# Page 5") < text.index("# Page 7") and "# Page 6" not in text
+    assert [json.loads(line)["sku"] for line in skus.read_text().splitlines()] == ["5000", "7000"]
+
+def test_unreadable_ledger_resynthesizes_everything(tmp_path, capsys):
+    ledger = PageLedger(tmp_path)
+    ledger.record_done(3, "abc", fragment(3))
+    (tmp_path / LEDGER_FILE).write_text("[1, 2")
+    assert not PageLedger(tmp_path).is_current(3, "abc")
+    assert "unreadable" in capsys.readouterr().out
+
+def test_fingerprint_changes_with_page_inputs(tmp_path):
+    img_path = tmp_path / "page_3.png"
+    PIL.Image.new("RGB", (60, 80), "white").save(img_path)
+    page = prepare_page(3, img_path, {3: "Part No. 5851"}, {}, {})
+    profile = {"scale": 1.0}
+    base = page_fingerprint(page, profile, "model-a")
+    assert base == page_fingerprint(prepare_page(3, img_path, {3: "Part No. 5851"}, {}, {}), profile, "model-a")
+    assert base != page_fingerprint(page, profile, "model-b")
+    assert base != page_fingerprint(page, {"scale": 0.5}, "model-a")
+    assert base != page_fingerprint(prepare_page(3, img_path, {3: "Part No. 5852"}, {}, {}), profile, "model-a")
+    PIL.Image.new("RGB", (60, 80), "black").save(img_path)
+    assert base != page_fingerprint(page, profile, "model-a")
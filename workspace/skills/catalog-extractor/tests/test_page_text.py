@@ -0,0 +1,58 @@
+import json
+
+from extract.page_text import PageTextIndex, index_path_for, open_page_text, split_page_text
+from planner.utils import write_page_text_md
+
+PAGES = [
+    (11, "Hookup Wire\nPart No. AWG\n5851 22"),
+    (12, "Câble blindé — 300 V, −40 °C … 105 °C"),
+    (13, ""),
+    (14, "## Not a page heading\n---\ntrailing text"),
+]
+
+def write_dump(tmp_path):
+    md_path = tmp_path / "extract.md"
+    write_page_text_md(md_path, "catalog.pdf", PAGES)
+    return md_path
+
+def test_index_reads_each_page(tmp_path):
+    md_path = write_dump(tmp_path)
+    text_map = open_page_text(md_path)
+    assert isinstance(text_map, PageTextIndex)
+    assert text_map.pages() == [11, 12, 13, 14]
+    for page, text in PAGES:
+        assert text_map.get(page) == text.strip()
+    assert text_map.get(99, "missing") == "missing"
+    text_map.close()
+
+def test_index_matches_splitting_the_dump(tmp_path):
+    md_path = write_dump(tmp_path)
+    split = split_page_text(md_path.read_text())
+    with PageTextIndex(md_path) as text_map:
+        assert {page: text_map.get(page) for page in text_map.pages()} == split
+
+def test_stale_index_falls_back_to_splitting(tmp_path, capsys):
+    md_path = write_dump(tmp_path)
+    with open(md_path, "a") as f:
+        f.write("## Page 15\n\nappended by hand\n")
+    text_map = open_page_text(md_path)
+    assert isinstance(text_map, dict)
+    assert text_map[15] == "appended by hand"
+    assert text_map[12] == PAGES[1][1]
+    assert "stale" in capsys.readouterr().out
+
+def test_unreadable_index_falls_back_to_splitting(tmp_path):
+    md_path = write_dump(tmp_path)
+    index_path_for(md_path).write_text("{")
+    assert open_page_text(md_path)[11] == PAGES[0][1]
+    index_path_for(md_path).write_text(json.dumps({"version": 2, "pages": {}}))
+    assert open_page_text(md_path)[11] == PAGES[0][1]
+
+def test_dump_without_index_or_pages(tmp_path):
+    assert open_page_text(tmp_path / "missing.md") is None
+    md_path = tmp_path / "extract.md"
+    write_page_text_md(md_path, "catalog.pdf", [])
+    with PageTextIndex(md_path) as text_map:
+        assert text_map.pages() == []
+    index_path_for(md_path).unlink()
+    assert open_page_text(md_path) == {}
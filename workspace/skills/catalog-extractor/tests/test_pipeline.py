@@ -0,0 +1,84 @@
+import threading
+import time
+
+from pipeline import StagePipeline
+
+def run_items(stages, items, queue_size=1, first_stage=None):
+    exits = []
+    exits_lock = threading.Lock()
+
+    def on_exit(item, context, error):
+        with exits_lock:
+            exits.append((item, context, error))
+
+    runner = StagePipeline(stages, queue_size, init=lambda stage, index: f"{stage}-{index}", on_exit=on_exit,
+                           sample_interval=0.01).start()
+    for item in items:
+        runner.acquire()
+        runner.submit(item, first_stage or stages[0][0])
+    runner.close()
+    return runner, exits
+
+def test_every_item_leaves_once_through_every_stage():
+    seen = []
+
+    def stage(name):
+        def handler(item, context):
+            seen.append((name, item["id"]))
+            item["path"].append(name)
+            return item
+        return handler
+
+    items = [{"id": i, "path": []} for i in range(10)]
+    stages = [("export", stage("export"), 2), ("skus", stage("skus"), 1), ("synthesis", stage("synthesis"), 3)]
+    runner, exits = run_items(stages, items)
+    assert sorted(item["id"] for item, _, _ in exits) == list(range(10))
+    assert all(item["path"] == ["export", "skus", "synthesis"] and error is None for item, _, error in exits)
+    # Items finish in a synthesis thread, with that thread's context
+    assert all(context.startswith("synthesis-") for _, context, _ in exits)
+    report = runner.report()
+    assert [report["stages"][name]["items"] for name in ("export", "skus", "synthesis")] == [10, 10, 10]
+
+def test_finished_and_failed_items_leave_early():
+    def export(item, context):
+        if item == 2:
+            raise RuntimeError("docling failed")
+        return None if item == 3 else item
+
+    reached = []
+    stages = [("export", export, 1), ("synthesis", lambda item, context: reached.append(item), 1)]
+    runner, exits = run_items(stages, range(5))
+    assert sorted(reached) == [0, 1, 4]
+    errors = {item: error for item, _, error in exits}
+    assert sorted(errors) == [0, 1, 2, 3, 4]
+    assert isinstance(errors[2], RuntimeError) and errors[3] is None
+    assert runner.report()["stages"]["export"]["errors"] == 1
+
+def test_items_can_enter_at_a_later_stage():
+    stages = [("export", lambda item, context: item, 1), ("synthesis", lambda item, context: None, 1)]
+    runner, exits = run_items(stages, range(3), first_stage="synthesis")
+    assert runner.report()["stages"]["export"]["items"] == 0 and len(exits) == 3
+
+def test_capacity_bounds_items_in_flight():
+    in_flight, peak = [0], [0]
+    lock = threading.Lock()
+
+    def slow(item, context):
+        time.sleep(0.005)
+        return item
+
+    def on_exit(item, context, error):
+        with lock:
+            in_flight[0] -= 1
+
+    stages = [("export", slow, 1), ("synthesis", slow, 2)]
+    runner = StagePipeline(stages, queue_size=1, on_exit=on_exit, sample_interval=0.01).start()
+    assert runner.capacity() == 5
+    for item in range(20):
+        runner.acquire()
+        with lock:
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+        runner.submit(item, "export")
+    runner.close()
+    assert in_flight[0] == 0 and peak[0] <= runner.capacity()
@@ -0,0 +1,77 @@
+import pytest
+from pypdf import PdfReader, PdfWriter
+
+import planner.plan as plan
+from planner.plan import build_chunk, plan_section_chunks
+from planner.state import ChunkIndex, create_state_store
+from planner.utils import PageTextCache
+
+def test_splits_by_chunk_size():
+    assert plan_section_chunks(1, 12, 5) == [(1, 5), (6, 10), (11, 12)]
+    assert plan_section_chunks(7, 7, 5) == [(7, 7)]
+
+def test_cost_is_ignored_without_budget():
+    assert plan_section_chunks(1, 10, 5, page_cost=lambda page: 100.0) == [(1, 5), (6, 10)]
+
+def test_dense_pages_close_chunks_early():
+    costs = {1: 1, 2: 1, 3: 6, 4: 6, 5: 1, 6: 1, 7: 1, 8: 1, 9: 1, 10: 1}
+    ranges = plan_section_chunks(1, 10, 5, page_cost=costs.get, max_chunk_cost=8)
+    # 1+1+6 fits, the next 6 doesn't; 6+1+1 reaches the budget exactly
+    assert ranges == [(1, 3), (4, 6), (7, 10)]
+
+def test_page_over_budget_becomes_its_own_chunk():
+    costs = {1: 1, 2: 20, 3: 1}
+    assert plan_section_chunks(1, 3, 5, page_cost=costs.get, max_chunk_cost=8) == [(1, 1), (2, 2), (3, 3)]
+
+def test_ranges_cover_the_section():
+    costs = {page: (page % 4) * 2.5 for page in range(3, 40)}
+    ranges = plan_section_chunks(3, 39, 5, page_cost=costs.get, max_chunk_cost=9)
+    pages = [page for start, end in ranges for page in range(start, end + 1)]
+    assert pages == list(range(3, 40))
+    assert all(end - start < 5 for start, end in ranges)
+    assert all(sum(costs[p] for p in range(start, end + 1)) <= 9 for start, end in ranges if end > start)
+
+def cost_state():
+    # Two sections; the most expensive chunk is last in plan order
+    costs = [[3.0, 9.0], [5.0, 12.0]]
+    sections = []
+    for sec_idx, section_costs in enumerate(costs):
+        chunks = []
+        for i, cost in enumerate(section_costs):
+            start = 10 * sec_idx + 5 * i + 1
+            chunks.append({"id": f"{start}_{start + 4}", "start": start, "end": start + 4, "status": "PENDING", "cost": cost})
+        sections.append({"name": f"Section {sec_idx}", "chunks": chunks})
+    return {"sections": sections}
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_claims_follow_plan_order_unless_largest_first(tmp_path, backend):
+    orders = {}
+    for largest_first in (False, True):
+        store = create_state_store(tmp_path / str(largest_first), backend)
+        store.initialize(cost_state())
+        orders[largest_first] = [store.claim_next("skip", None, "w:1", 600, largest_first)[0]["id"] for _ in range(4)]
+        if hasattr(store, "close"):
+            store.close()
+    assert orders[False] == ["1_5", "6_10", "11_15", "16_20"]
+    assert orders[True] == ["16_20", "6_10", "11_15", "1_5"]
+
+def test_index_largest_first_within_a_section():
+    index = ChunkIndex(cost_state())
+    assert index.next_chunk("skip", target_section_idx=0)["id"] == "1_5"
+    assert index.next_chunk("skip", target_section_idx=0, largest_first=True)["id"] == "6_10"
+
+def test_build_chunk_reuses_planned_stats(tmp_path, monkeypatch):
+    writer = PdfWriter()
+    for _ in range(3):
+        writer.add_blank_page(612, 792)
+    writer.write(tmp_path / "catalog.pdf")
+    reader = PdfReader(tmp_path / "catalog.pdf")
+    planned = {p: {"page": p, "chars": 10, "table_lines": 0, "images": 0, "cost": 2.0} for p in (1, 2)}
+
+    stats_calls = []
+    monkeypatch.setattr(plan, "page_stats", lambda reader, cache, p: stats_calls.append(p) or dict(planned[1], page=p))
+    chunk, _ = build_chunk(reader, PageTextCache(reader), tmp_path / "runs", 1, 3, 3, tmp_path / "catalog.pdf", stats=planned)
+    assert stats_calls == [3]
+    assert chunk["cost"] == 6.0 and [p["page"] for p in chunk["pages"]] == [1, 2, 3]
+    # The planner's stats are copied, not annotated in place
+    assert "class" not in planned[1]
@@ -0,0 +1,84 @@
+import threading
+
+import pytest
+import tenacity
+
+import extract.synthesize as synthesize
+from extract.llm import LLMResponse
+from extract.rate_limit import RateLimiter, TokenBucket
+
+def test_bucket_starts_full_then_refills_at_its_rate():
+    bucket = TokenBucket(10, period=1.0)
+    assert bucket.acquire(10) < 0.05
+    waited = bucket.acquire(5)
+    assert 0.4 < waited < 0.8
+
+def test_disabled_bucket_never_blocks():
+    for capacity in (0, None):
+        bucket = TokenBucket(capacity)
+        assert bucket.acquire(10 ** 9) == 0.0
+        bucket.adjust(-100)
+
+def test_oversized_request_drains_the_bucket_instead_of_blocking_forever():
+    bucket = TokenBucket(10, period=1.0)
+    assert bucket.acquire(50) < 0.05
+    assert bucket.tokens < 1
+
+def test_reconcile_returns_overestimated_tokens():
+    limiter = RateLimiter(requests_per_minute=100, tokens_per_minute=1000)
+    limiter.acquire(800)
+    limiter.reconcile(800, 100)
+    assert limiter.tokens.tokens == pytest.approx(900, abs=5)
+    # Unknown usage leaves the reservation as it was
+    limiter.reconcile(100, None)
+    assert limiter.tokens.tokens == pytest.approx(900, abs=5)
+
+def test_request_slots_are_shared_between_threads():
+    limiter = RateLimiter(requests_per_minute=6000, tokens_per_minute=None)
+    # Empty bucket refilling 100 slots per second: 50 concurrent requests take about half a second
+    limiter.requests.tokens = 0
+    waits = []
+    threads = [threading.Thread(target=lambda: waits.append(limiter.acquire(0))) for _ in range(50)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert 0.3 < max(waits) < 1.0
+
+class CountingLimiter:
+    def __init__(self):
+        self.calls = []
+
+    def acquire(self, estimated_tokens):
+        self.calls.append(estimated_tokens)
+        return 0.0
+
+class FlakyBackend:
+    """Fails with a 429 twice, then answers."""
+
+    def __init__(self):
+        self.attempts = 0
+
+    def generate(self, prompt, images, config):
+        self.attempts += 1
+        if self.attempts < 3:
+            raise RuntimeError("429 ResourceExhausted")
+        return LLMResponse('{"ok": true}', 10, 2, "STOP")
+
+@pytest.fixture
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(synthesize.generate_with_retry.retry, "wait", tenacity.wait_none())
+
+def test_every_retry_reserves_quota(no_backoff):
+    limiter, backend = CountingLimiter(), FlakyBackend()
+    response = synthesize.generate_with_retry(backend, "prompt", [], {}, limiter, 123)
+    assert response.text == '{"ok": true}'
+    assert limiter.calls == [123, 123, 123]
+
+def test_empty_responses_are_retried(no_backoff):
+    class EmptyBackend:
+        def generate(self, prompt, images, config):
+            return LLMResponse(None, 10, 0, "SAFETY")
+
+    with pytest.raises(synthesize.EmptyResponseError):
+        synthesize.generate_with_retry(EmptyBackend(), "prompt", [], {}, CountingLimiter(), 1)
@@ -0,0 +1,92 @@
+import os
+import time
+
+from extract.llm import LLMResponse
+from extract.rate_limit import RateLimiter
+from extract.response_cache import ResponseCache, cache_key, open_response_cache
+from extract.synthesize import call_model
+
+def entry(size=0):
+    return {"text": "x" * size, "input_tokens": 100, "output_tokens": 20}
+
+def test_key_depends_on_every_input():
+    base = cache_key("model-a", {"temperature": 0.1}, "prompt", b"image")
+    assert base == cache_key("model-a", {"temperature": 0.1}, "prompt", b"image")
+    assert base != cache_key("model-b", {"temperature": 0.1}, "prompt", b"image")
+    assert base != cache_key("model-a", {"temperature": 0.2}, "prompt", b"image")
+    assert base != cache_key("model-a", {"temperature": 0.1}, "prompt!", b"image")
+    assert base != cache_key("model-a", {"temperature": 0.1}, "prompt", b"image2")
+
+def test_put_then_get(tmp_path):
+    cache = ResponseCache(tmp_path)
+    key = cache_key("m", {}, "p", b"")
+    assert cache.get(key) is None
+    cache.put(key, entry())
+    assert cache.get(key) == entry()
+    # Survives a new process (a fresh cache object on the same directory)
+    assert ResponseCache(tmp_path).get(key) == entry()
+
+def test_corrupt_entry_is_a_miss(tmp_path):
+    cache = ResponseCache(tmp_path)
+    key = cache_key("m", {}, "p", b"")
+    cache.put(key, entry())
+    cache._path(key).write_text("{not json")
+    assert cache.get(key) is None
+
+def test_evicts_least_recently_used_above_budget(tmp_path):
+    cache = ResponseCache(tmp_path, max_mb=1)
+    keys = [cache_key("m", {}, f"p{i}", b"") for i in range(5)]
+    for i, key in enumerate(keys[:4]):
+        cache.put(key, entry(200_000))
+        # mtime resolution: make the order unambiguous
+        os.utime(cache._path(key), (time.time() - 100 + i, time.time() - 100 + i))
+    # A hit makes the oldest entry the most recently used
+    assert cache.get(keys[0]) is not None
+
+    cache.put(keys[4], entry(300_000))
+    assert cache.evictions >= 1
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) is not None
+    assert cache.get(keys[4]) is not None
+    assert cache.usage()["bytes"] <= cache.max_bytes
+
+def test_clear_and_usage(tmp_path):
+    cache = ResponseCache(tmp_path)
+    for i in range(3):
+        cache.put(cache_key("m", {}, f"p{i}", b""), entry(10))
+    usage = cache.usage()
+    assert usage["entries"] == 3 and usage["bytes"] > 0
+    assert cache.clear() == 3
+    assert cache.usage()["entries"] == 0
+
+def test_one_cache_object_per_directory(tmp_path):
+    assert open_response_cache(tmp_path) is open_response_cache(tmp_path / ".")
+    assert open_response_cache(tmp_path) is not open_response_cache(tmp_path / "other")
+
+class CountingBackend:
+    model_id = "stub-model"
+
+    def __init__(self, text='{"markdown_content": "# Page", "skus": []}'):
+        self.text = text
+        self.calls = 0
+
+    def generate(self, prompt, images, config):
+        self.calls += 1
+        return LLMResponse(self.text, 1000, 50, "STOP")
+
+def test_identical_request_is_served_from_cache(tmp_path):
+    cache, backend, limiter = ResponseCache(tmp_path), CountingBackend(), RateLimiter()
+    images = [{"mime_type": "image/png", "data": b"png", "width": 10, "height": 10}]
+    response, usage = call_model("prompt", images, "Page 1", limiter, cache, "use", backend)
+    assert not usage["cached"] and usage["cache_key"]
+    cache.put(usage["cache_key"], {"text": response.text, "input_tokens": 1000, "output_tokens": 50})
+
+    response, usage = call_model("prompt", images, "Page 1", limiter, cache, "use", backend)
+    assert usage["cached"] and usage["saved_input_tokens"] == 1000
+    assert response.text == backend.text
+    assert backend.calls == 1
+    # Another image is another request; "refresh" and "off" always send
+    call_model("prompt", [{**images[0], "data": b"png2"}], "Page 1", limiter, cache, "use", backend)
+    call_model("prompt", images, "Page 1", limiter, cache, "refresh", backend)
+    call_model("prompt", images, "Page 1", limiter, cache, "off", backend)
+    assert backend.calls == 4
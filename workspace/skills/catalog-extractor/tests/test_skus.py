@@ -0,0 +1,67 @@
+import json
+from pathlib import Path
+
+import pytest
+
+import extract.skus as skus
+
+FIXTURES = Path(__file__).parent / "fixtures"
+DOCUMENT = FIXTURES / "docling_skus.json"
+# Written by the pre-streaming extractor (json.load + recursive walk) from the same document with --page-offset 10
+EXPECTED = FIXTURES / "skus_expected.jsonl"
+# Table-structure fields added later for the synthesis fast path; every other field must be unchanged
+STRUCTURE_FIELDS = ("table_ref", "headers", "row_columns", "shifted", "shift_ambiguous")
+
+def run(input_path, tmp_path, name="out.jsonl"):
+    output = tmp_path / name
+    skus.process_skus(str(input_path), str(output), page_offset=10)
+    return output.read_text()
+
+def without_structure(text):
+    lines = []
+    for line in text.splitlines():
+        record = json.loads(line)
+        for field in STRUCTURE_FIELDS:
+            record.pop(field)
+        lines.append(json.dumps(record))
+    return "\n".join(lines) + "\n"
+
+def test_output_matches_the_original_extractor(tmp_path):
+    assert without_structure(run(DOCUMENT, tmp_path)) == EXPECTED.read_text()
+
+def test_streaming_and_json_load_paths_are_byte_identical(tmp_path, monkeypatch):
+    if skus.ijson is None:
+        pytest.skip("ijson not installed")
+    streamed = run(DOCUMENT, tmp_path, "streamed.jsonl")
+    monkeypatch.setattr(skus, "ijson", None)
+    assert run(DOCUMENT, tmp_path, "loaded.jsonl") == streamed
+
+def test_parts_manifest_matches_a_single_document(tmp_path):
+    with open(DOCUMENT) as f:
+        document = json.load(f)
+    children = document["body"]["children"]
+    # Page 1's items in the first part, the rest in the second; section context carries across
+    parts = []
+    for i, part_children in enumerate((children[:5], children[5:]), 1):
+        part = dict(document, body={"self_ref": "#/body", "children": part_children})
+        path = tmp_path / "metadata_parts" / f"part{i:03d}.json"
+        path.parent.mkdir(exist_ok=True)
+        path.write_text(json.dumps(part))
+        parts.append({"path": str(path.relative_to(tmp_path))})
+    (tmp_path / skus.METADATA_PARTS_FILE).write_text(json.dumps({"parts": parts}))
+
+    assert skus.metadata_input(tmp_path) == tmp_path / skus.METADATA_PARTS_FILE
+    assert run(tmp_path / skus.METADATA_PARTS_FILE, tmp_path) == run(DOCUMENT, tmp_path, "single.jsonl")
+
+def test_deeply_nested_groups_do_not_hit_the_recursion_limit(tmp_path):
+    with open(DOCUMENT) as f:
+        document = json.load(f)
+    depth = 5000
+    start = len(document["groups"])
+    for i in range(depth):
+        child = f"#/groups/{start + i + 1}" if i < depth - 1 else "#/tables/0"
+        document["groups"].append({"self_ref": f"#/groups/{start + i}", "label": "group", "children": [{"$ref": child}]})
+    document["body"]["children"] = [{"$ref": "#/texts/0"}, {"$ref": f"#/groups/{start}"}]
+    path = tmp_path / "deep.json"
+    path.write_text(json.dumps(document))
+    assert [json.loads(line)["sku"] for line in run(path, tmp_path).splitlines()] == ["5851", "5852", "1.5", "5853"]
@@ -0,0 +1,111 @@
+import os
+import json
+import socket
+import sqlite3
+
+from planner.state import (
+    STATE_DB, STATE_JSON, create_state_store, export_state_json, migrate_state, open_state_store
+)
+
+WORKER = f"{socket.gethostname()}:{os.getpid()}"
+
+def make_state():
+    return {
+        "pdf_path": "catalog.pdf",
+        "sections": [
+            {"name": "Cables", "level": 1, "chunks": [
+                {"id": "1_5", "start": 1, "end": 5, "status": "PENDING", "working_dir": "/job/runs/1_5"},
+                {"id": "6_10", "start": 6, "end": 10, "status": "DONE", "pages": [{"page": 6, "images": 0}]},
+            ]},
+            {"name": "Tubing", "chunks": [
+                {"id": "11_15", "start": 11, "end": 15, "status": "SYNTHESIZE"},
+            ]},
+        ],
+        "executions": [],
+    }
+
+def statuses(store):
+    return {chunk["id"]: chunk["status"] for section in store.load()["sections"] for chunk in section["chunks"]}
+
+def test_sqlite_round_trips_the_state_json_layout(tmp_path):
+    store = create_state_store(tmp_path, "sqlite")
+    store.initialize(make_state())
+    assert store.load() == make_state()
+    store.close()
+
+def test_migrate_round_trip(tmp_path):
+    create_state_store(tmp_path, "json").initialize(make_state())
+
+    target = migrate_state(tmp_path, "sqlite")
+    assert target.kind == "sqlite"
+    assert not (tmp_path / STATE_JSON).exists()
+    assert (tmp_path / f"{STATE_JSON}.migrated").exists()
+    assert open_state_store(tmp_path).kind == "sqlite"
+    assert target.load() == make_state()
+    target.close()
+
+    back = migrate_state(tmp_path, "json")
+    assert back.kind == "json"
+    assert not (tmp_path / STATE_DB).exists()
+    assert (tmp_path / f"{STATE_DB}.migrated").exists()
+    assert open_state_store(tmp_path).kind == "json"
+    assert back.load() == make_state()
+
+def test_migrate_to_same_backend_is_a_no_op(tmp_path):
+    create_state_store(tmp_path, "json").initialize(make_state())
+    assert migrate_state(tmp_path, "json").kind == "json"
+    assert not (tmp_path / f"{STATE_JSON}.migrated").exists()
+
+def test_initialize_retires_other_backend(tmp_path):
+    sqlite_store = create_state_store(tmp_path, "sqlite")
+    sqlite_store.initialize(make_state())
+    sqlite_store.close()
+    create_state_store(tmp_path, "json").initialize(make_state())
+    assert open_state_store(tmp_path).kind == "json"
+    assert (tmp_path / f"{STATE_DB}.migrated").exists()
+
+def test_export_state_json(tmp_path):
+    store = create_state_store(tmp_path, "sqlite")
+    store.initialize(make_state())
+    store.close()
+    output = export_state_json(tmp_path, tmp_path / "export.json")
+    with open(output) as f:
+        assert json.load(f) == make_state()
+
+def test_sqlite_release_and_heartbeat_go_by_chunk_id(tmp_path):
+    store = create_state_store(tmp_path, "sqlite")
+    store.initialize(make_state())
+    chunk, _, _ = store.claim_next("skip", None, WORKER, 600)
+    assert chunk["id"] == "1_5"
+    # A chunk dict with the same range but another id is a different chunk
+    assert not store.heartbeat({**chunk, "id": "other"}, WORKER)
+    assert not store.release({**chunk, "id": "other"}, WORKER, "DONE")
+    assert store.heartbeat(chunk, WORKER)
+    assert store.release(chunk, WORKER, "SYNTHESIZE")
+    assert statuses(store)["1_5"] == "SYNTHESIZE"
+    store.close()
+
+def test_sqlite_upgrades_databases_without_chunk_ids(tmp_path):
+    # Schema written before chunk costs and ids had their own columns
+    conn = sqlite3.connect(tmp_path / STATE_DB)
+    conn.executescript("""
+    CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+    CREATE TABLE sections (idx INTEGER PRIMARY KEY, name TEXT, extra TEXT);
+    CREATE TABLE chunks (id INTEGER PRIMARY KEY, section_idx INTEGER NOT NULL, start_page INTEGER NOT NULL,
+        end_page INTEGER NOT NULL, status TEXT NOT NULL, working_dir TEXT, input_file TEXT, text_file TEXT,
+        claimed_from TEXT, claimed_by TEXT, claimed_at REAL, heartbeat REAL, extra TEXT);
+    CREATE TABLE executions (id INTEGER PRIMARY KEY AUTOINCREMENT, datetime TEXT, file TEXT, args TEXT,
+        execution_time TEXT, status TEXT, message TEXT);
+    INSERT INTO sections (idx, name) VALUES (0, 'Cables');
+    INSERT INTO chunks (section_idx, start_page, end_page, status, extra) VALUES (0, 1, 5, 'PENDING', '{"id": "a"}');
+    INSERT INTO chunks (section_idx, start_page, end_page, status) VALUES (0, 6, 10, 'PENDING');
+    """)
+    conn.close()
+
+    store = open_state_store(tmp_path)
+    assert store.kind == "sqlite"
+    claimed = [store.claim_next("skip", None, WORKER, 600)[0] for _ in range(2)]
+    assert sorted(chunk["id"] for chunk in claimed) == ["6_10", "a"]
+    assert all(store.release(chunk, WORKER, "DONE") for chunk in claimed)
+    assert statuses(store) == {"a": "DONE", "6_10": "DONE"}
+    store.close()
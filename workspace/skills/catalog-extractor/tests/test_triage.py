@@ -0,0 +1,55 @@
+import pytest
+
+from extract.synthesize import local_fragment
+from planner.triage import classify_page, page_routes, parse_routes, DEFAULT_ROUTES
+
+SPEC_TABLE = "\n".join(["Part No. AWG Strands OD mm"] + [f"{5850 + i} 22 7/30 1.{50 + i}" for i in range(8)])
+
+def test_blank_page_without_images_is_empty():
+    assert classify_page("  12  ", {"images": 0}) == "empty"
+    assert classify_page(None, {"images": 0}) == "empty"
+
+def test_little_text_next_to_an_image_is_image_only():
+    assert classify_page("Alpha Wire", {"images": 2}) == "image_only"
+
+def test_unknown_image_count_never_classifies_empty():
+    # Plans made before page stats: a blank-looking page keeps its image
+    assert classify_page("", {}) == "image_only"
+
+def test_spec_table():
+    assert classify_page(SPEC_TABLE, {"images": 0}) == "spec_table"
+
+def test_planner_table_line_count_wins():
+    assert classify_page(SPEC_TABLE, {"images": 0, "table_lines": 0}) == "narrative"
+
+def test_narrative():
+    text = "Our cables are designed for demanding environments.\n" * 10
+    assert classify_page(text, {"images": 1}) == "narrative"
+
+def test_contents_page_is_narrative():
+    text = "\n".join(f"Series {i} Hookup Wire ......... {i * 4}" for i in range(1, 20))
+    assert classify_page(text, {"images": 0}) == "narrative"
+
+def test_parse_routes_overrides_defaults():
+    routes = parse_routes(["image-only=llm", "empty=skip"])
+    assert routes["image_only"] == "llm"
+    assert routes["empty"] == "skip"
+    assert routes["narrative"] == DEFAULT_ROUTES["narrative"]
+
+@pytest.mark.parametrize("spec", ["narrative", "tables=llm", "narrative=drop"])
+def test_parse_routes_rejects_bad_specs(spec):
+    with pytest.raises(ValueError):
+        parse_routes([spec])
+
+def test_page_routes_skips_unclassified_pages():
+    chunk = {"pages": [{"page": 1, "class": "narrative"}, {"page": 2, "class": "spec_table"}, {"page": 3}]}
+    assert page_routes(chunk) == {1: "text", 2: "llm"}
+
+def test_local_fragments_are_built_from_disk(tmp_path):
+    img_path = tmp_path / "page_3.png"
+    prov = {3: [{"filename": "crop_page_3_0.png", "path": "images/crop_page_3_0.png", "text_context": "Reel sizes"}]}
+    text = local_fragment(3, "text", img_path, {3: "  Line one\n  Line two  "}, prov)["markdown_content"]
+    assert text == "![Page 3](raw/images/page_3.png)\n\nLine one\nLine two"
+    image = local_fragment(3, "image", img_path, {}, prov)
+    assert image["skus"] == []
+    assert "![Reel sizes](raw/images/crop_page_3_0.png)\n\n*Reel sizes*" in image["markdown_content"]